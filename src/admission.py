@@ -0,0 +1,312 @@
+"""
+Відсікання навантаження за станом пулу з'єднань і дедлайни запитів.
+
+Коли БД сповільнюється, запити накопичуються в черзі пулу і чекають на
+з'єднання довше, ніж клієнт готовий чекати відповідь. PoolAdmission
+обгортає сесії get_db/get_shard_db: з'єднання береться одразу, час
+очікування на нього йде в ковзне середнє, яке згасає з півперіодом
+ADMISSION_WAIT_HALF_LIFE. Якщо середнє перевищує
+ADMISSION_MAX_POOL_WAIT_MS або сесій у роботі вже ADMISSION_MAX_IN_FLIGHT,
+новий запит одразу отримує 503 з Retry-After, не стаючи в чергу.
+
+DeadlineMiddleware дає кожному HTTP-запиту дедлайн за найдовшим префіксом
+шляху з REQUEST_DEADLINES ("префікс=секунди:мс,...", де мс — statement
+timeout для Postgres; 0 — без обмеження). Після дедлайну або відключення
+клієнта задача запиту скасовується разом із запитом до БД, а кожна
+транзакція сесії отримує SET LOCAL statement_timeout не довший за залишок
+дедлайну.
+"""
+import asyncio
+import contextvars
+import os
+import time
+from collections import Counter
+from contextlib import asynccontextmanager
+from typing import NamedTuple, Optional
+from fastapi import HTTPException
+from sqlalchemy import event
+
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64"))
+ADMISSION_MAX_POOL_WAIT_MS = float(os.getenv("ADMISSION_MAX_POOL_WAIT_MS", "250"))
+ADMISSION_WAIT_HALF_LIFE = float(os.getenv("ADMISSION_WAIT_HALF_LIFE", "2"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "1"))
+DB_CHECKOUT_TIMEOUT = float(os.getenv("DB_CHECKOUT_TIMEOUT", "3"))
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "10000"))
+REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "30"))
+REQUEST_DEADLINES = os.getenv(
+    "REQUEST_DEADLINES", "/contacts=10:5000,/groups=10:5000,/auth=15:3000,/internal=300:0"
+)
+EWMA_WEIGHT = 0.2
+
+
+class RequestBudget(NamedTuple):
+    deadline: Optional[float] = None
+    statement_timeout_ms: int = DB_STATEMENT_TIMEOUT_MS
+
+    def remaining(self) -> Optional[float]:
+        """
+
+        :return: секунд до дедлайну або None, якщо його немає
+        """
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def statement_timeout(self) -> int:
+        """
+        Менше з обмеження маршруту й залишку дедлайну.
+
+        :return: мілісекунд, 0 — без обмеження
+        """
+        remaining = self.remaining()
+        if remaining is None:
+            return self.statement_timeout_ms
+        remaining_ms = max(1, int(remaining * 1000))
+        return min(self.statement_timeout_ms, remaining_ms) if self.statement_timeout_ms else remaining_ms
+
+
+request_budget_var = contextvars.ContextVar("request_budget", default=RequestBudget())
+deadline_counters = Counter()
+
+
+def service_unavailable(detail: str, retry_after: int = ADMISSION_RETRY_AFTER) -> HTTPException:
+    """
+
+    :param detail:
+    :param retry_after:
+    :return:
+    """
+    return HTTPException(status_code=503, detail=detail, headers={"Retry-After": str(retry_after)})
+
+
+def set_statement_timeout(session, transaction, connection) -> None:
+    """
+    Слухач after_begin: діє до кінця транзакції, тож з'єднання повертається
+    в пул без нього.
+
+    :param session:
+    :param transaction:
+    :param connection:
+    :return:
+    """
+    timeout_ms = request_budget_var.get().statement_timeout()
+    if timeout_ms and connection.dialect.name == "postgresql":
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+
+
+class PoolAdmission:
+    """
+    Допуск до пулу одного двигуна БД.
+    """
+
+    def __init__(self, name: str, engine=None, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT,
+                 max_wait_ms: float = ADMISSION_MAX_POOL_WAIT_MS, half_life: float = ADMISSION_WAIT_HALF_LIFE,
+                 checkout_timeout: float = DB_CHECKOUT_TIMEOUT):
+        self.name = name
+        self.engine = engine
+        self.max_in_flight = max_in_flight
+        self.max_wait_ms = max_wait_ms
+        self.half_life = half_life
+        self.checkout_timeout = checkout_timeout
+        self.in_flight = 0
+        self.admitted = 0
+        self.shed = Counter()
+        self._wait_ms = 0.0
+        self._wait_at = time.monotonic()
+
+    def pool_wait_ms(self) -> float:
+        """
+        Без нових вимірів середнє згасає, тож після відсікання пул знову
+        починає приймати запити.
+
+        :return:
+        """
+        age = time.monotonic() - self._wait_at
+        return self._wait_ms * 0.5 ** (age / self.half_life) if self.half_life else self._wait_ms
+
+    def record_wait(self, seconds: float) -> None:
+        """
+
+        :param seconds: скільки запит чекав на з'єднання
+        :return:
+        """
+        current = self.pool_wait_ms()
+        self._wait_ms = current + EWMA_WEIGHT * (seconds * 1000 - current)
+        self._wait_at = time.monotonic()
+
+    def admit(self) -> None:
+        """
+
+        :return:
+        """
+        if self.in_flight >= self.max_in_flight:
+            self.shed["in_flight"] += 1
+            raise service_unavailable("Database is busy, retry later")
+        if self.pool_wait_ms() > self.max_wait_ms:
+            self.shed["pool_wait"] += 1
+            raise service_unavailable("Database is busy, retry later")
+
+    @asynccontextmanager
+    async def session(self, factory):
+        """
+        Сесія з уже взятим з'єднанням; очікування на нього обмежене
+        checkout_timeout і залишком дедлайну запиту.
+
+        :param factory: sessionmaker
+        :return:
+        """
+        self.admit()
+        self.in_flight += 1
+        self.admitted += 1
+        try:
+            async with factory() as session:
+                event.listen(session.sync_session, "after_begin", set_statement_timeout)
+                remaining = request_budget_var.get().remaining()
+                timeout = self.checkout_timeout if remaining is None else min(self.checkout_timeout, remaining)
+                started = time.monotonic()
+                try:
+                    await asyncio.wait_for(session.connection(), timeout)
+                except asyncio.TimeoutError:
+                    self.record_wait(time.monotonic() - started)
+                    self.shed["checkout_timeout"] += 1
+                    raise service_unavailable("Timed out waiting for a database connection")
+                self.record_wait(time.monotonic() - started)
+                yield session
+        finally:
+            self.in_flight -= 1
+
+    def stats(self) -> dict:
+        """
+
+        :return:
+        """
+        stats = {
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "pool_wait_ms": round(self.pool_wait_ms(), 2),
+            "max_pool_wait_ms": self.max_wait_ms,
+            "admitted": self.admitted,
+            "shed": dict(self.shed),
+        }
+        pool = self.engine.pool if self.engine is not None else None
+        if pool is not None and hasattr(pool, "checkedout"):
+            stats["pool"] = {"size": pool.size(), "checked_out": pool.checkedout(), "overflow": pool.overflow()}
+        return stats
+
+
+def parse_deadlines(spec: str) -> dict:
+    """
+
+    :param spec: "префікс=секунди:мс,..."
+    :return: префікс -> (секунди, мс)
+    """
+    budgets = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        prefix, _, value = item.partition("=")
+        seconds, _, timeout_ms = value.partition(":")
+        budgets[prefix.strip()] = (float(seconds or REQUEST_DEADLINE_SECONDS),
+                                   int(timeout_ms or DB_STATEMENT_TIMEOUT_MS))
+    return budgets
+
+
+class DeadlineMiddleware:
+    """
+    Чистий ASGI middleware. receive читає одна фонова задача і передає
+    повідомлення застосунку через чергу на одне повідомлення: тіло йде
+    потоком, у пам'яті не більше одного наперед прочитаного шматка, а
+    відключення клієнта видно, щойно застосунок дочитав тіло.
+    """
+
+    def __init__(self, app, deadlines: str = REQUEST_DEADLINES, default_seconds: float = REQUEST_DEADLINE_SECONDS,
+                 counters: Counter = deadline_counters):
+        self.app = app
+        self.budgets = sorted(parse_deadlines(deadlines).items(), key=lambda item: len(item[0]), reverse=True)
+        self.default = (default_seconds, DB_STATEMENT_TIMEOUT_MS)
+        self.counters = counters
+
+    def budget_for(self, path: str) -> RequestBudget:
+        """
+
+        :param path:
+        :return:
+        """
+        seconds, timeout_ms = next(
+            (budget for prefix, budget in self.budgets if path.startswith(prefix)), self.default
+        )
+        return RequestBudget(time.monotonic() + seconds if seconds else None, timeout_ms)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        budget = self.budget_for(scope["path"])
+        token = request_budget_var.set(budget)
+        try:
+            await self.run(scope, receive, send, budget)
+        finally:
+            request_budget_var.reset(token)
+
+    async def run(self, scope, receive, send, budget: RequestBudget) -> None:
+        """
+
+        :param scope:
+        :param receive:
+        :param send:
+        :param budget:
+        :return:
+        """
+        messages = asyncio.Queue(maxsize=1)
+        disconnected = asyncio.Event()
+        disconnect_delivered = False
+        response_started = response_complete = False
+
+        async def pump():
+            while True:
+                message = await receive()
+                if message["type"] == "http.disconnect":
+                    disconnected.set()
+                await messages.put(message)
+                if message["type"] == "http.disconnect":
+                    return
+
+        async def receive_streamed():
+            nonlocal disconnect_delivered
+            if disconnect_delivered:
+                return {"type": "http.disconnect"}
+            message = await messages.get()
+            disconnect_delivered = message["type"] == "http.disconnect"
+            return message
+
+        async def send_tracked(message):
+            nonlocal response_started, response_complete
+            if message["type"] == "http.response.start":
+                response_started = True
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        reader = asyncio.create_task(pump())
+        watcher = asyncio.create_task(disconnected.wait())
+        task = asyncio.create_task(self.app(scope, receive_streamed, send_tracked))
+        try:
+            await asyncio.wait({task, watcher}, timeout=budget.remaining(), return_when=asyncio.FIRST_COMPLETED)
+            if not task.done() and not response_complete:
+                reason = "client_disconnect" if disconnected.is_set() else "deadline_exceeded"
+                self.counters[reason] += 1
+                task.cancel()
+                await asyncio.wait({task})
+                if reason == "deadline_exceeded" and not response_started:
+                    await send({
+                        "type": "http.response.start", "status": 504,
+                        "headers": [(b"content-type", b"application/json")],
+                    })
+                    await send({"type": "http.response.body", "body": b'{"detail":"Request deadline exceeded"}'})
+                return
+            # відповідь уже віддана: фонові задачі дедлайн не обмежує
+            await task
+        finally:
+            reader.cancel()
+            watcher.cancel()
+            if not task.done():
+                task.cancel()
@@ -1,19 +1,24 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Optional, Tuple
 from jose import jwt, JWTError
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends, UploadFile, File, APIRouter
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import bindparam, select
 from src.database import get_db
 from src.models import User
-from src.schemas import UserCreate, UserOut, Token
+from src.schemas import UserCreate, Token
+from src.revocation import revocation_store
+from src.bulkhead import auth_lane
+import logging
 import os
 import smtplib
+import time
+import uuid
 from email.mime.text import MIMEText
 import cloudinary
-import cloudinary.uploader
+from src.services.avatar_service import avatar_processor, InvalidAvatar, read_upload
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -23,9 +28,21 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS", "250"))
+PASSWORD_HASH_ROUNDS = os.getenv("PASSWORD_HASH_ROUNDS")
+BCRYPT_MIN_ROUNDS = int(os.getenv("BCRYPT_MIN_ROUNDS", "10"))
+BCRYPT_MAX_ROUNDS = int(os.getenv("BCRYPT_MAX_ROUNDS", "16"))
+BCRYPT_CALIBRATION_ROUNDS = 8
+
+logger = logging.getLogger(__name__)
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
+# Зібрані один раз: виклики лише передають параметри, SQL береться з кешу компіляції.
+USER_BY_EMAIL = select(User).where(User.email == bindparam("email"))
+USER_BY_ID = select(User).where(User.id == bindparam("user_id"))
+
 cloudinary.config(
     cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
     api_key=os.getenv("CLOUDINARY_API_KEY"),
@@ -50,6 +67,57 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """
     return pwd_context.verify(plain_password, hashed_password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Перевіряє пароль і, якщо хеш слабший за поточну політику (needs_update),
+    повертає новий хеш, який варто зберегти.
+
+    :param plain_password:
+    :param hashed_password:
+    :return: (пароль правильний, новий хеш або None)
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+def choose_bcrypt_rounds(seconds_at_base: float, target_ms: float, base_rounds: int = BCRYPT_CALIBRATION_ROUNDS,
+                         min_rounds: int = BCRYPT_MIN_ROUNDS, max_rounds: int = BCRYPT_MAX_ROUNDS) -> int:
+    """
+    Кожен додатковий раунд bcrypt подвоює час, тож найбільша вартість у межах
+    цілі обчислюється з одного виміру.
+
+    :param seconds_at_base:
+    :param target_ms:
+    :param base_rounds:
+    :param min_rounds:
+    :param max_rounds:
+    :return:
+    """
+    rounds = min_rounds
+    while rounds < max_rounds and seconds_at_base * 2 ** (rounds + 1 - base_rounds) * 1000 <= target_ms:
+        rounds += 1
+    return rounds
+
+def calibrate_password_hashing(target_ms: float = PASSWORD_HASH_TARGET_MS) -> int:
+    """
+    Підбирає кількість раундів bcrypt під ціль на цьому залізі й робить її
+    мінімумом політики: слабші хеші перехешуються при вході, сильніші не
+    понижуються. PASSWORD_HASH_ROUNDS фіксує значення без вимірювання.
+
+    :param target_ms:
+    :return:
+    """
+    if PASSWORD_HASH_ROUNDS:
+        rounds = int(PASSWORD_HASH_ROUNDS)
+    else:
+        timings = []
+        for _ in range(3):
+            started = time.perf_counter()
+            pwd_context.hash("calibration", rounds=BCRYPT_CALIBRATION_ROUNDS)
+            timings.append(time.perf_counter() - started)
+        rounds = choose_bcrypt_rounds(min(timings), target_ms)
+    pwd_context.update(bcrypt__default_rounds=rounds, bcrypt__min_rounds=rounds)
+    logger.info("bcrypt cost calibrated to %s rounds (target %s ms)", rounds, target_ms)
+    return rounds
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """
 
@@ -59,7 +127,7 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     """
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
@@ -71,7 +139,7 @@ def create_refresh_token(data: dict, expires_delta: Optional[timedelta] = None)
     """
     to_encode = data.copy()
     expire = datetime.utcnow() + (expires_delta or timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS))
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     return jwt.encode(to_encode, REFRESH_SECRET_KEY, algorithm=ALGORITHM)
 
 def decode_token(token: str, refresh: bool = False) -> dict:
@@ -109,11 +177,24 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
+    jti = payload.get("jti")
+    if jti is not None and await revocation_store.is_revoked(db, jti):
+        raise credentials_exception
+
     user = await db.get(User, int(user_id))
     if user is None:
         raise credentials_exception
     return user
 
+async def revoke_token(db: AsyncSession, payload: dict) -> bool:
+    """
+
+    :param db:
+    :param payload:
+    :return: False, якщо токен уже було відкликано
+    """
+    return await revocation_store.revoke(db, payload["jti"], datetime.utcfromtimestamp(payload["exp"]))
+
 def create_email_verification_token(user_id: int) -> str:
     """
 
@@ -144,30 +225,6 @@ def send_verification_email(email: str, token: str):
         server.send_message(msg)
 
 
-@router.post("/register", response_model=UserOut)
-async def register(user: UserCreate, db: AsyncSession = Depends(get_db)):
-    """
-
-    :param user:
-    :param db:
-    :return:
-    """
-    result = await db.execute(select(User).where(User.email == user.email))
-    db_user = result.scalar_one_or_none()
-    if db_user:
-        raise HTTPException(status_code=400, detail="Email already registered")
-
-    hashed_password = get_password_hash(user.password)
-    new_user = User(username=user.username, email=user.email, password=hashed_password)
-    db.add(new_user)
-    await db.commit()
-    await db.refresh(new_user)
-
-    token = create_email_verification_token(new_user.id)
-    send_verification_email(new_user.email, token)
-
-    return new_user
-
 @router.get("/verify/{token}")
 async def verify_email(token: str, db: AsyncSession = Depends(get_db)):
     """
@@ -179,7 +236,7 @@ async def verify_email(token: str, db: AsyncSession = Depends(get_db)):
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id = payload.get("sub")
-        result = await db.execute(select(User).where(User.id == int(user_id)))
+        result = await db.execute(USER_BY_ID, {"user_id": int(user_id)})
         user = result.scalar_one_or_none()
         if not user:
             raise HTTPException(status_code=404, detail="User not found")
@@ -191,7 +248,7 @@ async def verify_email(token: str, db: AsyncSession = Depends(get_db)):
     except JWTError:
         raise HTTPException(status_code=400, detail="Invalid token")
 
-@router.post("/login", response_model=Token)
+@router.post("/login", response_model=Token, dependencies=[Depends(auth_lane)])
 async def login(form_data: UserCreate, db: AsyncSession = Depends(get_db)):
     """
 
@@ -199,10 +256,16 @@ async def login(form_data: UserCreate, db: AsyncSession = Depends(get_db)):
     :param db:
     :return:
     """
-    result = await db.execute(select(User).where(User.email == form_data.email))
+    result = await db.execute(USER_BY_EMAIL, {"email": form_data.email})
     user = result.scalar_one_or_none()
-    if not user or not verify_password(form_data.password, user.password):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    verified, new_hash = await auth_lane.run(verify_and_update_password, form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     if not user.is_verified:
         raise HTTPException(status_code=403, detail="Email not verified")
 
@@ -223,8 +286,11 @@ async def update_avatar(
     :param current_user:
     :return:
     """
-    result = cloudinary.uploader.upload(file.file, folder="avatars")
-    url = result["secure_url"]
-    current_user.avatar = url
+    try:
+        variants = await avatar_processor.save(await read_upload(file), db)
+    except InvalidAvatar as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid avatar: {exc}")
+    current_user.avatar_url = variants["large"]
+    current_user.avatar_variants = variants
     await db.commit()
-    return {"avatar_url": url}
+    return {"avatar_url": variants["large"], "variants": variants}
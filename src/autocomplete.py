@@ -0,0 +1,284 @@
+import asyncio
+import os
+import re
+import sys
+import time
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import Contact
+
+AUTOCOMPLETE_MEMORY_BUDGET = int(os.getenv("AUTOCOMPLETE_MEMORY_BUDGET", str(64 * 1024 * 1024)))
+AUTOCOMPLETE_TTL_SECONDS = int(os.getenv("AUTOCOMPLETE_TTL_SECONDS", "300"))
+
+SUGGESTION_COLUMNS = (Contact.id, Contact.first_name, Contact.last_name, Contact.email, Contact.phone)
+
+_NON_DIGITS = re.compile(r"\D+")
+_PHONE_LIKE = re.compile(r"^[\d\s()+\-.]+$")
+
+
+def normalize_text(value: str) -> str:
+    """
+
+    :param value:
+    :return:
+    """
+    return " ".join((value or "").casefold().split())
+
+
+def normalize_digits(value: str) -> str:
+    """
+
+    :param value:
+    :return:
+    """
+    return _NON_DIGITS.sub("", value or "")
+
+
+def contact_terms(first_name: str, last_name: str, email: str, phone: str) -> set:
+    """
+    Усі ключі, за якими контакт знаходиться по префіксу.
+
+    :param first_name:
+    :param last_name:
+    :param email:
+    :param phone:
+    :return:
+    """
+    first = normalize_text(first_name)
+    last = normalize_text(last_name)
+    terms = set(first.split()) | set(last.split())
+    terms.update(t for t in (first, last, f"{first} {last}".strip(), f"{last} {first}".strip()) if t)
+    if email:
+        terms.add(normalize_text(email))
+    digits = normalize_digits(phone)
+    if digits:
+        terms.add(digits)
+    return terms
+
+
+class PrefixIndex:
+    """
+    Відсортований масив (term, contact_id) одного користувача.
+    Пошук за префіксом — bisect + послідовний прохід по сусідніх елементах.
+    """
+
+    ENTRY_OVERHEAD = 120
+
+    def __init__(self):
+        self.entries = []
+        self.terms_by_contact = {}
+        self.suggestions = {}
+        self.size = 0
+        self.built_at = time.monotonic()
+
+    @classmethod
+    def build(cls, rows) -> "PrefixIndex":
+        """
+        Повна побудова: записи додаються в кінець і сортуються один раз.
+
+        :param rows: (id, first_name, last_name, email, phone)
+        :return:
+        """
+        index = cls()
+        for row in rows:
+            index.add(tuple(row), keep_sorted=False)
+        index.entries.sort()
+        return index
+
+    def add(self, row, keep_sorted: bool = True) -> None:
+        """
+
+        :param row: (id, first_name, last_name, email, phone)
+        :param keep_sorted: False — лише під час build, який сортує в кінці
+        :return:
+        """
+        contact_id = row[0]
+        if keep_sorted:
+            self.remove(contact_id)
+        terms = contact_terms(*row[1:])
+        for term in terms:
+            if keep_sorted:
+                insort(self.entries, (term, contact_id))
+            else:
+                self.entries.append((term, contact_id))
+            self.size += sys.getsizeof(term) + self.ENTRY_OVERHEAD
+        self.terms_by_contact[contact_id] = terms
+        self.suggestions[contact_id] = tuple(row)
+        self.size += self.ENTRY_OVERHEAD
+
+    def remove(self, contact_id: int) -> None:
+        """
+
+        :param contact_id:
+        :return:
+        """
+        terms = self.terms_by_contact.pop(contact_id, None)
+        if terms is None:
+            return
+        for term in terms:
+            i = bisect_left(self.entries, (term, contact_id))
+            if i < len(self.entries) and self.entries[i] == (term, contact_id):
+                del self.entries[i]
+            self.size -= sys.getsizeof(term) + self.ENTRY_OVERHEAD
+        del self.suggestions[contact_id]
+        self.size -= self.ENTRY_OVERHEAD
+
+    def search(self, prefix: str, limit: int) -> list:
+        """
+
+        :param prefix:
+        :param limit:
+        :return:
+        """
+        found = []
+        seen = set()
+        entries = self.entries
+        i = bisect_left(entries, (prefix,))
+        while i < len(entries) and len(found) < limit:
+            term, contact_id = entries[i]
+            if not term.startswith(prefix):
+                break
+            if contact_id not in seen:
+                seen.add(contact_id)
+                found.append(self.suggestions[contact_id])
+            i += 1
+        return found
+
+
+class AutocompleteIndex:
+    """
+    Індекси всіх користувачів процесу з витісненням LRU у межах бюджету пам'яті.
+    Індекс будується ліниво при першому запиті і перебудовується після TTL,
+    щоб зміни з інших воркерів не залишались невидимими надовго.
+    """
+
+    def __init__(self, memory_budget: int = AUTOCOMPLETE_MEMORY_BUDGET, ttl: int = AUTOCOMPLETE_TTL_SECONDS):
+        self.memory_budget = memory_budget
+        self.ttl = ttl
+        self.indexes = OrderedDict()
+        self.locks = {}
+
+    @property
+    def size(self) -> int:
+        """
+
+        :return:
+        """
+        return sum(index.size for index in self.indexes.values())
+
+    def clear(self) -> None:
+        """
+
+        :return:
+        """
+        self.indexes.clear()
+        self.locks.clear()
+
+    def _fresh(self, user_id: int):
+        index = self.indexes.get(user_id)
+        if index is not None and time.monotonic() - index.built_at > self.ttl:
+            del self.indexes[user_id]
+            return None
+        return index
+
+    def _evict(self) -> None:
+        total = self.size
+        while total > self.memory_budget and len(self.indexes) > 1:
+            _, evicted = self.indexes.popitem(last=False)
+            total -= evicted.size
+
+    async def get(self, db: AsyncSession, user_id: int) -> PrefixIndex:
+        """
+
+        :param db:
+        :param user_id:
+        :return:
+        """
+        index = self._fresh(user_id)
+        if index is None:
+            # [lock, кількість очікувачів, записи під час побудови]: лок видаляється останнім,
+            # хто ним користувався, інакше пізній запит створив би новий лок і будував індекс паралельно
+            entry = self.locks.get(user_id)
+            if entry is None:
+                entry = self.locks[user_id] = [asyncio.Lock(), 0, []]
+            entry[1] += 1
+            try:
+                async with entry[0]:
+                    index = self._fresh(user_id)
+                    if index is None:
+                        result = await db.execute(
+                            select(*SUGGESTION_COLUMNS).where(Contact.user_id == user_id)
+                        )
+                        index = PrefixIndex.build(result)
+                        # зміни, закомічені після знімка SELECT; повторне застосування нешкідливе
+                        for row, contact_id in entry[2]:
+                            if row is not None:
+                                index.add(row)
+                            else:
+                                index.remove(contact_id)
+                        entry[2].clear()
+                        self.indexes[user_id] = index
+                        self._evict()
+            finally:
+                entry[1] -= 1
+                if not entry[1] and self.locks.get(user_id) is entry:
+                    del self.locks[user_id]
+        self.indexes.move_to_end(user_id)
+        return index
+
+    async def search(self, db: AsyncSession, user_id: int, query: str, limit: int = 10) -> list:
+        """
+
+        :param db:
+        :param user_id:
+        :param query:
+        :param limit:
+        :return:
+        """
+        index = await self.get(db, user_id)
+        prefix = normalize_text(query)
+        if not prefix:
+            return []
+        found = index.search(prefix, limit)
+        if len(found) < limit and _PHONE_LIKE.match(query):
+            digits = normalize_digits(query)
+            if digits and digits != prefix:
+                ids = {row[0] for row in found}
+                found += [row for row in index.search(digits, limit) if row[0] not in ids][:limit - len(found)]
+        return found
+
+    def contact_saved(self, user_id: int, contact: Contact) -> None:
+        """
+        Інкрементне оновлення після create/update. Якщо індекс саме
+        будується, зміна чекає в черзі побудови; інші незавантажені індекси
+        не чіпаємо.
+
+        :param user_id:
+        :param contact:
+        :return:
+        """
+        row = (contact.id, contact.first_name, contact.last_name, contact.email, contact.phone)
+        index = self.indexes.get(user_id)
+        if index is not None:
+            index.add(row)
+            self._evict()
+        elif user_id in self.locks:
+            self.locks[user_id][2].append((row, contact.id))
+
+    def contact_deleted(self, user_id: int, contact_id: int) -> None:
+        """
+
+        :param user_id:
+        :param contact_id:
+        :return:
+        """
+        index = self.indexes.get(user_id)
+        if index is not None:
+            index.remove(contact_id)
+        elif user_id in self.locks:
+            self.locks[user_id][2].append((None, contact_id))
+
+
+autocomplete_index = AutocompleteIndex()
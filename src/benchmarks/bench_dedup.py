@@ -0,0 +1,77 @@
+"""
+Бенчмарк пошуку дублікатів на книзі зі 100k контактів.
+
+    python -m src.benchmarks.bench_dedup --contacts 100000
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+from src.dedup import find_duplicate_clusters
+
+FIRST_NAMES = ["John", "Jon", "Anna", "Hanna", "Olena", "Oleh", "Maria", "Mariia", "Ivan", "Petro",
+               "Sofia", "Taras", "Iryna", "Andrii", "Kateryna", "Mykola", "Yulia", "Dmytro"]
+LAST_NAMES = ["Smith", "Smyth", "Koval", "Kovalenko", "Bondar", "Shevchenko", "Melnyk", "Tkachenko",
+              "Kravchenko", "Oliinyk", "Moroz", "Lysenko", "Marchenko", "Rudenko", "Savchenko"]
+
+
+def generate_book(contacts: int, duplicate_rate: float, seed: int) -> list:
+    """
+
+    :param contacts:
+    :param duplicate_rate:
+    :param seed:
+    :return:
+    """
+    rnd = random.Random(seed)
+    rows = []
+    for contact_id in range(1, contacts + 1):
+        if rows and rnd.random() < duplicate_rate:
+            _, first, last, email, phone = rnd.choice(rows)
+            local, domain = email.split("@")
+            rows.append((contact_id, first, last, f"{local.upper()}+dup@{domain}", f"+38 {phone}"))
+            continue
+        first = rnd.choice(FIRST_NAMES)
+        last = f"{rnd.choice(LAST_NAMES)}{rnd.randrange(1000)}"
+        rows.append((
+            contact_id,
+            first,
+            last,
+            f"{first.lower()}.{last.lower()}.{contact_id}@example.com",
+            f"0{rnd.randrange(10**8, 10**9)}",
+        ))
+    return rows
+
+
+def main():
+    """
+
+    :return:
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=100_000)
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=14)
+    args = parser.parse_args()
+
+    rows = generate_book(args.contacts, args.duplicate_rate, args.seed)
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        clusters = find_duplicate_clusters(rows)
+        timings.append(time.perf_counter() - started)
+
+    best = min(timings)
+    print(f"contacts:          {len(rows)}")
+    print(f"clusters:          {len(clusters)}")
+    print(f"contacts in dupes: {sum(len(c['contact_ids']) for c in clusters)}")
+    print(f"best of {args.repeat}:        {best * 1000:.1f} ms ({len(rows) / best:,.0f} contacts/s)")
+    print(f"pairwise would be: {len(rows) * (len(rows) - 1) // 2:,} comparisons")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""
+Фільтр контактів за групами на 100 тис. контактів і 1 тис. груп одного
+користувача (у середньому 3 групи на контакт, близько 300 контактів на
+групу). Порівнюються SQL із src.groups, який збирає crud.get_contacts, і
+перетин множин у Python після завантаження членства кожної групи — так
+довелося б робити без фільтра. Для кожного варіанта друкується план
+SQLite, щоб було видно, що членство читається з індексів.
+
+    python -m src.benchmarks.bench_groups --contacts 100000 --groups 1000
+"""
+import argparse
+import os
+import random
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+from sqlalchemy import create_engine, insert, select, text
+from sqlalchemy.orm import Session
+from src import crud
+from src.database import Base
+from src.groups import GroupFilter, group_filter_params
+from src.models import Contact, ContactGroup, ContactGroupMember, User
+
+USER_ID = 1
+
+
+def seed(session: Session, contacts: int, groups: int, per_contact: int) -> None:
+    """
+
+    :param session:
+    :param contacts:
+    :param groups:
+    :param per_contact: скільки груп у середньому має контакт
+    :return:
+    """
+    rng = random.Random(47)
+    session.add(User(id=USER_ID, email="bench@example.com", hashed_password="!"))
+    session.execute(insert(Contact), [
+        {
+            "id": contact_id, "first_name": f"first{contact_id}", "last_name": "Bench",
+            "email": f"bench{contact_id}@example.com", "phone": "0670000000", "user_id": USER_ID,
+        }
+        for contact_id in range(1, contacts + 1)
+    ])
+    session.execute(insert(ContactGroup), [
+        {"id": group_id, "user_id": USER_ID, "name": f"group{group_id}"} for group_id in range(1, groups + 1)
+    ])
+    session.execute(insert(ContactGroupMember), [
+        {"contact_id": contact_id, "group_id": group_id, "user_id": USER_ID}
+        for contact_id in range(1, contacts + 1)
+        for group_id in rng.sample(range(1, groups + 1), rng.randint(0, per_contact * 2))
+    ])
+    session.commit()
+    session.execute(text("ANALYZE"))
+
+
+def in_python(session: Session, group_filter: GroupFilter) -> list:
+    """
+    Членство кожної групи окремим запитом, далі операції над множинами.
+
+    :param session:
+    :param group_filter:
+    :return:
+    """
+    def members(group_id):
+        return set(session.scalars(select(ContactGroupMember.contact_id).where(
+            ContactGroupMember.user_id == USER_ID, ContactGroupMember.group_id == group_id
+        )))
+
+    if group_filter.all_of:
+        ids = set.intersection(*(members(group_id) for group_id in group_filter.all_of))
+    elif group_filter.any_of:
+        ids = set()
+    else:
+        ids = set(session.scalars(select(Contact.id).where(Contact.user_id == USER_ID)))
+    if group_filter.any_of:
+        any_ids = set.union(*(members(group_id) for group_id in group_filter.any_of))
+        ids = ids & any_ids if group_filter.all_of else any_ids
+    for group_id in group_filter.none_of:
+        ids -= members(group_id)
+    if not ids:
+        return []
+    return session.execute(
+        select(Contact.id, Contact.first_name).where(Contact.id.in_(sorted(ids))).order_by(Contact.id)
+    ).all()
+
+
+def in_sql(session: Session, group_filter: GroupFilter) -> list:
+    """
+
+    :param session:
+    :param group_filter:
+    :return:
+    """
+    statement = crud.contacts_statement(("id", "first_name"), False, False, group_filter.shape)
+    return session.execute(statement, {"user_id": USER_ID, **group_filter_params(group_filter)}).all()
+
+
+def measure(session: Session, run, group_filter: GroupFilter, repeat: int):
+    """
+
+    :param session:
+    :param run:
+    :param group_filter:
+    :param repeat:
+    :return: мілісекунд на запит і кількість рядків
+    """
+    rows = run(session, group_filter)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        run(session, group_filter)
+    return (time.perf_counter() - started) / repeat * 1000, len(rows)
+
+
+def explain(session: Session, group_filter: GroupFilter) -> str:
+    """
+
+    :param session:
+    :param group_filter:
+    :return:
+    """
+    statement = crud.contacts_statement(("id", "first_name"), False, False, group_filter.shape).params(
+        user_id=USER_ID, **group_filter_params(group_filter)
+    )
+    sql = statement.compile(session.bind, compile_kwargs={"literal_binds": True})
+    rows = session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").all()
+    return "\n".join(f"    {row[-1]}" for row in rows)
+
+
+def main():
+    """
+
+    :return:
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--contacts", type=int, default=100_000)
+    parser.add_argument("--groups", type=int, default=1000)
+    parser.add_argument("--per-contact", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    cases = {
+        "groups=A,B": GroupFilter(all_of=(1, 2)),
+        "groups=A,B,C": GroupFilter(all_of=(1, 2, 3)),
+        "any_groups=A..J": GroupFilter(any_of=tuple(range(1, 11))),
+        "groups=A&exclude=B,C": GroupFilter(all_of=(1,), none_of=(2, 3)),
+        "any=A,B&exclude=C": GroupFilter(any_of=(1, 2), none_of=(3,)),
+        "exclude_groups=A": GroupFilter(none_of=(1,)),
+    }
+    with Session(engine) as session:
+        started = time.perf_counter()
+        seed(session, args.contacts, args.groups, args.per_contact)
+        members = session.scalar(select(text("count(*)")).select_from(ContactGroupMember))
+        print(f"seeded {args.contacts} contacts, {args.groups} groups, {members} memberships "
+              f"in {time.perf_counter() - started:.1f} s")
+        print(f"{'filter':24s} {'rows':>7s} {'python':>10s} {'sql':>10s}")
+        for name, group_filter in cases.items():
+            python_ms, python_rows = measure(session, in_python, group_filter, args.repeat)
+            sql_ms, sql_rows = measure(session, in_sql, group_filter, args.repeat)
+            assert python_rows == sql_rows, name
+            print(f"{name:24s} {sql_rows:7d} {python_ms:7.2f} ms {sql_ms:7.2f} ms")
+        for name, group_filter in cases.items():
+            print(f"{name}:\n{explain(session, group_filter)}")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
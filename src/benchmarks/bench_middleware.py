@@ -0,0 +1,95 @@
+"""
+Накладні витрати стеку middleware на запит: той самий тривіальний маршрут
+без middleware і зі стеком src.main.app, викликаний напряму через ASGI
+(без мережі), щоб різниця була саме ціною middleware.
+
+    python -m src.benchmarks.bench_middleware --requests 20000
+"""
+import argparse
+import asyncio
+import os
+import time
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+from fastapi import FastAPI
+from src.main import app as production_app
+
+
+def build_app(middleware) -> FastAPI:
+    """
+
+    :param middleware: список starlette Middleware
+    :return:
+    """
+    app = FastAPI(middleware=list(middleware))
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    return app
+
+
+async def measure(app: FastAPI, requests: int, headers: list) -> float:
+    """
+
+    :param app:
+    :param requests:
+    :param headers:
+    :return: мікросекунд на запит
+    """
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/ping", "raw_path": b"/ping", "root_path": "", "query_string": b"",
+        "headers": headers, "client": ("127.0.0.1", 50000), "server": ("test", 80),
+    }
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    for _ in range(min(requests, 1000)):
+        await app(dict(scope), receive, send)
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+async def run(requests: int) -> None:
+    """
+
+    :param requests:
+    :return:
+    """
+    stack = production_app.user_middleware
+    print("middleware: " + (", ".join(m.cls.__name__ for m in stack) or "none"))
+    plain = [(b"host", b"test")]
+    cors = plain + [(b"origin", b"https://example.com")]
+    variants = [
+        ("no middleware", build_app([]), plain),
+        ("app stack", build_app(stack), plain),
+        ("app stack, CORS request", build_app(stack), cors),
+    ]
+    baseline = None
+    for name, app, headers in variants:
+        per_request = await measure(app, requests, headers)
+        baseline = per_request if baseline is None else baseline
+        print(f"{name:26s} {per_request:8.1f} us/request  (+{per_request - baseline:6.1f} us)")
+
+
+def main():
+    """
+
+    :return:
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=20000)
+    asyncio.run(run(parser.parse_args().requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Пропускна здатність bcrypt на цьому залізі: хешів за секунду на ядро для
+кожної вартості та результат калібрування під PASSWORD_HASH_TARGET_MS.
+
+    python -m src.benchmarks.bench_password_hash --rounds 10 11 12 --processes 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+from src.auth import PASSWORD_HASH_TARGET_MS, calibrate_password_hashing, pwd_context
+
+
+def hash_for(rounds: int, seconds: float) -> int:
+    """
+
+    :param rounds:
+    :param seconds:
+    :return: кількість хешів за відведений час
+    """
+    count = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pwd_context.hash("benchmark-password", rounds=rounds)
+        count += 1
+    return count
+
+
+def main():
+    """
+
+    :return:
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, nargs="+", default=[10, 11, 12])
+    parser.add_argument("--seconds", type=float, default=3.0)
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    print(f"cores: {os.cpu_count()}, processes: {args.processes}")
+    for rounds in args.rounds:
+        single = hash_for(rounds, args.seconds) / args.seconds
+        with ProcessPoolExecutor(args.processes) as pool:
+            counts = pool.map(hash_for, [rounds] * args.processes, [args.seconds] * args.processes)
+            total = sum(counts) / args.seconds
+        print(
+            f"rounds={rounds:2d}  {1000 / single:8.1f} ms/hash  "
+            f"{single:7.2f} hashes/s/core (1 process)  "
+            f"{total / args.processes:7.2f} hashes/s/core ({args.processes} processes, {total:.2f} total)"
+        )
+
+    rounds = calibrate_password_hashing()
+    print(f"calibrated for {PASSWORD_HASH_TARGET_MS} ms: {rounds} rounds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Ціна побудови запитів: гарячі SELECT-и, зібрані на кожен виклик (як було),
+проти зібраних один раз з bindparam (src.crud, src.auth). Обидва варіанти
+виконуються синхронною сесією на SQLite у пам'яті з кількома рядками,
+тож різниця — це CPU на побудову конструкції та ключа кешу компіляції.
+
+    python -m src.benchmarks.bench_statements --queries 20000
+"""
+import argparse
+import os
+import time
+from datetime import date, timedelta
+
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite://")
+
+from sqlalchemy import create_engine, or_, select
+from sqlalchemy.orm import Session
+from src import crud
+from src.auth import USER_BY_EMAIL
+from src.database import Base
+from src.models import BirthdayDigest, Contact, User
+
+TODAY = date.today()
+UNTIL = TODAY + timedelta(days=7)
+
+
+def inline_queries() -> dict:
+    """
+    Запити так, як їх будували до переходу на bindparam.
+
+    :return: назва -> функція, що повертає (statement, params)
+    """
+    return {
+        "get_contact": lambda: (select(Contact).where(Contact.id == 1, Contact.user_id == 1), None),
+        "get_contacts_page": lambda: (
+            select(Contact.first_name, Contact.phone).where(Contact.user_id == 1)
+            .order_by(Contact.id).offset(10).limit(50),
+            None,
+        ),
+        "search_contacts": lambda: (
+            select(Contact).where(
+                Contact.user_id == 1,
+                or_(
+                    Contact.first_name.ilike("%first%"),
+                    Contact.last_name.ilike("%first%"),
+                    Contact.email.ilike("%first%"),
+                ),
+            ).order_by(Contact.id),
+            None,
+        ),
+        "get_upcoming_birthdays": lambda: (
+            select(Contact).join(BirthdayDigest, BirthdayDigest.contact_id == Contact.id).where(
+                BirthdayDigest.user_id == 1,
+                BirthdayDigest.next_birthday >= TODAY,
+                BirthdayDigest.next_birthday <= UNTIL,
+            ).order_by(BirthdayDigest.next_birthday, Contact.id),
+            None,
+        ),
+        "user_by_email": lambda: (select(User).where(User.email == "bench@example.com"), None),
+    }
+
+
+def cached_queries() -> dict:
+    """
+
+    :return: назва -> функція, що повертає (statement, params)
+    """
+    return {
+        "get_contact": lambda: (crud.CONTACT_BY_ID, {"contact_id": 1, "user_id": 1}),
+        "get_contacts_page": lambda: (
+            crud.contacts_statement(("first_name", "phone"), True, True),
+            crud.page_params({"user_id": 1}, 10, 50),
+        ),
+        "search_contacts": lambda: (
+            crud.search_statement(None, False, False), {"user_id": 1, "pattern": "%first%"},
+        ),
+        "get_upcoming_birthdays": lambda: (
+            crud.birthdays_statement(None, False, False), {"user_id": 1, "today": TODAY, "until": UNTIL},
+        ),
+        "user_by_email": lambda: (USER_BY_EMAIL, {"email": "bench@example.com"}),
+    }
+
+
+def seed(session: Session) -> None:
+    """
+
+    :param session:
+    :return:
+    """
+    session.add(User(id=1, email="bench@example.com", hashed_password="!"))
+    for contact_id in range(1, 21):
+        session.add(Contact(
+            id=contact_id, first_name=f"first{contact_id}", last_name="Bench",
+            email=f"bench{contact_id}@example.com", phone=f"067000{contact_id:04d}",
+            birthday=TODAY, user_id=1,
+        ))
+    session.commit()
+
+
+def measure(session: Session, build, queries: int) -> float:
+    """
+
+    :param session:
+    :param build:
+    :param queries:
+    :return: мікросекунд на запит
+    """
+    for _ in range(min(queries, 1000)):
+        statement, params = build()
+        session.execute(statement, params).all()
+    started = time.perf_counter()
+    for _ in range(queries):
+        statement, params = build()
+        session.execute(statement, params).all()
+    return (time.perf_counter() - started) / queries * 1e6
+
+
+def main():
+    """
+
+    :return:
+    """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=20000)
+    queries = parser.parse_args().queries
+
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        seed(session)
+        inline, cached = inline_queries(), cached_queries()
+        print(f"{'query':24s} {'inline':>10s} {'cached':>10s} {'saved':>10s}")
+        for name in inline:
+            before = measure(session, inline[name], queries)
+            after = measure(session, cached[name], queries)
+            print(f"{name:24s} {before:7.1f} us {after:7.1f} us {before - after:7.1f} us")
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
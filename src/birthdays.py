@@ -0,0 +1,242 @@
+"""
+Матеріалізований дайджест днів народження.
+
+Для кожного контакту з датою народження таблиця birthday_digest зберігає
+найближчу дату святкування. Рядок оновлюється в тій самій транзакції, що й
+контакт, а раз на добу один прохід по всіх користувачах переносить уже минулі
+дати на наступний рік. Ручний запуск:
+
+    python -m src.birthdays [--full]
+"""
+import argparse
+import asyncio
+import calendar
+import logging
+from datetime import date, datetime, timedelta
+from typing import Optional
+from sqlalchemy import delete, exists, insert, or_, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import ShardSessions
+from src.models import BirthdayDigest, Contact
+
+logger = logging.getLogger(__name__)
+
+UPCOMING_DAYS = 7
+REFRESH_BATCH_SIZE = 5000
+
+
+def birthday_in_year(birthday: date, year: int) -> date:
+    """
+    29 лютого в невисокосний рік святкується 28-го.
+
+    :param birthday:
+    :param year:
+    :return:
+    """
+    if birthday.month == 2 and birthday.day == 29 and not calendar.isleap(year):
+        return date(year, 2, 28)
+    return birthday.replace(year=year)
+
+
+def next_birthday(birthday: date, today: date) -> date:
+    """
+
+    :param birthday:
+    :param today:
+    :return:
+    """
+    occurrence = birthday_in_year(birthday, today.year)
+    if occurrence < today:
+        occurrence = birthday_in_year(birthday, today.year + 1)
+    return occurrence
+
+
+async def sync_contact_digest(db: AsyncSession, contact: Contact, created: bool = False) -> None:
+    """
+    Оновлює рядок дайджесту контакту; викликається з crud до commit.
+
+    :param db:
+    :param contact:
+    :param created:
+    :return:
+    """
+    if contact.birthday is None:
+        if not created:
+            await db.execute(delete(BirthdayDigest).where(BirthdayDigest.contact_id == contact.id))
+        return
+    values = {
+        "contact_id": contact.id,
+        "user_id": contact.user_id,
+        "next_birthday": next_birthday(contact.birthday, date.today()),
+    }
+    if created:
+        await db.execute(insert(BirthdayDigest).values(**values))
+    else:
+        await db.merge(BirthdayDigest(**values))
+
+
+async def delete_contact_digest(db: AsyncSession, contact_id: int) -> None:
+    """
+
+    :param db:
+    :param contact_id:
+    :return:
+    """
+    await db.execute(delete(BirthdayDigest).where(BirthdayDigest.contact_id == contact_id))
+
+
+async def refresh_birthday_digest(db: AsyncSession, today: Optional[date] = None, full: bool = False) -> int:
+    """
+    Один прохід по контактах усіх користувачів пачками за id. Без full
+    перераховуються лише відсутні рядки та дати, що вже минули. З full
+    перераховується кожен рядок на місці, а рядки контактів без дати
+    народження видаляються наприкінці: таблицю не очищають наперед, тож
+    читачі під час проходу бачать повний дайджест.
+
+    :param db:
+    :param today:
+    :param full:
+    :return: кількість записаних рядків
+    """
+    today = today or date.today()
+    query = (
+        select(Contact.id, Contact.user_id, Contact.birthday, BirthdayDigest.contact_id)
+        .outerjoin(BirthdayDigest, BirthdayDigest.contact_id == Contact.id)
+        .where(Contact.birthday.isnot(None))
+    )
+    if not full:
+        query = query.where(or_(BirthdayDigest.contact_id.is_(None), BirthdayDigest.next_birthday < today))
+
+    written = 0
+    last_id = 0
+    while True:
+        rows = (await db.execute(
+            query.where(Contact.id > last_id).order_by(Contact.id).limit(REFRESH_BATCH_SIZE)
+        )).all()
+        if not rows:
+            break
+        inserts, updates = [], []
+        for contact_id, user_id, birthday, existing in rows:
+            values = {
+                "contact_id": contact_id,
+                "user_id": user_id,
+                "next_birthday": next_birthday(birthday, today),
+            }
+            (updates if existing else inserts).append(values)
+        if inserts:
+            await db.execute(insert(BirthdayDigest), inserts)
+        if updates:
+            await db.execute(update(BirthdayDigest), updates)
+        await db.commit()
+        written += len(rows)
+        last_id = rows[-1][0]
+
+    if full:
+        await db.execute(delete(BirthdayDigest).where(~exists().where(
+            Contact.id == BirthdayDigest.contact_id, Contact.birthday.isnot(None)
+        )))
+        await db.commit()
+    return written
+
+
+async def get_birthday_feed(db: AsyncSession, start: date, days: int, after: Optional[tuple], limit: int):
+    """
+    Дні народження всіх користувачів у вікні [start, start + days) з keyset-пагінацією
+    за (next_birthday, user_id, contact_id).
+
+    :param db:
+    :param start:
+    :param days:
+    :param after:
+    :param limit:
+    :return:
+    """
+    query = (
+        select(
+            BirthdayDigest.next_birthday,
+            BirthdayDigest.user_id,
+            Contact.id.label("contact_id"),
+            Contact.first_name,
+            Contact.last_name,
+            Contact.email,
+            Contact.phone,
+        )
+        .join(Contact, Contact.id == BirthdayDigest.contact_id)
+        .where(BirthdayDigest.next_birthday >= start, BirthdayDigest.next_birthday < start + timedelta(days=days))
+        .order_by(BirthdayDigest.next_birthday, BirthdayDigest.user_id, BirthdayDigest.contact_id)
+        .limit(limit)
+    )
+    if after:
+        query = query.where(
+            tuple_(BirthdayDigest.next_birthday, BirthdayDigest.user_id, BirthdayDigest.contact_id) > tuple_(*after)
+        )
+    result = await db.execute(query)
+    return [row._asdict() for row in result]
+
+
+async def get_sharded_birthday_feed(db: AsyncSession, start: date, days: int, after: Optional[tuple], limit: int):
+    """
+    Та сама сторінка з усіх шардів; db — сесія шарду 0. Ключ сортування
+    унікальний між шардами, бо користувач живе лише на одному.
+
+    :param db:
+    :param start:
+    :param days:
+    :param after:
+    :param limit:
+    :return:
+    """
+    items = await get_birthday_feed(db, start, days, after, limit)
+    for shard_session in ShardSessions[1:]:
+        async with shard_session() as session:
+            items += await get_birthday_feed(session, start, days, after, limit)
+    items.sort(key=lambda item: (item["next_birthday"], item["user_id"], item["contact_id"]))
+    return items[:limit]
+
+
+def seconds_until_tomorrow() -> float:
+    """
+
+    :return:
+    """
+    now = datetime.now()
+    tomorrow = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return (tomorrow - now).total_seconds()
+
+
+async def run_daily_refresh() -> None:
+    """
+    Фонова задача застосунку: оновлення одразу після старту, далі щоночі.
+    Запускається через run_as_leader, тож працює лише в одному воркері.
+
+    :return:
+    """
+    while True:
+        try:
+            written = 0
+            for shard_session in ShardSessions:
+                async with shard_session() as session:
+                    written += await refresh_birthday_digest(session)
+            logger.info("birthday digest refreshed, %s rows", written)
+        except Exception:
+            logger.exception("birthday digest refresh failed")
+        await asyncio.sleep(seconds_until_tomorrow() + 1)
+
+
+async def main(full: bool) -> None:
+    """
+
+    :param full:
+    :return:
+    """
+    written = 0
+    for shard_session in ShardSessions:
+        async with shard_session() as session:
+            written += await refresh_birthday_digest(session, full=full)
+    print(f"Дайджест днів народження оновлено: {written}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--full", action="store_true", help="перебудувати всю таблицю")
+    asyncio.run(main(parser.parse_args().full))
@@ -0,0 +1,120 @@
+"""
+Окремі "смуги" конкурентності для різних класів запитів.
+
+Хешування паролів забирає CPU, тому ендпоінти, що його виконують, ідуть
+через auth_lane з власним лімітом, коротким чергуванням і окремим пулом
+потоків. Коли смуга заповнена, запит одразу отримує 503 з Retry-After, а
+контакти мають власну смугу, яку хвиля логінів не може зайняти.
+"""
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException
+
+CPU_COUNT = os.cpu_count() or 1
+
+AUTH_LANE_CONCURRENCY = int(os.getenv("AUTH_LANE_CONCURRENCY", str(max(1, CPU_COUNT - 1))))
+AUTH_LANE_QUEUE_SIZE = int(os.getenv("AUTH_LANE_QUEUE_SIZE", str(AUTH_LANE_CONCURRENCY * 4)))
+AUTH_LANE_QUEUE_TIMEOUT = float(os.getenv("AUTH_LANE_QUEUE_TIMEOUT", "2"))
+CONTACTS_LANE_CONCURRENCY = int(os.getenv("CONTACTS_LANE_CONCURRENCY", "200"))
+CONTACTS_LANE_QUEUE_SIZE = int(os.getenv("CONTACTS_LANE_QUEUE_SIZE", "400"))
+CONTACTS_LANE_QUEUE_TIMEOUT = float(os.getenv("CONTACTS_LANE_QUEUE_TIMEOUT", "5"))
+
+
+class Bulkhead:
+    """
+    Ліміт одночасних запитів і обмежена черга очікування.
+    Використовується як залежність FastAPI: Depends(lane).
+    """
+
+    def __init__(self, name: str, concurrency: int, queue_size: int, queue_timeout: float,
+                 threads: int = 0):
+        self.name = name
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix=f"{name}-lane") if threads else None
+
+    def _reject(self):
+        self.rejected += 1
+        retry_after = max(1, round(self.queue_timeout))
+        return HTTPException(
+            status_code=503,
+            detail=f"{self.name} lane is busy, retry later",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+    async def acquire(self) -> None:
+        """
+
+        :return:
+        """
+        if not self._semaphore.locked():
+            await self._semaphore.acquire()
+            self.active += 1
+            self.admitted += 1
+            return
+        if self.waiting >= self.queue_size:
+            raise self._reject()
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise self._reject()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        self.admitted += 1
+
+    def release(self) -> None:
+        """
+
+        :return:
+        """
+        self.active -= 1
+        self._semaphore.release()
+
+    async def __call__(self):
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def run(self, func, *args):
+        """
+        Виконує CPU-важку функцію у власному пулі потоків смуги.
+
+        :param func:
+        :param args:
+        :return:
+        """
+        return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+    def stats(self) -> dict:
+        """
+
+        :return:
+        """
+        return {
+            "concurrency": self.concurrency,
+            "active": self.active,
+            "queue_size": self.queue_size,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+        }
+
+
+auth_lane = Bulkhead(
+    "auth", AUTH_LANE_CONCURRENCY, AUTH_LANE_QUEUE_SIZE, AUTH_LANE_QUEUE_TIMEOUT, threads=AUTH_LANE_CONCURRENCY
+)
+contacts_lane = Bulkhead(
+    "contacts", CONTACTS_LANE_CONCURRENCY, CONTACTS_LANE_QUEUE_SIZE, CONTACTS_LANE_QUEUE_TIMEOUT
+)
+lanes = (auth_lane, contacts_lane)
@@ -1,9 +1,174 @@
+"""
+Запити до контактів.
+
+Гарячі SELECT-и зібрані один раз на процес з bindparam замість значень:
+кожен виклик лише передає параметри, а SQLAlchemy не будує конструкцію
+заново і бере вже скомпільований SQL (і prepared statement asyncpg) з
+кешу за мемоізованим ключем. Варіанти зі sparse-полями та пагінацією
+кешуються за набором полів, фільтр за групами — за тим, які його умови
+задані (самі id груп теж ідуть параметрами, див. src.groups).
+"""
+from functools import lru_cache
 from sqlalchemy.future import select
-from sqlalchemy import or_
-from src.models import Contact
-from src.schemas import ContactCreate, ContactUpdate
+from sqlalchemy import bindparam, or_
+from src.models import Contact, BirthdayDigest
+from src.birthdays import UPCOMING_DAYS, sync_contact_digest, delete_contact_digest
+from src.sync import next_change_seq, add_tombstone
+from src.stats import apply_stats_delta, contact_counters, stats_delta
+from src.events import event_bus
+from src.autocomplete import autocomplete_index
+from src.phones import normalize_phone_e164
+from src.singleflight import contact_reads
+from src.groups import GroupFilter, delete_contact_memberships, group_filter_clause, group_filter_params
+from src.schemas import ContactCreate, ContactRead, ContactUpdate
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import date, timedelta
+from typing import Optional, Sequence, Tuple
+
+STATEMENT_CACHE_SIZE = 256
+
+CONTACT_BY_ID = select(Contact).where(
+    Contact.id == bindparam("contact_id"), Contact.user_id == bindparam("user_id")
+)
+CONTACTS_BY_PHONE = select(Contact).where(
+    Contact.user_id == bindparam("user_id"), Contact.phone_e164 == bindparam("phone_e164")
+)
+
+
+def select_contacts(fields: Optional[Sequence[str]] = None):
+    """
+    SELECT лише потрібних колонок; імена вже перевірені за ContactRead.
+
+    :param fields:
+    :return:
+    """
+    if fields is None:
+        return select(Contact)
+    return select(*(getattr(Contact, name) for name in fields))
+
+
+def paginate(query, skip: bool = False, limit: bool = False):
+    """
+    OFFSET/LIMIT як параметри :skip і :limit, щоб різні сторінки мали один SQL.
+
+    :param query:
+    :param skip:
+    :param limit:
+    :return:
+    """
+    if skip:
+        query = query.offset(bindparam("skip"))
+    if limit:
+        query = query.limit(bindparam("limit"))
+    return query
+
+
+def page_params(params: dict, skip: int = 0, limit: Optional[int] = None) -> dict:
+    """
+
+    :param params:
+    :param skip:
+    :param limit:
+    :return:
+    """
+    if skip:
+        params["skip"] = skip
+    if limit is not None:
+        params["limit"] = limit
+    return params
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def contacts_statement(fields: Optional[tuple], skip: bool, limit: bool,
+                       groups: Tuple[bool, bool, bool] = (False, False, False)):
+    """
+
+    :param fields:
+    :param skip:
+    :param limit:
+    :param groups: GroupFilter.shape
+    :return:
+    """
+    query = select_contacts(fields).where(
+        Contact.user_id == bindparam("user_id"), *group_filter_clause(groups)
+    ).order_by(Contact.id)
+    return paginate(query, skip, limit)
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def search_statement(fields: Optional[tuple], skip: bool, limit: bool):
+    """
+
+    :param fields:
+    :param skip:
+    :param limit:
+    :return:
+    """
+    pattern = bindparam("pattern")
+    query = select_contacts(fields).where(
+        Contact.user_id == bindparam("user_id"),
+        or_(
+            Contact.first_name.ilike(pattern),
+            Contact.last_name.ilike(pattern),
+            Contact.email.ilike(pattern),
+        )
+    ).order_by(Contact.id)
+    return paginate(query, skip, limit)
+
+
+@lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def birthdays_statement(fields: Optional[tuple], skip: bool, limit: bool):
+    """
+
+    :param fields:
+    :param skip:
+    :param limit:
+    :return:
+    """
+    query = (
+        select_contacts(fields)
+        .select_from(Contact)
+        .join(BirthdayDigest, BirthdayDigest.contact_id == Contact.id)
+        .where(
+            BirthdayDigest.user_id == bindparam("user_id"),
+            BirthdayDigest.next_birthday >= bindparam("today"),
+            BirthdayDigest.next_birthday <= bindparam("until"),
+        )
+        .order_by(BirthdayDigest.next_birthday, Contact.id)
+    )
+    return paginate(query, skip, limit)
+
+
+async def fetch_contacts(db: AsyncSession, query, params: dict, fields: Optional[Sequence[str]] = None):
+    """
+
+    :param db:
+    :param query:
+    :param params:
+    :param fields:
+    :return: ORM-об'єкти або, для sparse-запиту, словники з вибраними полями
+    """
+    result = await db.execute(query, params)
+    if fields is None:
+        return result.scalars().all()
+    return [row._asdict() for row in result]
+
+
+async def fetch_shared_contacts(db: AsyncSession, query, params: dict, fields: Optional[Sequence[str]] = None):
+    """
+    Для contact_reads.do: результат лідера отримують і запити, що приєдналися,
+    тож ORM-об'єкти сесії лідера перетворюються на ContactRead ще всередині польоту.
+
+    :param db:
+    :param query:
+    :param params:
+    :param fields:
+    :return: ContactRead або, для sparse-запиту, словники з вибраними полями
+    """
+    contacts = await fetch_contacts(db, query, params, fields)
+    if fields is None:
+        return [ContactRead.model_validate(contact) for contact in contacts]
+    return contacts
 
 
 async def create_contact(db: AsyncSession, contact: ContactCreate, user_id: int):
@@ -14,22 +179,43 @@ async def create_contact(db: AsyncSession, contact: ContactCreate, user_id: int)
     :param user_id:
     :return:
     """
-    db_contact = Contact(**contact.model_dump(), user_id=user_id)
+    db_contact = Contact(
+        **contact.model_dump(),
+        phone_e164=normalize_phone_e164(contact.phone),
+        change_seq=await next_change_seq(db, user_id),
+        user_id=user_id,
+    )
     db.add(db_contact)
+    await db.flush()
+    await sync_contact_digest(db, db_contact, created=True)
+    await apply_stats_delta(db, user_id, stats_delta(contact_counters(None), contact_counters(db_contact)))
     await db.commit()
+    contact_reads.forget(user_id)
     await db.refresh(db_contact)
+    autocomplete_index.contact_saved(user_id, db_contact)
+    await event_bus.publish_contact(user_id, "created", db_contact.id, db_contact.change_seq, db_contact)
     return db_contact
 
 
-async def get_contacts(db: AsyncSession, user_id: int):
+async def get_contacts(db: AsyncSession, user_id: int, fields: Optional[Sequence[str]] = None,
+                       skip: int = 0, limit: Optional[int] = None, groups: GroupFilter = GroupFilter()):
     """
 
     :param db:
     :param user_id:
+    :param fields:
+    :param skip:
+    :param limit:
+    :param groups:
     :return:
     """
-    result = await db.execute(select(Contact).where(Contact.user_id == user_id))
-    return result.scalars().all()
+    fields = fields and tuple(fields)
+    query = contacts_statement(fields, bool(skip), limit is not None, groups.shape)
+    params = page_params({"user_id": user_id, **group_filter_params(groups)}, skip, limit)
+    return await contact_reads.do(
+        ("contacts", user_id, fields, skip, limit, groups),
+        lambda: fetch_shared_contacts(db, query, params, fields),
+    )
 
 
 async def get_contact(db: AsyncSession, contact_id: int, user_id: int):
@@ -40,9 +226,7 @@ async def get_contact(db: AsyncSession, contact_id: int, user_id: int):
     :param user_id:
     :return:
     """
-    result = await db.execute(
-        select(Contact).where(Contact.id == contact_id, Contact.user_id == user_id)
-    )
+    result = await db.execute(CONTACT_BY_ID, {"contact_id": contact_id, "user_id": user_id})
     return result.scalar_one_or_none()
 
 
@@ -57,10 +241,21 @@ async def update_contact(db: AsyncSession, contact_id: int, contact_data: Contac
     """
     db_contact = await get_contact(db, contact_id, user_id)
     if db_contact:
-        for key, value in contact_data.dict(exclude_unset=True).items():
+        counters_before = contact_counters(db_contact)
+        changes = contact_data.dict(exclude_unset=True)
+        for key, value in changes.items():
             setattr(db_contact, key, value)
+            if key == "phone":
+                db_contact.phone_e164 = normalize_phone_e164(value)
+        if "birthday" in changes:
+            await sync_contact_digest(db, db_contact)
+        db_contact.change_seq = await next_change_seq(db, user_id)
+        await apply_stats_delta(db, user_id, stats_delta(counters_before, contact_counters(db_contact)))
         await db.commit()
+        contact_reads.forget(user_id)
         await db.refresh(db_contact)
+        autocomplete_index.contact_saved(user_id, db_contact)
+        await event_bus.publish_contact(user_id, "updated", db_contact.id, db_contact.change_seq, db_contact)
     return db_contact
 
 
@@ -74,52 +269,68 @@ async def delete_contact(db: AsyncSession, contact_id: int, user_id: int):
     """
     db_contact = await get_contact(db, contact_id, user_id)
     if db_contact:
+        await delete_contact_digest(db, contact_id)
+        await delete_contact_memberships(db, contact_id)
+        change_seq = await add_tombstone(db, user_id, contact_id)
         await db.delete(db_contact)
+        await apply_stats_delta(db, user_id, stats_delta(contact_counters(db_contact), contact_counters(None)))
         await db.commit()
+        contact_reads.forget(user_id)
+        autocomplete_index.contact_deleted(user_id, contact_id)
+        await event_bus.publish_contact(user_id, "deleted", contact_id, change_seq)
     return db_contact
 
 
-async def search_contacts(db: AsyncSession, query: str, user_id: int):
+async def get_contacts_by_phone(db: AsyncSession, phone: str, user_id: int):
     """
 
     :param db:
-    :param query:
+    :param phone:
     :param user_id:
     :return:
     """
-    result = await db.execute(
-        select(Contact).where(
-            Contact.user_id == user_id,
-            or_(
-                Contact.first_name.ilike(f"%{query}%"),
-                Contact.last_name.ilike(f"%{query}%"),
-                Contact.email.ilike(f"%{query}%"),
-            )
-        )
-    )
+    phone_e164 = normalize_phone_e164(phone)
+    if phone_e164 is None:
+        return []
+    result = await db.execute(CONTACTS_BY_PHONE, {"user_id": user_id, "phone_e164": phone_e164})
     return result.scalars().all()
 
 
-async def get_upcoming_birthdays(db: AsyncSession, user_id: int):
+async def search_contacts(db: AsyncSession, query: str, user_id: int, fields: Optional[Sequence[str]] = None,
+                          skip: int = 0, limit: Optional[int] = None):
+    """
+
+    :param db:
+    :param query:
+    :param user_id:
+    :param fields:
+    :param skip:
+    :param limit:
+    :return:
+    """
+    fields = fields and tuple(fields)
+    statement = search_statement(fields, bool(skip), limit is not None)
+    params = page_params({"user_id": user_id, "pattern": f"%{query}%"}, skip, limit)
+    return await fetch_contacts(db, statement, params, fields)
+
+
+async def get_upcoming_birthdays(db: AsyncSession, user_id: int, fields: Optional[Sequence[str]] = None,
+                                 skip: int = 0, limit: Optional[int] = None):
     """
 
     :param db:
     :param user_id:
+    :param fields:
+    :param skip:
+    :param limit:
     :return:
     """
     today = date.today()
-    next_week = today + timedelta(days=7)
-
-    result = await db.execute(select(Contact).where(Contact.user_id == user_id))
-    contacts = result.scalars().all()
-
-    upcoming = []
-    for contact in contacts:
-        if not contact.birthday:
-            continue
-        birthday_this_year = contact.birthday.replace(year=today.year)
-        if birthday_this_year < today:
-            birthday_this_year = contact.birthday.replace(year=today.year + 1)
-        if today <= birthday_this_year <= next_week:
-            upcoming.append(contact)
-    return upcoming
+    fields = fields and tuple(fields)
+    query = birthdays_statement(fields, bool(skip), limit is not None)
+    until = today + timedelta(days=UPCOMING_DAYS)
+    params = page_params({"user_id": user_id, "today": today, "until": until}, skip, limit)
+    return await contact_reads.do(
+        ("birthdays", user_id, today, fields, skip, limit),
+        lambda: fetch_shared_contacts(db, query, params, fields),
+    )
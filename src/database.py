@@ -4,12 +4,15 @@ from sqlalchemy.orm import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
+from src.admission import PoolAdmission
 
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_async_engine(DATABASE_URL, echo=True, future=True)
+# SQL не пишеться через echo (синхронно в stderr з циклу подій): LOG_SQL=1
+# вмикає логер sqlalchemy.engine, що йде через чергу src.logs з вибіркою.
+engine = create_async_engine(DATABASE_URL, future=True)
 #async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
 AsyncSessionLocal = sessionmaker(
@@ -19,6 +22,21 @@ AsyncSessionLocal = sessionmaker(
     class_=AsyncSession
 )
 
+# Шард 0 — основна БД з users; DATABASE_SHARD_URLS (через кому) додає шарди 1..N
+# для контактів. Який шард у користувача, вирішує src.sharding.shard_map.
+DATABASE_SHARD_URLS = [url.strip() for url in os.getenv("DATABASE_SHARD_URLS", "").split(",") if url.strip()]
+
+shard_engines = [engine] + [create_async_engine(url, future=True) for url in DATABASE_SHARD_URLS]
+ShardSessions = [AsyncSessionLocal] + [
+    sessionmaker(autocommit=False, autoflush=False, bind=shard_engine, class_=AsyncSession)
+    for shard_engine in shard_engines[1:]
+]
+
+# Допуск до пулу кожного шарду: 503 замість черги, коли БД не встигає.
+pool_admissions = [
+    PoolAdmission(f"shard-{shard_id}", shard_engine) for shard_id, shard_engine in enumerate(shard_engines)
+]
+
 Base = declarative_base()
 
 
@@ -27,5 +45,5 @@ async def get_db():
 
     :return:
     """
-    async with AsyncSessionLocal() as session:
+    async with pool_admissions[0].session(AsyncSessionLocal) as session:
         yield session
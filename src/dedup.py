@@ -0,0 +1,229 @@
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import or_, select, update
+from sqlalchemy.exc import IntegrityError
+from src.sharding import shard_map
+from src.models import Contact, DuplicateScan
+from src.phones import normalize_phone_e164
+
+MAX_NAME_BLOCK_SIZE = 50
+# "running" старший за цей час вважається покинутим (воркер упав) і може бути перезапущений
+DEDUP_STALE_SECONDS = int(os.getenv("DEDUP_STALE_SECONDS", "600"))
+
+DEDUP_COLUMNS = (Contact.id, Contact.first_name, Contact.last_name, Contact.email, Contact.phone)
+
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "h", "ґ": "g", "д": "d", "е": "e", "є": "ie", "ж": "zh",
+    "з": "z", "и": "y", "і": "i", "ї": "i", "й": "i", "к": "k", "л": "l", "м": "m", "н": "n",
+    "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u", "ф": "f", "х": "kh", "ц": "ts",
+    "ч": "ch", "ш": "sh", "щ": "shch", "ь": "", "ю": "iu", "я": "ia", "ё": "e", "ы": "y", "э": "e",
+    "ъ": "",
+})
+
+_SOUNDEX_CODES = {
+    **dict.fromkeys("bfpv", "1"), **dict.fromkeys("cgjkqsxz", "2"), **dict.fromkeys("dt", "3"),
+    "l": "4", **dict.fromkeys("mn", "5"), "r": "6",
+}
+
+
+def normalize_email(email: str) -> str:
+    """
+    Нижній регістр і без "+мітки" в локальній частині.
+
+    :param email:
+    :return:
+    """
+    email = (email or "").strip().casefold()
+    local, _, domain = email.partition("@")
+    if not domain:
+        return email
+    return f"{local.split('+', 1)[0]}@{domain}"
+
+
+def soundex(name: str) -> str:
+    """
+
+    :param name:
+    :return:
+    """
+    letters = [c for c in (name or "").casefold().translate(_TRANSLIT) if "a" <= c <= "z"]
+    if not letters:
+        return ""
+    code = letters[0].upper()
+    previous = _SOUNDEX_CODES.get(letters[0], "")
+    for c in letters[1:]:
+        digit = _SOUNDEX_CODES.get(c, "")
+        if digit and digit != previous:
+            code += digit
+            if len(code) == 4:
+                break
+        if c not in "hw":
+            previous = digit
+    return code.ljust(4, "0")
+
+
+def blocking_keys(first_name: str, last_name: str, email: str, phone: str) -> list:
+    """
+
+    :param first_name:
+    :param last_name:
+    :param email:
+    :param phone:
+    :return:
+    """
+    keys = []
+    email_key = normalize_email(email)
+    if email_key:
+        keys.append(("email", email_key))
+    phone_key = normalize_phone_e164(phone)
+    if phone_key:
+        keys.append(("phone", phone_key))
+    first_key, last_key = soundex(first_name), soundex(last_name)
+    if first_key and last_key:
+        keys.append(("name", "".join(sorted((first_key, last_key)))))
+    return keys
+
+
+def find_duplicate_clusters(rows) -> list:
+    """
+    Групує контакти, що мають спільний ключ блокування. Кожен рядок потрапляє
+    у кілька блоків, а union-find об'єднує блоки, тож робота майже лінійна
+    замість попарного порівняння O(n²). Завеликі блоки за іменем пропускаються:
+    вони дають шум, а не дублікати.
+
+    :param rows: (id, first_name, last_name, email, phone)
+    :return:
+    """
+    blocks = defaultdict(list)
+    for contact_id, first_name, last_name, email, phone in rows:
+        for key in blocking_keys(first_name, last_name, email, phone):
+            blocks[key].append(contact_id)
+
+    parent = {}
+
+    def find(x):
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while x != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    reasons = defaultdict(set)
+    for (kind, _), members in blocks.items():
+        if len(members) < 2 or (kind == "name" and len(members) > MAX_NAME_BLOCK_SIZE):
+            continue
+        for member in members:
+            parent.setdefault(member, member)
+        root = find(members[0])
+        for member in members[1:]:
+            other = find(member)
+            if other != root:
+                parent[other] = root
+        reasons[members[0]].add(kind)
+
+    clusters = defaultdict(list)
+    for contact_id in parent:
+        clusters[find(contact_id)].append(contact_id)
+    cluster_reasons = defaultdict(set)
+    for first_member, kinds in reasons.items():
+        cluster_reasons[find(first_member)] |= kinds
+
+    return sorted(
+        (
+            {"contact_ids": sorted(members), "reasons": sorted(cluster_reasons[root])}
+            for root, members in clusters.items()
+        ),
+        key=lambda cluster: cluster["contact_ids"][0],
+    )
+
+
+class DuplicateJobs:
+    """
+    Стан фонового пошуку дублікатів у таблиці duplicate_scans на шарді
+    користувача, тож опитувати результат можна з будь-якого воркера.
+    """
+
+    def __init__(self, stale_after: int = DEDUP_STALE_SECONDS):
+        self.stale_after = stale_after
+
+    async def get(self, user_id: int):
+        """
+
+        :param user_id:
+        :return:
+        """
+        async with shard_map.user_session(user_id) as session:
+            scan = await session.get(DuplicateScan, user_id)
+            if scan is None:
+                return None
+            return {
+                "status": scan.status,
+                "computed_at": scan.computed_at,
+                "duration_ms": scan.duration_ms,
+                "clusters": scan.clusters,
+            }
+
+    async def schedule(self, user_id: int) -> bool:
+        """
+        Позначає задачу як заплановану; False, якщо вона вже виконується
+        (у тому числі в іншому воркері).
+
+        :param user_id:
+        :return:
+        """
+        now = datetime.utcnow()
+        async with shard_map.user_session(user_id) as session:
+            result = await session.execute(
+                update(DuplicateScan)
+                .where(
+                    DuplicateScan.user_id == user_id,
+                    or_(
+                        DuplicateScan.status != "running",
+                        DuplicateScan.started_at < now - timedelta(seconds=self.stale_after),
+                    ),
+                )
+                .values(status="running", started_at=now)
+            )
+            if not result.rowcount:
+                session.add(DuplicateScan(user_id=user_id, status="running", started_at=now, clusters=[]))
+            try:
+                await session.commit()
+            except IntegrityError:
+                return False
+        return True
+
+    async def run(self, user_id: int) -> None:
+        """
+
+        :param user_id:
+        :return:
+        """
+        started = time.perf_counter()
+        async with shard_map.user_session(user_id) as session:
+            try:
+                result = await session.execute(select(*DEDUP_COLUMNS).where(Contact.user_id == user_id))
+                rows = [tuple(row) for row in result]
+                clusters = await run_in_threadpool(find_duplicate_clusters, rows)
+            except Exception:
+                await session.rollback()
+                await session.execute(
+                    update(DuplicateScan).where(DuplicateScan.user_id == user_id).values(status="failed")
+                )
+                await session.commit()
+                raise
+            await session.execute(
+                update(DuplicateScan).where(DuplicateScan.user_id == user_id).values(
+                    status="done",
+                    computed_at=datetime.utcnow(),
+                    duration_ms=round((time.perf_counter() - started) * 1000, 1),
+                    clusters=clusters,
+                )
+            )
+            await session.commit()
+
+
+duplicate_jobs = DuplicateJobs()
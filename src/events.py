@@ -0,0 +1,296 @@
+"""
+Події змін контактів для живих підключень клієнтів.
+
+crud публікує подію після commit. Кожен воркер тримає локальні
+підписки своїх WebSocket-з'єднань, а бекенд доставляє події між
+воркерами: "memory" для одного процесу й тестів, "redis" для кількох
+воркерів uvicorn (EVENTS_BACKEND=redis, REDIS_URL).
+
+Кожне з'єднання має власну чергу: події одного контакту зливаються,
+а якщо клієнт не встигає і черга переповнюється, замість подій він
+отримує {"type": "resync"} і добирає зміни через /contacts/changes.
+Так само resync отримують усі з'єднання воркера після обриву зв'язку з
+Redis: події, опубліковані за час розриву, до воркера вже не дійдуть.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from src.schemas import ContactRead
+
+logger = logging.getLogger(__name__)
+
+EVENTS_BACKEND = os.getenv("EVENTS_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+EVENTS_CHANNEL_PREFIX = "contacts:"
+EVENTS_MAX_PENDING = int(os.getenv("EVENTS_MAX_PENDING", "256"))
+EVENTS_COALESCE_MS = float(os.getenv("EVENTS_COALESCE_MS", "50"))
+EVENTS_RECONNECT_MIN_SECONDS = float(os.getenv("EVENTS_RECONNECT_MIN_SECONDS", "0.5"))
+EVENTS_RECONNECT_MAX_SECONDS = float(os.getenv("EVENTS_RECONNECT_MAX_SECONDS", "30"))
+
+
+def contact_event(event_type: str, contact_id: int, change_seq: int, contact=None) -> dict:
+    """
+
+    :param event_type: created | updated | deleted
+    :param contact_id:
+    :param change_seq: курсор /contacts/changes, що вже включає цю подію
+    :param contact:
+    :return:
+    """
+    event = {"type": event_type, "contact_id": contact_id, "change_seq": change_seq}
+    if contact is not None:
+        event["contact"] = ContactRead.model_validate(contact).model_dump(mode="json")
+    return event
+
+
+class ConnectionQueue:
+    """
+    Черга одного з'єднання зі злиттям подій за contact_id.
+    """
+
+    def __init__(self, max_pending: int = EVENTS_MAX_PENDING, coalesce_ms: float = EVENTS_COALESCE_MS):
+        self.max_pending = max_pending
+        self.coalesce = coalesce_ms / 1000
+        self.pending = OrderedDict()
+        self.overflowed = False
+        self._ready = asyncio.Event()
+
+    def put(self, event: dict) -> None:
+        """
+
+        :param event:
+        :return:
+        """
+        if self.overflowed:
+            return
+        key = event["contact_id"]
+        previous = self.pending.pop(key, None)
+        if previous is not None and previous["type"] == "created" and event["type"] == "updated":
+            event = {**event, "type": "created"}
+        if len(self.pending) >= self.max_pending:
+            self.overflowed = True
+            self.pending.clear()
+        else:
+            self.pending[key] = event
+        self._ready.set()
+
+    def resync(self) -> None:
+        """
+        Відкидає накопичене: клієнт отримає {"type": "resync"}.
+
+        :return:
+        """
+        self.overflowed = True
+        self.pending.clear()
+        self._ready.set()
+
+    async def get_batch(self) -> list:
+        """
+        Чекає на першу подію, ще coalesce_ms збирає решту сплеску.
+
+        :return:
+        """
+        await self._ready.wait()
+        if self.coalesce:
+            await asyncio.sleep(self.coalesce)
+        self._ready.clear()
+        if self.overflowed:
+            self.overflowed = False
+            return [{"type": "resync"}]
+        batch = list(self.pending.values())
+        self.pending.clear()
+        return batch
+
+
+class InProcessBackend:
+    """
+    Доставка лише в межах процесу.
+    """
+
+    broadcast = False
+
+    def __init__(self, dispatch, resync=None):
+        self.dispatch = dispatch
+
+    async def publish(self, user_id: int, event: dict) -> None:
+        """
+
+        :param user_id:
+        :param event:
+        :return:
+        """
+        self.dispatch(user_id, event)
+
+    async def start(self) -> None:
+        """
+
+        :return:
+        """
+
+    async def stop(self) -> None:
+        """
+
+        :return:
+        """
+
+
+class RedisBackend:
+    """
+    Redis pub/sub: один pattern-підписник на воркер розсилає події локальним з'єднанням.
+    """
+
+    broadcast = True
+
+    def __init__(self, dispatch, resync, url: str = REDIS_URL):
+        import redis.asyncio as redis
+
+        self.dispatch = dispatch
+        self.resync = resync
+        self.client = redis.from_url(url)
+        self.listener = None
+
+    async def publish(self, user_id: int, event: dict) -> None:
+        """
+
+        :param user_id:
+        :param event:
+        :return:
+        """
+        await self.client.publish(f"{EVENTS_CHANNEL_PREFIX}{user_id}", json.dumps(event))
+
+    async def _listen(self) -> None:
+        """
+        Підписка з перепідключенням і експоненційною паузою; після кожного
+        розриву локальні з'єднання отримують resync.
+
+        :return:
+        """
+        delay = EVENTS_RECONNECT_MIN_SECONDS
+        subscribed_before = False
+        while True:
+            pubsub = self.client.pubsub()
+            try:
+                await pubsub.psubscribe(f"{EVENTS_CHANNEL_PREFIX}*")
+                if subscribed_before:
+                    logger.info("contact events resubscribed, sending resync")
+                    self.resync()
+                subscribed_before = True
+                delay = EVENTS_RECONNECT_MIN_SECONDS
+                async for message in pubsub.listen():
+                    if message["type"] != "pmessage":
+                        continue
+                    try:
+                        user_id = int(message["channel"].decode().removeprefix(EVENTS_CHANNEL_PREFIX))
+                        self.dispatch(user_id, json.loads(message["data"]))
+                    except Exception:
+                        logger.exception("bad contact event %r", message)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.warning("contact events connection lost, reconnecting in %.1f s", delay, exc_info=True)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, EVENTS_RECONNECT_MAX_SECONDS)
+
+    async def start(self) -> None:
+        """
+
+        :return:
+        """
+        self.listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        """
+
+        :return:
+        """
+        if self.listener:
+            self.listener.cancel()
+        await self.client.aclose()
+
+
+class EventBus:
+    """
+    Локальні підписки воркера плюс бекенд доставки між воркерами.
+    """
+
+    def __init__(self, backend: str = EVENTS_BACKEND):
+        self.subscribers = {}
+        backend_class = RedisBackend if backend == "redis" else InProcessBackend
+        self.backend = backend_class(self.dispatch, self.resync_all)
+
+    def dispatch(self, user_id: int, event: dict) -> None:
+        """
+
+        :param user_id:
+        :param event:
+        :return:
+        """
+        for queue in self.subscribers.get(user_id, ()):
+            queue.put(event)
+
+    def resync_all(self) -> None:
+        """
+        Усі з'єднання воркера мають дочитати зміни через /contacts/changes.
+
+        :return:
+        """
+        for queues in self.subscribers.values():
+            for queue in queues:
+                queue.resync()
+
+    async def publish(self, user_id: int, event: dict) -> None:
+        """
+        Помилка доставки не повинна ламати запис контакту.
+
+        :param user_id:
+        :param event:
+        :return:
+        """
+        try:
+            await self.backend.publish(user_id, event)
+        except Exception:
+            logger.exception("failed to publish contact event")
+
+    async def publish_contact(self, user_id: int, event_type: str, contact_id: int, change_seq: int,
+                              contact=None) -> None:
+        """
+        Подія з crud; без слухачів у процесі й без брокера нічого не серіалізується.
+
+        :param user_id:
+        :param event_type:
+        :param contact_id:
+        :param change_seq:
+        :param contact:
+        :return:
+        """
+        if not self.backend.broadcast and user_id not in self.subscribers:
+            return
+        await self.publish(user_id, contact_event(event_type, contact_id, change_seq, contact))
+
+    @asynccontextmanager
+    async def subscribe(self, user_id: int):
+        """
+
+        :param user_id:
+        :return:
+        """
+        queue = ConnectionQueue()
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self.subscribers.get(user_id)
+            queues.discard(queue)
+            if not queues:
+                del self.subscribers[user_id]
+
+
+event_bus = EventBus()
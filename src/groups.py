@@ -0,0 +1,262 @@
+"""
+Групи контактів і фільтр за членством.
+
+Членство — таблиця contact_group_members з денормалізованим user_id:
+індекс (user_id, group_id, contact_id) віддає всіх учасників групи
+користувача без звернення до contacts, а первинний ключ
+(contact_id, group_id) — групи одного контакту.
+
+Фільтр GET /contacts/ компілюється в один SQL:
+    groups=A,B         — у всіх: id IN (... GROUP BY contact_id HAVING count(*) = 2)
+    any_groups=A,B     — хоча б в одній: id IN (...)
+    exclude_groups=C   — в жодній: NOT EXISTS (...)
+"У всіх" і "хоча б в одній" читають лише індекс членства вибраних груп, а
+не перебирають усі контакти; NOT EXISTS перевіряє контакт за первинним
+ключем членства. Списки id передаються розгортаючими bindparam, тож SQL
+залежить лише від того, які з трьох умов задано.
+"""
+from typing import NamedTuple, Optional, Tuple
+from sqlalchemy import bindparam, delete, exists, func, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import Contact, ContactGroup, ContactGroupMember
+from src.singleflight import contact_reads
+
+INSERT_DIALECTS = {"postgresql": postgresql, "sqlite": sqlite}
+
+
+class GroupFilter(NamedTuple):
+    all_of: Tuple[int, ...] = ()
+    any_of: Tuple[int, ...] = ()
+    none_of: Tuple[int, ...] = ()
+
+    @property
+    def shape(self) -> Tuple[bool, bool, bool]:
+        """
+        Які умови задані; від цього залежить текст SQL.
+
+        :return:
+        """
+        return bool(self.all_of), bool(self.any_of), bool(self.none_of)
+
+
+def group_filter_clause(shape: Tuple[bool, bool, bool]) -> list:
+    """
+
+    :param shape: GroupFilter.shape
+    :return: умови WHERE для select(Contact)
+    """
+    all_of, any_of, none_of = shape
+    clauses = []
+    if all_of:
+        clauses.append(Contact.id.in_(
+            select(ContactGroupMember.contact_id)
+            .where(
+                ContactGroupMember.user_id == bindparam("user_id"),
+                ContactGroupMember.group_id.in_(bindparam("all_groups", expanding=True)),
+            )
+            .group_by(ContactGroupMember.contact_id)
+            .having(func.count() == bindparam("all_groups_count"))
+        ))
+    if any_of:
+        clauses.append(Contact.id.in_(
+            select(ContactGroupMember.contact_id)
+            .where(
+                ContactGroupMember.user_id == bindparam("user_id"),
+                ContactGroupMember.group_id.in_(bindparam("any_groups", expanding=True)),
+            )
+        ))
+    if none_of:
+        clauses.append(~exists().where(
+            ContactGroupMember.contact_id == Contact.id,
+            ContactGroupMember.group_id.in_(bindparam("none_groups", expanding=True)),
+        ))
+    return clauses
+
+
+def group_filter_params(group_filter: GroupFilter) -> dict:
+    """
+
+    :param group_filter:
+    :return:
+    """
+    params = {}
+    if group_filter.all_of:
+        params["all_groups"] = list(group_filter.all_of)
+        params["all_groups_count"] = len(group_filter.all_of)
+    if group_filter.any_of:
+        params["any_groups"] = list(group_filter.any_of)
+    if group_filter.none_of:
+        params["none_groups"] = list(group_filter.none_of)
+    return params
+
+
+def groups_with_sizes():
+    """
+
+    :return:
+    """
+    size = (
+        select(func.count())
+        .where(ContactGroupMember.user_id == ContactGroup.user_id, ContactGroupMember.group_id == ContactGroup.id)
+        .scalar_subquery()
+    )
+    return select(ContactGroup.id, ContactGroup.name, size.label("size"))
+
+
+async def list_groups(db: AsyncSession, user_id: int) -> list:
+    """
+
+    :param db:
+    :param user_id:
+    :return:
+    """
+    result = await db.execute(
+        groups_with_sizes().where(ContactGroup.user_id == user_id).order_by(ContactGroup.name)
+    )
+    return [row._asdict() for row in result]
+
+
+async def get_group(db: AsyncSession, group_id: int, user_id: int) -> Optional[dict]:
+    """
+
+    :param db:
+    :param group_id:
+    :param user_id:
+    :return:
+    """
+    result = await db.execute(
+        groups_with_sizes().where(ContactGroup.id == group_id, ContactGroup.user_id == user_id)
+    )
+    row = result.first()
+    return row._asdict() if row else None
+
+
+async def create_group(db: AsyncSession, user_id: int, name: str) -> Optional[dict]:
+    """
+
+    :param db:
+    :param user_id:
+    :param name:
+    :return: None, якщо група з такою назвою вже є
+    """
+    group = ContactGroup(user_id=user_id, name=name)
+    db.add(group)
+    try:
+        await db.flush()
+        # після commit атрибути протухають (expire_on_commit), і читання id полізе в БД
+        group_id = group.id
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return None
+    return {"id": group_id, "name": name, "size": 0}
+
+
+async def rename_group(db: AsyncSession, group_id: int, user_id: int, name: str):
+    """
+
+    :param db:
+    :param group_id:
+    :param user_id:
+    :param name:
+    :return: оновлена група, None якщо її немає, False якщо назва зайнята
+    """
+    group = await db.scalar(
+        select(ContactGroup).where(ContactGroup.id == group_id, ContactGroup.user_id == user_id)
+    )
+    if group is None:
+        return None
+    group.name = name
+    try:
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return False
+    return await get_group(db, group_id, user_id)
+
+
+async def delete_group(db: AsyncSession, group_id: int, user_id: int) -> bool:
+    """
+
+    :param db:
+    :param group_id:
+    :param user_id:
+    :return:
+    """
+    await db.execute(
+        delete(ContactGroupMember)
+        .where(ContactGroupMember.user_id == user_id, ContactGroupMember.group_id == group_id)
+    )
+    result = await db.execute(
+        delete(ContactGroup).where(ContactGroup.id == group_id, ContactGroup.user_id == user_id)
+    )
+    await db.commit()
+    contact_reads.forget(user_id)
+    return bool(result.rowcount)
+
+
+async def add_members(db: AsyncSession, group_id: int, user_id: int, contact_ids: list) -> Optional[int]:
+    """
+    Додає контакти користувача до групи; чужі й неіснуючі id пропускаються.
+
+    :param db:
+    :param group_id:
+    :param user_id:
+    :param contact_ids:
+    :return: кількість нових членств або None, якщо групи немає
+    """
+    if await db.scalar(
+        select(ContactGroup.id).where(ContactGroup.id == group_id, ContactGroup.user_id == user_id)
+    ) is None:
+        return None
+    owned = (await db.scalars(
+        select(Contact.id).where(Contact.user_id == user_id, Contact.id.in_(contact_ids))
+    )).all()
+    if not owned:
+        return 0
+    # паралельне додавання тих самих контактів не скасовує решту пачки
+    result = await db.execute(
+        INSERT_DIALECTS[db.get_bind().dialect.name].insert(ContactGroupMember)
+        .values([
+            {"group_id": group_id, "contact_id": contact_id, "user_id": user_id}
+            for contact_id in sorted(owned)
+        ])
+        .on_conflict_do_nothing(index_elements=[ContactGroupMember.contact_id, ContactGroupMember.group_id])
+    )
+    await db.commit()
+    contact_reads.forget(user_id)
+    return result.rowcount
+
+
+async def remove_member(db: AsyncSession, group_id: int, user_id: int, contact_id: int) -> bool:
+    """
+
+    :param db:
+    :param group_id:
+    :param user_id:
+    :param contact_id:
+    :return:
+    """
+    result = await db.execute(
+        delete(ContactGroupMember).where(
+            ContactGroupMember.user_id == user_id,
+            ContactGroupMember.group_id == group_id,
+            ContactGroupMember.contact_id == contact_id,
+        )
+    )
+    await db.commit()
+    contact_reads.forget(user_id)
+    return bool(result.rowcount)
+
+
+async def delete_contact_memberships(db: AsyncSession, contact_id: int) -> None:
+    """
+    Викликається з crud.delete_contact до commit.
+
+    :param db:
+    :param contact_id:
+    :return:
+    """
+    await db.execute(delete(ContactGroupMember).where(ContactGroupMember.contact_id == contact_id))
@@ -0,0 +1,267 @@
+"""
+Idempotency-Key для POST-маршрутів.
+
+Перша відповідь на (користувач, ключ) зберігається в idempotency_keys
+стиснутою zlib на IDEMPOTENCY_TTL_SECONDS. Повтор отримує збережену
+відповідь із заголовком Idempotent-Replayed і не доходить ні до
+обробника, ні до rate limit, ні до таблиці контактів. Поки перший запит
+виконується, дублікати в тому ж воркері чекають на його результат, а в
+інших воркерах — опитують рядок-заглушку. Той самий ключ з іншим тілом
+запиту — 422.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import zlib
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException, Request, Response
+from fastapi.routing import APIRoute
+from sqlalchemy import delete, select
+from sqlalchemy.exc import IntegrityError
+from src.database import AsyncSessionLocal
+from src.models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 60 * 60)))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
+IDEMPOTENCY_POLL_SECONDS = 0.05
+IDEMPOTENCY_PURGE_SECONDS = 60 * 60
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+
+def request_fingerprint(request: Request, body: bytes) -> str:
+    """
+
+    :param request:
+    :param body:
+    :return:
+    """
+    digest = hashlib.sha256()
+    digest.update(f"{request.method} {request.url.path}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def request_user_id(request: Request) -> Optional[int]:
+    """
+    Ключі окремі для кожного користувача; без валідного токена ідемпотентності
+    немає, а сам запит далі отримає 401 від get_current_user.
+
+    :param request:
+    :return:
+    """
+    from src.auth import decode_token
+
+    scheme, _, token = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        sub = decode_token(token).get("sub")
+    except HTTPException:
+        return None
+    return int(sub) if sub is not None else None
+
+
+class StoredResponse:
+    """
+    Відповідь, як вона лежить у таблиці.
+    """
+
+    __slots__ = ("status_code", "media_type", "body")
+
+    def __init__(self, status_code: int, media_type: Optional[str], body: bytes):
+        self.status_code = status_code
+        self.media_type = media_type
+        self.body = body
+
+    def replay(self) -> Response:
+        """
+
+        :return:
+        """
+        return Response(
+            content=self.body,
+            status_code=self.status_code,
+            media_type=self.media_type,
+            headers={"Idempotent-Replayed": "true"},
+        )
+
+
+class IdempotencyStore:
+    """
+    Таблиця idempotency_keys плюс майбутні результати запитів, що виконуються в цьому воркері.
+    """
+
+    def __init__(self, session_factory=AsyncSessionLocal, ttl: int = IDEMPOTENCY_TTL_SECONDS):
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self.inflight = {}
+
+    async def _claim(self, user_id: int, key: str, fingerprint: str):
+        """
+
+        :return: None, якщо ключ захоплено, інакше наявний рядок
+        """
+        async with self.session_factory() as db:
+            now = datetime.utcnow()
+            row = await db.scalar(
+                select(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            )
+            if row is not None and row.expires_at > now:
+                return row
+            if row is not None:
+                await db.delete(row)
+                await db.flush()
+            db.add(IdempotencyKey(
+                user_id=user_id, key=key, fingerprint=fingerprint,
+                created_at=now, expires_at=now + timedelta(seconds=self.ttl),
+            ))
+            try:
+                await db.commit()
+            except IntegrityError:
+                await db.rollback()
+                return await db.scalar(
+                    select(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+                )
+        return None
+
+    async def _wait_for_other_worker(self, user_id: int, key: str) -> StoredResponse:
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + IDEMPOTENCY_WAIT_SECONDS
+        while loop.time() < deadline:
+            await asyncio.sleep(IDEMPOTENCY_POLL_SECONDS)
+            async with self.session_factory() as db:
+                row = await db.scalar(
+                    select(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+                )
+            if row is None:
+                break
+            if row.status_code is not None:
+                return StoredResponse(row.status_code, row.media_type, zlib.decompress(row.body))
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+    async def _finish(self, user_id: int, key: str, stored: Optional[StoredResponse]) -> None:
+        async with self.session_factory() as db:
+            query = select(IdempotencyKey).where(IdempotencyKey.user_id == user_id, IdempotencyKey.key == key)
+            row = await db.scalar(query)
+            if row is None:
+                return
+            if stored is None:
+                await db.delete(row)
+            else:
+                row.status_code = stored.status_code
+                row.media_type = stored.media_type
+                row.body = zlib.compress(stored.body)
+            await db.commit()
+
+    async def run(self, user_id: int, key: str, fingerprint: str, call_next) -> Response:
+        """
+
+        :param user_id:
+        :param key:
+        :param fingerprint:
+        :param call_next: корутина-функція, що виконує справжній обробник
+        :return:
+        """
+        inflight = self.inflight.get((user_id, key))
+        if inflight is not None:
+            pending_fingerprint, future = inflight
+            if pending_fingerprint != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was used with a different request")
+            return (await asyncio.shield(future)).replay()
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[(user_id, key)] = (fingerprint, future)
+        stored = None
+        try:
+            row = await self._claim(user_id, key, fingerprint)
+            if row is None:
+                try:
+                    response = await call_next()
+                except Exception:
+                    await self._finish(user_id, key, None)
+                    raise
+                if response.status_code < 500:
+                    stored = StoredResponse(response.status_code, response.media_type, response.body)
+                try:
+                    await self._finish(user_id, key, stored)
+                except Exception:
+                    logger.exception("failed to store idempotent response")
+                return response
+            if row.fingerprint != fingerprint:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was used with a different request")
+            if row.status_code is not None:
+                stored = StoredResponse(row.status_code, row.media_type, zlib.decompress(row.body))
+            else:
+                stored = await self._wait_for_other_worker(user_id, key)
+            return stored.replay()
+        finally:
+            del self.inflight[(user_id, key)]
+            if stored is not None:
+                future.set_result(stored)
+            else:
+                future.set_exception(HTTPException(status_code=409, detail="The original request failed, retry"))
+                future.exception()
+
+    async def purge(self) -> int:
+        """
+
+        :return: кількість видалених прострочених ключів
+        """
+        async with self.session_factory() as db:
+            result = await db.execute(delete(IdempotencyKey).where(IdempotencyKey.expires_at < datetime.utcnow()))
+            await db.commit()
+        return result.rowcount
+
+    async def run_purge_loop(self) -> None:
+        """
+        Фонова задача застосунку.
+
+        :return:
+        """
+        while True:
+            try:
+                purged = await self.purge()
+                logger.info("purged %s idempotency keys", purged)
+            except Exception:
+                logger.exception("idempotency key purge failed")
+            await asyncio.sleep(IDEMPOTENCY_PURGE_SECONDS)
+
+    def clear(self) -> None:
+        """
+
+        :return:
+        """
+        self.inflight.clear()
+
+
+idempotency_store = IdempotencyStore()
+
+
+class IdempotentRoute(APIRoute):
+    """
+    route_class роутера: POST із заголовком Idempotency-Key проходить через
+    idempotency_store ще до залежностей і rate limit.
+    """
+
+    def get_route_handler(self):
+        handler = super().get_route_handler()
+        if "POST" not in self.methods:
+            return handler
+
+        async def idempotent_handler(request: Request) -> Response:
+            key = request.headers.get("Idempotency-Key")
+            if not key:
+                return await handler(request)
+            if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+                raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+            user_id = request_user_id(request)
+            if user_id is None:
+                return await handler(request)
+            fingerprint = request_fingerprint(request, await request.body())
+            return await idempotency_store.run(user_id, key, fingerprint, lambda: handler(request))
+
+        return idempotent_handler
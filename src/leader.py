@@ -0,0 +1,74 @@
+"""
+Вибір лідера серед воркерів через advisory lock Postgres.
+
+Задача, яку має виконувати лише один процес (щоденне оновлення дайджесту),
+запускається в тому воркері, що отримав pg_try_advisory_lock. Замок
+сесійний і тримається на окремому з'єднанні, доки працює задача; якщо
+з'єднання обірвалось, задача скасовується, а замок звільняється сам і
+дістається іншому воркеру. Решта воркерів повторюють спробу кожні
+LEADER_RETRY_SECONDS. На інших БД (SQLite — один процес) задача просто
+виконується.
+"""
+import asyncio
+import logging
+import os
+import zlib
+from typing import Awaitable, Callable
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from src.database import engine as primary_engine
+
+logger = logging.getLogger(__name__)
+
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", "30"))
+
+
+def lock_key(name: str) -> int:
+    """
+
+    :param name:
+    :return: стабільний між процесами ключ advisory lock
+    """
+    return zlib.crc32(name.encode())
+
+
+async def run_as_leader(name: str, job: Callable[[], Awaitable], engine: AsyncEngine = primary_engine,
+                        retry: float = LEADER_RETRY_SECONDS):
+    """
+
+    :param name: ім'я задачі, з нього виводиться ключ замка
+    :param job: корутина-функція, що виконується лише в лідері
+    :param engine:
+    :param retry: як часто повторювати спробу і перевіряти з'єднання лідера
+    :return: результат job
+    """
+    if engine.dialect.name != "postgresql":
+        return await job()
+    key = lock_key(name)
+    while True:
+        try:
+            async with engine.connect() as conn:
+                acquired = await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": key})
+                # замок сесійний, транзакцію можна закрити, щоб не висіла idle in transaction
+                await conn.commit()
+                if acquired:
+                    logger.info("leader for %s", name)
+                    task = asyncio.create_task(job())
+                    try:
+                        while not task.done():
+                            await asyncio.wait({task}, timeout=retry)
+                            if not task.done():
+                                await conn.execute(text("SELECT 1"))
+                                await conn.commit()
+                        return task.result()
+                    finally:
+                        task.cancel()
+                        await asyncio.gather(task, return_exceptions=True)
+                        if not conn.closed and not conn.invalidated:
+                            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": key})
+                            await conn.commit()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("leader election for %s failed", name)
+        await asyncio.sleep(retry)
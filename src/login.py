@@ -2,8 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.database import get_db
-from src.models import User
-from src.auth import verify_password, create_access_token
+from src.auth import USER_BY_EMAIL, verify_password, create_access_token
 from datetime import timedelta
 from src.schemas import Token
 
@@ -21,7 +20,7 @@ async def login(
     :return:
     """
 
-    result = await db.execute(select(User).where(User.email == form_data.username))
+    result = await db.execute(USER_BY_EMAIL, {"email": form_data.username})
     user = result.scalar_one_or_none()
 
     if not user or not verify_password(form_data.password, user.password):
@@ -0,0 +1,285 @@
+"""
+Журналювання без блокування циклу подій.
+
+Усі записи йдуть у корінь, а там QueueHandler лише кладе їх у обмежену
+чергу. Форматування й запис у stderr робить окремий потік QueueListener,
+тож запит ніколи не чекає на I/O журналу. Коли черга повна, запис
+відкидається й рахується, а не блокує.
+
+Гучні логери (SQL, access log) і їхні нащадки проходять SamplingFilter ще
+до черги: частка записів LOG_SAMPLING і стеля на секунду. WARNING і вище не
+відкидаються ніколи. Формат: "logger=частка:стеля,..." — наприклад
+"sqlalchemy.engine=0.1:200,src.access=1:1000".
+
+RequestContextMiddleware бере X-Request-ID із запиту або генерує його,
+повертає у відповіді й додає request_id до кожного запису, зробленого
+під час запиту.
+"""
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_SQL = os.getenv("LOG_SQL", "0") == "1"
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "sqlalchemy.engine=1:200,src.access=1:1000")
+REQUEST_ID_HEADER = b"x-request-id"
+REQUEST_ID_MAX_LENGTH = 128
+
+# логери серверів, які налаштовують власні обробники; їх записи теж ідуть через чергу.
+# Власні access-логи серверів вимкнені в src.server, їх замінює RequestContextMiddleware.
+SERVER_LOGGERS = ("uvicorn", "uvicorn.error", "gunicorn.error")
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+access_logger = logging.getLogger("src.access")
+
+# атрибути, які LogRecord має завжди; решта — це extra=... і йде в JSON як є
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id"}
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Додає request_id поточного запиту до запису.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускає частку rate записів і не більше cap за секунду.
+    """
+
+    def __init__(self, rate: float = 1.0, cap: int = 0):
+        super().__init__()
+        self.rate = rate
+        self.cap = cap
+        self.window = 0
+        self.in_window = 0
+        self.passed = 0
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        if self.rate < 1 and random.random() >= self.rate:
+            self.dropped += 1
+            return False
+        if self.cap:
+            window = int(time.monotonic())
+            if window != self.window:
+                self.window, self.in_window = window, 0
+            if self.in_window >= self.cap:
+                self.dropped += 1
+                return False
+            self.in_window += 1
+        self.passed += 1
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler, що при повній черзі відкидає запис замість винятку.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Форматування лишається потоку-слухачу; тут лише фіксуємо текст
+        # повідомлення й винятку, бо аргументи можуть змінитися після виклику.
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Один JSON-об'єкт на рядок.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        entry.update((key, value) for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+def parse_sampling(spec: str) -> dict:
+    """
+
+    :param spec: "logger=частка:стеля,..."
+    :return: назва логера -> (частка, стеля)
+    """
+    rules = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        rate, _, cap = value.partition(":")
+        rules[name.strip()] = (float(rate or 1), int(cap or 0))
+    return rules
+
+
+class LogPipeline:
+    """
+    Черга, потік-слухач і фільтри вибірки; start/stop викликає lifespan.
+    """
+
+    def __init__(self, queue_size: int = LOG_QUEUE_SIZE, sampling: str = LOG_SAMPLING):
+        self.queue = queue.Queue(queue_size)
+        self.handler = DroppingQueueHandler(self.queue)
+        self.samplers = {name: SamplingFilter(rate, cap) for name, (rate, cap) in parse_sampling(sampling).items()}
+        self.sampler_for = {}
+        self.sql_level = logging.NOTSET
+        self.handler.addFilter(self.sample)
+        self.handler.addFilter(RequestIdFilter())
+        self.listener = None
+
+    def sample(self, record: logging.LogRecord) -> bool:
+        """
+        Правило найближчого предка: "sqlalchemy.engine" діє й на "sqlalchemy.engine.Engine".
+
+        :param record:
+        :return:
+        """
+        sampler = self.sampler_for.get(record.name, False)
+        if sampler is False:
+            name = record.name
+            while name and name not in self.samplers:
+                name = name.rpartition(".")[0]
+            sampler = self.sampler_for[record.name] = self.samplers.get(name)
+        return sampler is None or sampler.filter(record)
+
+    def start(self, level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, stream=None, sql: bool = LOG_SQL) -> None:
+        """
+
+        :param level:
+        :param fmt: json | text
+        :param stream: за замовчуванням stderr
+        :param sql: журналювати SQL-запити
+        :return:
+        """
+        if self.listener is not None:
+            return
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        ))
+        root = logging.getLogger()
+        root.setLevel(level)
+        root.addHandler(self.handler)
+        for name in SERVER_LOGGERS:
+            server_logger = logging.getLogger(name)
+            server_logger.handlers.clear()
+            server_logger.propagate = True
+        sql_logger = logging.getLogger("sqlalchemy.engine")
+        self.sql_level = sql_logger.level
+        sql_logger.setLevel(logging.INFO if sql else logging.WARNING)
+        self.listener = logging.handlers.QueueListener(self.queue, output, respect_handler_level=True)
+        self.listener.start()
+
+    def stop(self) -> None:
+        """
+        Дописує все, що лишилося в черзі.
+
+        :return:
+        """
+        if self.listener is None:
+            return
+        logging.getLogger().removeHandler(self.handler)
+        logging.getLogger("sqlalchemy.engine").setLevel(self.sql_level)
+        self.listener.stop()
+        self.listener = None
+
+    def stats(self) -> dict:
+        """
+
+        :return:
+        """
+        return {
+            "queued": self.queue.qsize(),
+            "dropped_queue_full": self.handler.dropped,
+            "sampling": {
+                name: {"passed": sampler.passed, "dropped": sampler.dropped}
+                for name, sampler in self.samplers.items()
+            },
+        }
+
+
+log_pipeline = LogPipeline()
+
+
+class RequestContextMiddleware:
+    """
+    Чистий ASGI middleware: request id і один access-запис на HTTP-запит.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == REQUEST_ID_HEADER:
+                request_id = value.decode("latin-1")[:REQUEST_ID_MAX_LENGTH]
+                break
+        request_id = request_id or uuid.uuid4().hex
+        token = request_id_var.set(request_id)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_with_request_id(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER, request_id.encode("latin-1"))
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            if access_logger.isEnabledFor(logging.INFO):
+                access_logger.info(
+                    "%s %s %s", scope["method"], scope["path"], status_code,
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status_code,
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                    },
+                )
+            request_id_var.reset(token)
@@ -1,68 +1,127 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.staticfiles import StaticFiles
 from fastapi.security import OAuth2PasswordRequestForm, HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
 from jose import JWTError
-from src.database import get_db, engine
-from src.models import Base, User
-from src.schemas import UserCreate, UserResponse, Token
-from src.auth import get_password_hash, verify_password, create_access_token, create_refresh_token, decode_token, get_current_user
+from src.database import get_db, shard_engines
+from src.models import User
+from src.schemas import Token, LogoutRequest
+from src.auth import create_access_token, create_refresh_token, decode_token, get_current_user
+from src.auth import oauth2_scheme, revoke_token, verify_and_update_password, calibrate_password_hashing
+from src.auth import USER_BY_EMAIL
 from src.auth import router as auth_router
 from src.routers.contacts import router as contacts_router
+from src.routers.groups import router as groups_router
+from src.routers.internal import router as internal_router
+from src.routers.live import router as live_router
+from src.routers.metrics import router as metrics_router
+from src.routers.registration import router as registration_router
+from src.birthdays import run_daily_refresh
+from src.leader import run_as_leader
+from src.revocation import revocation_store
+from src.sync import run_tombstone_purge
+from src.events import event_bus
+from src.idempotency import idempotency_store
+from src.registration import verification_mailer
+from src.services.avatar_service import avatar_processor
+from src.services.avatar_storage import LocalAvatarStorage
+from src.bulkhead import auth_lane
 from slowapi.errors import RateLimitExceeded
 from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
 from src.limiter import limiter
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from src.logs import RequestContextMiddleware, log_pipeline
+from src.profiling import ProfilingMiddleware
+from src.admission import DeadlineMiddleware
 
-app = FastAPI(title="Контактна книга API")
+CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*").split(",")
 
-app.state.limiter = limiter
-
-app.include_router(auth_router)
-app.include_router(contacts_router)
 
-@app.exception_handler(RateLimitExceeded)
-async def rate_limit_handler(request, exc):
+@asynccontextmanager
+async def lifespan(app: FastAPI):
     """
+    Старт воркера: калібрування bcrypt, фонові задачі. Схему воркер не
+    чіпає — міграції виконує src.server один раз до запуску воркерів. Після SIGTERM
+    сервер спершу дочікується запитів у роботі, і лише тоді виконується
+    друга половина: задачі скасовуються, пули з'єднань закриваються.
 
-    :param request:
-    :param exc:
+    :param app:
     :return:
     """
-    return JSONResponse(
-        status_code=429,
-        content={"detail": "Too many requests, slow down!"}
-    )
+    log_pipeline.start()
+    await run_in_threadpool(calibrate_password_hashing)
+    if isinstance(avatar_processor.storage, LocalAvatarStorage):
+        os.makedirs(avatar_processor.storage.root, exist_ok=True)
+    await event_bus.backend.start()
+    tasks = [
+        asyncio.create_task(run_as_leader("birthday_digest", run_daily_refresh)),
+        asyncio.create_task(run_tombstone_purge()),
+        asyncio.create_task(revocation_store.run_sync_loop()),
+        asyncio.create_task(idempotency_store.run_purge_loop()),
+        asyncio.create_task(verification_mailer.run_sender_loop()),
+    ]
+    try:
+        yield
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await event_bus.backend.stop()
+        avatar_processor.shutdown()
+        for shard_engine in shard_engines:
+            await shard_engine.dispose()
+        log_pipeline.stop()
 
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
+app = FastAPI(title="Контактна книга API", lifespan=lifespan)
 
+app.state.limiter = limiter
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID", "X-Profile-Id"],
 )
+app.add_middleware(ProfilingMiddleware)
+app.add_middleware(DeadlineMiddleware)
+app.add_middleware(RequestContextMiddleware)
+
+app.include_router(auth_router)
+app.include_router(registration_router)
+app.include_router(contacts_router)
+app.include_router(groups_router)
+app.include_router(internal_router)
+app.include_router(live_router)
+app.include_router(metrics_router)
+
+if isinstance(avatar_processor.storage, LocalAvatarStorage):
+    app.mount(
+        avatar_processor.storage.base_url,
+        StaticFiles(directory=avatar_processor.storage.root, check_dir=False),
+        name="media",
+    )
 
 
-@app.on_event("startup")
-async def startup():
+@app.exception_handler(RateLimitExceeded)
+async def rate_limit_handler(request, exc):
     """
 
+    :param request:
+    :param exc:
     :return:
     """
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Too many requests, slow down!"}
+    )
+
 
 @app.get("/")
 async def root():
@@ -72,28 +131,9 @@ async def root():
     """
     return {"message": "API працює!"}
 
-@app.post("/auth/signup", response_model=UserResponse, status_code=201)
-async def signup(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
-    """
-
-    :param user_data:
-    :param db:
-    :return:
-    """
-    result = await db.execute(select(User).where(User.email == user_data.email))
-    existing_user = result.scalar_one_or_none()
-    if existing_user:
-        raise HTTPException(status_code=409, detail="Email already registered")
-
-    hashed_password = get_password_hash(user_data.password)
-    new_user = User(email=user_data.email, hashed_password=hashed_password)
-    db.add(new_user)
-    await db.commit()
-    await db.refresh(new_user)
-    return new_user
 
 
-@app.post("/auth/login", response_model=Token)
+@app.post("/auth/login", response_model=Token, dependencies=[Depends(auth_lane)])
 async def login(
     form_data: OAuth2PasswordRequestForm = Depends(),
     db: AsyncSession = Depends(get_db)
@@ -104,74 +144,66 @@ async def login(
     :param db:
     :return:
     """
-    result = await db.execute(select(User).where(User.email == form_data.username))
+    result = await db.execute(USER_BY_EMAIL, {"email": form_data.username})
     user = result.scalar_one_or_none()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+    if not user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+    verified, new_hash = await auth_lane.run(verify_and_update_password, form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(status_code=401, detail="Invalid credentials")
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
 
     access_token = create_access_token(data={"sub": str(user.id)})
     refresh_token = create_refresh_token(data={"sub": str(user.id)})
     return {"access_token": access_token, "refresh_token": refresh_token}
 
 @app.post("/auth/refresh_token", response_model=Token)
-async def refresh_token(credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer())):
+async def refresh_token(
+    credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer()),
+    db: AsyncSession = Depends(get_db)
+):
     """
+    Ротація: старий refresh-токен відкликається, повторне його використання — 401.
 
     :param credentials:
+    :param db:
     :return:
     """
-    try:
-        payload = decode_token(credentials.credentials, refresh=True)
-        user_id = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid refresh token")
-    except JWTError:
+    payload = decode_token(credentials.credentials, refresh=True)
+    user_id = payload.get("sub")
+    if user_id is None or payload.get("jti") is None:
         raise HTTPException(status_code=401, detail="Invalid refresh token")
+    if not await revoke_token(db, payload):
+        raise HTTPException(status_code=401, detail="Refresh token already used")
 
     new_access_token = create_access_token(data={"sub": str(user_id)})
     new_refresh_token = create_refresh_token(data={"sub": str(user_id)})
     return {"access_token": new_access_token, "refresh_token": new_refresh_token}
 
 
-@app.get("/auth/verify_email")
-async def verify_email(token: str, db: AsyncSession = Depends(get_db)):
+@app.post("/auth/logout", status_code=204)
+async def logout(
+    body: LogoutRequest,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db)
+):
     """
 
+    :param body:
     :param token:
     :param db:
     :return:
     """
-    try:
-        payload = decode_token(token)
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=400, detail="Invalid token")
-    except JWTError:
-        raise HTTPException(status_code=400, detail="Invalid token")
-
-    user = await db.get(User, int(user_id))
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-
-    user.is_verified = True
-    await db.commit()
-    return {"message": "Email successfully verified"}
-
-limiter = Limiter(key_func=get_remote_address)
-app.state.limiter = limiter
-
-@app.exception_handler(RateLimitExceeded)
-async def rate_limit_handler(request, exc):
-    """
-    
-    :param request:
-    :param exc:
-    :return:
-    """
-    return JSONResponse(
-        status_code=429,
-        content={"detail": "Too many requests, slow down!"}
-    )
+    access = decode_token(token)
+    refresh = decode_token(body.refresh_token, refresh=True)
+    if access.get("sub") is None or access.get("sub") != refresh.get("sub"):
+        raise HTTPException(status_code=401, detail="Invalid token")
+    for payload in (access, refresh):
+        if payload.get("jti") is not None:
+            await revoke_token(db, payload)
+    return None
 
 
 @app.get("/auth/verify_email")
@@ -197,8 +229,3 @@ async def verify_email(token: str, db: AsyncSession = Depends(get_db)):
     user.is_verified = True
     await db.commit()
     return {"message": "Email successfully verified"}
-
-
-app.include_router(contacts_router)
-
-
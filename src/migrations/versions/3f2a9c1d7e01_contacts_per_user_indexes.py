@@ -0,0 +1,40 @@
+"""contacts per-user indexes
+
+Revision ID: 3f2a9c1d7e01
+Revises: 0c1a2b3d4e50
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.online_migrations import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = '3f2a9c1d7e01'
+down_revision: Union[str, Sequence[str], None] = '0c1a2b3d4e50'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # новий унікальний індекс будується до того, як зникає старий
+    create_index_concurrently("ix_contacts_user_id_id", "contacts", ["user_id", "id"])
+    create_index_concurrently(
+        "ix_contacts_user_id_last_name_first_name",
+        "contacts",
+        ["user_id", "last_name", "first_name"],
+    )
+    create_index_concurrently("uq_contacts_user_id_email", "contacts", ["user_id", "email"], unique=True)
+    drop_index_concurrently("ix_contacts_email", "contacts")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    create_index_concurrently("ix_contacts_email", "contacts", ["email"], unique=True)
+    drop_index_concurrently("uq_contacts_user_id_email", "contacts")
+    drop_index_concurrently("ix_contacts_user_id_last_name_first_name", "contacts")
+    drop_index_concurrently("ix_contacts_user_id_id", "contacts")
@@ -0,0 +1,51 @@
+"""contacts phone_e164
+
+Revision ID: 8b41d6e2a902
+Revises: 3f2a9c1d7e01
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.online_migrations import (
+    batched_backfill,
+    create_index_concurrently,
+    drop_index_concurrently,
+    with_lock_retries,
+)
+from src.phones import normalize_phone_e164
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8b41d6e2a902'
+down_revision: Union[str, Sequence[str], None] = '3f2a9c1d7e01'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+contacts = sa.table(
+    "contacts",
+    sa.column("id", sa.Integer),
+    sa.column("phone", sa.String),
+    sa.column("phone_e164", sa.String),
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    with_lock_retries(lambda: op.add_column("contacts", sa.Column("phone_e164", sa.String(), nullable=True)))
+    batched_backfill(
+        contacts,
+        name="contacts_phone_e164",
+        transform=lambda row: {"phone_e164": normalize_phone_e164(row["phone"])},
+        columns=["phone"],
+    )
+    create_index_concurrently("ix_contacts_user_id_phone_e164", "contacts", ["user_id", "phone_e164"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_concurrently("ix_contacts_user_id_phone_e164", "contacts")
+    with_lock_retries(lambda: op.drop_column("contacts", "phone_e164"))
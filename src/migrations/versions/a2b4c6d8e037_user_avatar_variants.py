@@ -0,0 +1,28 @@
+"""user avatar variants
+
+Revision ID: a2b4c6d8e037
+Revises: f1c3d5e7a926
+Create Date: 2026-10-19 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a2b4c6d8e037'
+down_revision: Union[str, Sequence[str], None] = 'f1c3d5e7a926'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column("users", sa.Column("avatar_variants", sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column("users", "avatar_variants")
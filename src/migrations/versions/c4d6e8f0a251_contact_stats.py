@@ -0,0 +1,61 @@
+"""contact stats
+
+Revision ID: c4d6e8f0a251
+Revises: b3c5d7e9f140
+Create Date: 2026-10-19 18:00:00.000000
+
+Рядки наповнюються тут же з наявних контактів; пізніше їх можна
+перебудувати через ``python -m src.stats``.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d6e8f0a251'
+down_revision: Union[str, Sequence[str], None] = 'b3c5d7e9f140'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTH_COLUMNS = [f"birth_month_{month}" for month in range(1, 13)]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    counters = ["total", "missing_email", "missing_phone", "missing_birthday"] + MONTH_COLUMNS
+    op.create_table(
+        "contact_stats",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        *(sa.Column(name, sa.Integer(), nullable=False, server_default="0") for name in counters),
+    )
+
+    contacts = sa.table(
+        "contacts",
+        sa.column("user_id", sa.Integer()),
+        sa.column("email", sa.String()),
+        sa.column("phone", sa.String()),
+        sa.column("birthday", sa.Date()),
+    )
+
+    def count_if(condition):
+        return sa.func.sum(sa.case((condition, 1), else_=0))
+
+    birth_month = sa.extract("month", contacts.c.birthday)
+    backfill = sa.select(
+        contacts.c.user_id,
+        sa.func.count(),
+        count_if(sa.func.coalesce(sa.func.trim(contacts.c.email), "") == ""),
+        count_if(sa.func.coalesce(sa.func.trim(contacts.c.phone), "") == ""),
+        count_if(contacts.c.birthday.is_(None)),
+        *(count_if(birth_month == month) for month in range(1, 13)),
+    ).where(contacts.c.user_id.isnot(None)).group_by(contacts.c.user_id)
+    stats = sa.table("contact_stats", *(sa.column(name) for name in ["user_id"] + counters))
+    op.execute(stats.insert().from_select(["user_id"] + counters, backfill))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("contact_stats")
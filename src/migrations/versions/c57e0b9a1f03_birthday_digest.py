@@ -0,0 +1,45 @@
+"""birthday digest
+
+Revision ID: c57e0b9a1f03
+Revises: 8b41d6e2a902
+Create Date: 2026-10-19 12:00:00.000000
+
+The table is filled by ``python -m src.birthdays --full`` after upgrading.
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c57e0b9a1f03'
+down_revision: Union[str, Sequence[str], None] = '8b41d6e2a902'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "birthday_digest",
+        sa.Column("contact_id", sa.Integer(), sa.ForeignKey("contacts.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("next_birthday", sa.Date(), nullable=False),
+    )
+    op.create_index(
+        "ix_birthday_digest_user_id_next_birthday", "birthday_digest", ["user_id", "next_birthday"]
+    )
+    op.create_index(
+        "ix_birthday_digest_next_birthday_user_id",
+        "birthday_digest",
+        ["next_birthday", "user_id", "contact_id"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_birthday_digest_next_birthday_user_id", table_name="birthday_digest")
+    op.drop_index("ix_birthday_digest_user_id_next_birthday", table_name="birthday_digest")
+    op.drop_table("birthday_digest")
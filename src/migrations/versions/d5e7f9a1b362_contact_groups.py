@@ -0,0 +1,47 @@
+"""contact groups
+
+Revision ID: d5e7f9a1b362
+Revises: c4d6e8f0a251
+Create Date: 2026-10-19 19:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5e7f9a1b362'
+down_revision: Union[str, Sequence[str], None] = 'c4d6e8f0a251'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "contact_groups",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("name", sa.String(length=100), nullable=False),
+        sa.UniqueConstraint("user_id", "name", name="uq_contact_groups_user_id_name"),
+    )
+    op.create_table(
+        "contact_group_members",
+        sa.Column("contact_id", sa.Integer(), sa.ForeignKey("contacts.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("group_id", sa.Integer(), sa.ForeignKey("contact_groups.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+    )
+    op.create_index(
+        "ix_contact_group_members_user_id_group_id_contact_id",
+        "contact_group_members",
+        ["user_id", "group_id", "contact_id"],
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index("ix_contact_group_members_user_id_group_id_contact_id", table_name="contact_group_members")
+    op.drop_table("contact_group_members")
+    op.drop_table("contact_groups")
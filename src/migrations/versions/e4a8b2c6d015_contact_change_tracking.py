@@ -0,0 +1,77 @@
+"""contact change tracking
+
+Revision ID: e4a8b2c6d015
+Revises: d90f3a7c2b14
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from src.online_migrations import (
+    batched_backfill,
+    create_index_concurrently,
+    drop_index_concurrently,
+    with_lock_retries,
+)
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a8b2c6d015'
+down_revision: Union[str, Sequence[str], None] = 'd90f3a7c2b14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+contacts = sa.table("contacts", sa.column("id", sa.Integer), sa.column("change_seq", sa.Integer))
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    def add_columns():
+        op.add_column("contacts", sa.Column("updated_at", sa.DateTime(), nullable=True))
+        op.add_column("contacts", sa.Column("change_seq", sa.Integer(), nullable=False, server_default="0"))
+
+    with_lock_retries(add_columns)
+
+    op.create_table(
+        "user_sync_state",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("last_seq", sa.Integer(), nullable=False),
+        sa.Column("purged_seq", sa.Integer(), nullable=False),
+    )
+    op.create_table(
+        "contact_tombstones",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("contact_id", sa.Integer(), nullable=False),
+        sa.Column("change_seq", sa.Integer(), nullable=False),
+        sa.Column("deleted_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index(
+        "ix_contact_tombstones_user_id_change_seq", "contact_tombstones", ["user_id", "change_seq"]
+    )
+    op.create_index("ix_contact_tombstones_deleted_at", "contact_tombstones", ["deleted_at"])
+
+    # id вже монотонний, тож стає початковим номером зміни кожного контакту
+    batched_backfill(contacts, name="contacts_change_seq", values={"change_seq": contacts.c.id})
+    op.execute(
+        "INSERT INTO user_sync_state (user_id, last_seq, purged_seq) "
+        "SELECT user_id, MAX(id), 0 FROM contacts WHERE user_id IS NOT NULL GROUP BY user_id"
+    )
+    create_index_concurrently("ix_contacts_user_id_change_seq", "contacts", ["user_id", "change_seq"])
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    drop_index_concurrently("ix_contacts_user_id_change_seq", "contacts")
+    op.drop_index("ix_contact_tombstones_deleted_at", table_name="contact_tombstones")
+    op.drop_index("ix_contact_tombstones_user_id_change_seq", table_name="contact_tombstones")
+    op.drop_table("contact_tombstones")
+    op.drop_table("user_sync_state")
+
+    def drop_columns():
+        op.drop_column("contacts", "change_seq")
+        op.drop_column("contacts", "updated_at")
+
+    with_lock_retries(drop_columns)
@@ -0,0 +1,35 @@
+"""user shards
+
+Revision ID: f1c3d5e7a926
+Revises: e4a8b2c6d015
+Create Date: 2026-10-19 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f1c3d5e7a926'
+down_revision: Union[str, Sequence[str], None] = 'e4a8b2c6d015'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "user_shards",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), primary_key=True),
+        sa.Column("shard_id", sa.Integer(), nullable=False),
+        sa.Column("moving", sa.Boolean(), nullable=False),
+    )
+    # усі наявні контакти лежать в основній БД
+    op.execute("INSERT INTO user_shards (user_id, shard_id, moving) SELECT id, 0, false FROM users")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("user_shards")
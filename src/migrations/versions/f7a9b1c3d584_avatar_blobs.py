@@ -0,0 +1,33 @@
+"""avatar blobs
+
+Revision ID: f7a9b1c3d584
+Revises: e6f8a0b2c473
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7a9b1c3d584'
+down_revision: Union[str, Sequence[str], None] = 'e6f8a0b2c473'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        "avatar_blobs",
+        sa.Column("digest", sa.String(length=64), primary_key=True),
+        sa.Column("variants", sa.JSON(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table("avatar_blobs")
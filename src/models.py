@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Date, Boolean
+from sqlalchemy import Column, Integer, String, ForeignKey, Date, DateTime, Boolean, Float, Index, JSON, LargeBinary, UniqueConstraint
 from sqlalchemy.orm import relationship
+from datetime import datetime
 from src.database import Base
 
 
@@ -11,21 +12,160 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     is_verified = Column(Boolean, default=False)
     avatar_url = Column(String, nullable=True)
+    avatar_variants = Column(JSON, nullable=True)
 
     contacts = relationship("Contact", back_populates="owner")
 
 
+class AvatarBlob(Base):
+    __tablename__ = "avatar_blobs"
+
+    digest = Column(String(64), primary_key=True)
+    variants = Column(JSON, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+
 class Contact(Base):
     __tablename__ = "contacts"
+    __table_args__ = (
+        Index("ix_contacts_user_id_id", "user_id", "id"),
+        Index("ix_contacts_user_id_last_name_first_name", "user_id", "last_name", "first_name"),
+        Index("uq_contacts_user_id_email", "user_id", "email", unique=True),
+        Index("ix_contacts_user_id_phone_e164", "user_id", "phone_e164"),
+        Index("ix_contacts_user_id_change_seq", "user_id", "change_seq"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     first_name = Column(String, nullable=False)
     last_name = Column(String, nullable=False)
-    email = Column(String, unique=True, index=True, nullable=False)
+    email = Column(String, nullable=False)
     phone = Column(String, nullable=False)
+    phone_e164 = Column(String, nullable=True)
     birthday = Column(Date, nullable=True)
     extra_info = Column(String, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(Integer, nullable=False, default=0)
 
     user_id = Column(Integer, ForeignKey("users.id"))
     owner = relationship("User", back_populates="contacts")
 
+
+class ContactGroup(Base):
+    __tablename__ = "contact_groups"
+    __table_args__ = (
+        UniqueConstraint("user_id", "name", name="uq_contact_groups_user_id_name"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    name = Column(String(100), nullable=False)
+
+
+class ContactGroupMember(Base):
+    __tablename__ = "contact_group_members"
+    __table_args__ = (
+        Index("ix_contact_group_members_user_id_group_id_contact_id", "user_id", "group_id", "contact_id"),
+    )
+
+    contact_id = Column(Integer, ForeignKey("contacts.id", ondelete="CASCADE"), primary_key=True)
+    group_id = Column(Integer, ForeignKey("contact_groups.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+
+class ContactStats(Base):
+    __tablename__ = "contact_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    total = Column(Integer, nullable=False, default=0)
+    missing_email = Column(Integer, nullable=False, default=0)
+    missing_phone = Column(Integer, nullable=False, default=0)
+    missing_birthday = Column(Integer, nullable=False, default=0)
+    birth_month_1 = Column(Integer, nullable=False, default=0)
+    birth_month_2 = Column(Integer, nullable=False, default=0)
+    birth_month_3 = Column(Integer, nullable=False, default=0)
+    birth_month_4 = Column(Integer, nullable=False, default=0)
+    birth_month_5 = Column(Integer, nullable=False, default=0)
+    birth_month_6 = Column(Integer, nullable=False, default=0)
+    birth_month_7 = Column(Integer, nullable=False, default=0)
+    birth_month_8 = Column(Integer, nullable=False, default=0)
+    birth_month_9 = Column(Integer, nullable=False, default=0)
+    birth_month_10 = Column(Integer, nullable=False, default=0)
+    birth_month_11 = Column(Integer, nullable=False, default=0)
+    birth_month_12 = Column(Integer, nullable=False, default=0)
+
+
+class DuplicateScan(Base):
+    __tablename__ = "duplicate_scans"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    status = Column(String(20), nullable=False)
+    started_at = Column(DateTime, nullable=False)
+    computed_at = Column(DateTime, nullable=True)
+    duration_ms = Column(Float, nullable=True)
+    clusters = Column(JSON, nullable=False, default=list)
+
+
+class BirthdayDigest(Base):
+    __tablename__ = "birthday_digest"
+    __table_args__ = (
+        Index("ix_birthday_digest_user_id_next_birthday", "user_id", "next_birthday"),
+        Index("ix_birthday_digest_next_birthday_user_id", "next_birthday", "user_id", "contact_id"),
+    )
+
+    contact_id = Column(Integer, ForeignKey("contacts.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    next_birthday = Column(Date, nullable=False)
+
+
+class RevokedToken(Base):
+    __tablename__ = "revoked_tokens"
+
+    id = Column(Integer, primary_key=True)
+    jti = Column(String, unique=True, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+
+class ContactTombstone(Base):
+    __tablename__ = "contact_tombstones"
+    __table_args__ = (
+        Index("ix_contact_tombstones_user_id_change_seq", "user_id", "change_seq"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    contact_id = Column(Integer, nullable=False)
+    change_seq = Column(Integer, nullable=False)
+    deleted_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
+class UserSyncState(Base):
+    __tablename__ = "user_sync_state"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    last_seq = Column(Integer, nullable=False, default=0)
+    purged_seq = Column(Integer, nullable=False, default=0)
+
+
+class UserShard(Base):
+    __tablename__ = "user_shards"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    shard_id = Column(Integer, nullable=False, default=0)
+    moving = Column(Boolean, nullable=False, default=False)
+
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("user_id", "key", name="uq_idempotency_keys_user_id_key"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    key = Column(String(255), nullable=False)
+    fingerprint = Column(String(64), nullable=False)
+    status_code = Column(Integer, nullable=True)
+    media_type = Column(String, nullable=True)
+    body = Column(LargeBinary, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
@@ -0,0 +1,244 @@
+"""
+Помічники для міграцій, які не зупиняють таблиці під навантаженням.
+
+create_index_concurrently / drop_index_concurrently на Postgres виходять з
+транзакції міграції (autocommit_block) і будують індекс CONCURRENTLY. Невалідний
+індекс, що лишився від перерваної побудови, видаляється й будується заново.
+
+with_lock_retries виконує DDL, якому потрібне ACCESS EXCLUSIVE (ADD COLUMN,
+ALTER ...), у точці збереження з коротким lock_timeout. Якщо таблицю тримає
+довга транзакція, спроба відкочується й повторюється з паузою, замість
+того щоб стояти в черзі блокувань перед усіма запитами застосунку.
+
+batched_backfill оновлює рядки пачками за первинним ключем, кожна пачка
+комітиться окремо, між пачками — пауза, а розмір пачки підлаштовується під
+BACKFILL_TARGET_SECONDS. Позиція зберігається в alembic_backfill_progress,
+тож перезапущена міграція продовжує з місця зупинки; після завершення рядок
+прогресу видаляється.
+
+Усі помічники ідемпотентні; на інших БД вони зводяться до звичайних
+операцій Alembic.
+"""
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Optional, Sequence
+import sqlalchemy as sa
+from alembic import op
+
+logger = logging.getLogger("alembic.online")
+
+MIGRATION_LOCK_TIMEOUT_MS = int(os.getenv("MIGRATION_LOCK_TIMEOUT_MS", "5000"))
+MIGRATION_LOCK_RETRIES = int(os.getenv("MIGRATION_LOCK_RETRIES", "10"))
+MIGRATION_LOCK_RETRY_TIMEOUT_MS = int(os.getenv("MIGRATION_LOCK_RETRY_TIMEOUT_MS", "2000"))
+BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "5000"))
+BACKFILL_MAX_BATCH_SIZE = int(os.getenv("BACKFILL_MAX_BATCH_SIZE", "50000"))
+BACKFILL_TARGET_SECONDS = float(os.getenv("BACKFILL_TARGET_SECONDS", "0.5"))
+BACKFILL_PAUSE_SECONDS = float(os.getenv("BACKFILL_PAUSE_SECONDS", "0.05"))
+LOCK_NOT_AVAILABLE = "55P03"
+
+backfill_progress = sa.Table(
+    "alembic_backfill_progress",
+    sa.MetaData(),
+    sa.Column("name", sa.String(200), primary_key=True),
+    sa.Column("last_key", sa.BigInteger, nullable=False),
+    sa.Column("rows", sa.BigInteger, nullable=False),
+    sa.Column("updated_at", sa.DateTime, nullable=False),
+)
+
+
+def is_postgresql() -> bool:
+    """
+
+    :return:
+    """
+    return op.get_context().dialect.name == "postgresql"
+
+
+@contextmanager
+def outside_transaction():
+    """
+    На Postgres — autocommit_block: транзакція міграції комітиться, кожен
+    оператор усередині комітиться сам.
+
+    :return:
+    """
+    if is_postgresql():
+        with op.get_context().autocommit_block():
+            yield
+    else:
+        yield
+
+
+def create_index_concurrently(name: str, table: str, columns: Sequence, unique: bool = False, **kw) -> None:
+    """
+
+    :param name:
+    :param table:
+    :param columns:
+    :param unique:
+    :param kw: як у op.create_index, напр. postgresql_where
+    :return:
+    """
+    if not is_postgresql():
+        op.create_index(name, table, columns, unique=unique, if_not_exists=True, **kw)
+        return
+    with outside_transaction():
+        if not op.get_context().as_sql:
+            valid = op.get_bind().scalar(
+                sa.text("SELECT i.indisvalid FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+                        "WHERE c.relname = :name"),
+                {"name": name},
+            )
+            if valid is True:
+                return
+            if valid is False:
+                logger.warning("dropping invalid index %s left by an interrupted build", name)
+                op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+        op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True, if_not_exists=True, **kw)
+
+
+def drop_index_concurrently(name: str, table: str) -> None:
+    """
+
+    :param name:
+    :param table:
+    :return:
+    """
+    if not is_postgresql():
+        op.drop_index(name, table_name=table, if_exists=True)
+        return
+    with outside_transaction():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def with_lock_retries(operation: Callable[[], None], attempts: int = MIGRATION_LOCK_RETRIES,
+                      timeout_ms: int = MIGRATION_LOCK_RETRY_TIMEOUT_MS, backoff: float = 1.0) -> None:
+    """
+    Приклад: with_lock_retries(lambda: op.add_column("contacts", column)).
+
+    :param operation: DDL через op.*
+    :param attempts:
+    :param timeout_ms: lock_timeout однієї спроби
+    :param backoff: пауза перед n-ю повторною спробою — backoff * n секунд
+    :return:
+    """
+    if not is_postgresql() or op.get_context().as_sql:
+        operation()
+        return
+    conn = op.get_bind()
+    for attempt in range(1, attempts + 1):
+        savepoint = conn.begin_nested()
+        try:
+            conn.exec_driver_sql(f"SET LOCAL lock_timeout = {int(timeout_ms)}")
+            operation()
+        except sa.exc.OperationalError as error:
+            savepoint.rollback()
+            sqlstate = getattr(error.orig, "pgcode", None) or getattr(error.orig, "sqlstate", None)
+            if sqlstate != LOCK_NOT_AVAILABLE or attempt == attempts:
+                raise
+            logger.warning("lock not available, retry %s/%s in %.1f s", attempt, attempts - 1, backoff * attempt)
+            time.sleep(backoff * attempt)
+        else:
+            savepoint.commit()
+            return
+
+
+def _load_progress(conn, name: str):
+    backfill_progress.create(conn, checkfirst=True)
+    return conn.execute(
+        sa.select(backfill_progress.c.last_key, backfill_progress.c.rows).where(backfill_progress.c.name == name)
+    ).first()
+
+
+def _save_progress(conn, name: str, last_key, rows: int) -> None:
+    values = {"last_key": last_key, "rows": rows, "updated_at": datetime.utcnow()}
+    updated = conn.execute(backfill_progress.update().where(backfill_progress.c.name == name).values(**values))
+    if not updated.rowcount:
+        conn.execute(backfill_progress.insert().values(name=name, **values))
+
+
+def batched_backfill(table: sa.Table, name: str, values: Optional[dict] = None,
+                     transform: Optional[Callable] = None, columns: Sequence[str] = (), where=None,
+                     key: str = "id", batch_size: int = BACKFILL_BATCH_SIZE,
+                     pause: float = BACKFILL_PAUSE_SECONDS, target_seconds: float = BACKFILL_TARGET_SECONDS) -> int:
+    """
+    values — SQL-вирази для UPDATE (рахує БД); transform — функція рядка з
+    columns, що повертає нові значення (рахує Python).
+
+    :param table: sa.table(...) з потрібними колонками
+    :param name: ключ прогресу, унікальний серед міграцій
+    :param values: {колонка: вираз}
+    :param transform: row -> {колонка: значення}
+    :param columns: колонки, які читає transform
+    :param where: додаткова умова, напр. table.c.phone_e164.is_(None)
+    :param key: цілий первинний ключ
+    :param batch_size: початковий розмір пачки
+    :param pause: секунд між пачками
+    :param target_seconds: бажана тривалість однієї пачки
+    :return: кількість оновлених рядків
+    """
+    if (values is None) == (transform is None):
+        raise ValueError("Pass exactly one of values or transform")
+    key_column = table.c[key]
+    if op.get_context().as_sql:
+        if transform is not None:
+            raise RuntimeError(f"Backfill {name} computes values in Python and cannot run in --sql mode")
+        op.execute(table.update().where(*([where] if where is not None else [])).values(**values))
+        return 0
+
+    with outside_transaction():
+        conn = op.get_bind()
+        progress = _load_progress(conn, name)
+        last_key, total = (progress.last_key, progress.rows) if progress else (None, 0)
+        if progress:
+            logger.info("resuming backfill %s after %s=%s (%s rows done)", name, key, last_key, total)
+        started = time.monotonic()
+        while True:
+            batch_started = time.monotonic()
+            after = [key_column > last_key] if last_key is not None else []
+            if transform is not None:
+                rows = conn.execute(
+                    sa.select(key_column, *(table.c[column] for column in columns))
+                    .where(*after, *([where] if where is not None else []))
+                    .order_by(key_column)
+                    .limit(batch_size)
+                ).all()
+                if not rows:
+                    break
+                conn.execute(
+                    table.update().where(key_column == sa.bindparam("_key")).values(
+                        **{column: sa.bindparam(column) for column in transform(rows[0]._mapping)}
+                    ),
+                    [{"_key": row[0], **transform(row._mapping)} for row in rows],
+                )
+                last_key, updated = rows[-1][0], len(rows)
+            else:
+                upper = conn.scalar(
+                    sa.select(key_column).where(*after).order_by(key_column).offset(batch_size - 1).limit(1)
+                )
+                bounds = after + ([key_column <= upper] if upper is not None else [])
+                updated = conn.execute(
+                    table.update().where(*bounds, *([where] if where is not None else [])).values(**values)
+                ).rowcount
+                if upper is None:
+                    total += max(updated, 0)
+                    break
+                last_key = upper
+            total += max(updated, 0)
+            _save_progress(conn, name, last_key, total)
+
+            elapsed = time.monotonic() - batch_started
+            if elapsed > target_seconds * 2 and batch_size > 100:
+                batch_size //= 2
+            elif elapsed < target_seconds / 2:
+                batch_size = min(BACKFILL_MAX_BATCH_SIZE, batch_size * 2)
+            logger.info("backfill %s: %s rows, %s=%s, %.0f rows/s", name, total, key, last_key,
+                        total / max(time.monotonic() - started, 1e-9))
+            time.sleep(pause)
+
+        conn.execute(backfill_progress.delete().where(backfill_progress.c.name == name))
+    logger.info("backfill %s done: %s rows in %.1f s", name, total, time.monotonic() - started)
+    return total
@@ -0,0 +1,34 @@
+import os
+import re
+from typing import Optional
+
+DEFAULT_PHONE_COUNTRY_CODE = os.getenv("DEFAULT_PHONE_COUNTRY_CODE", "380")
+
+_NON_DIGITS = re.compile(r"\D+")
+
+
+def normalize_phone_e164(phone: str, country_code: str = DEFAULT_PHONE_COUNTRY_CODE) -> Optional[str]:
+    """
+    Приводить номер у довільному записі до E.164 ("+380671112233").
+    Номери без коду країни доповнюються country_code, національний префікс 0
+    відкидається. Повертає None, якщо цифр замало або забагато для E.164.
+
+    :param phone:
+    :param country_code:
+    :return:
+    """
+    if not phone:
+        return None
+    raw = phone.strip()
+    digits = _NON_DIGITS.sub("", raw)
+    if raw.startswith("+"):
+        pass
+    elif digits.startswith("00"):
+        digits = digits[2:]
+    elif digits.startswith("0"):
+        digits = country_code + digits[1:]
+    elif len(digits) <= 10:
+        digits = country_code + digits
+    if not 8 <= len(digits) <= 15:
+        return None
+    return "+" + digits
@@ -0,0 +1,210 @@
+"""
+Профілювання окремих запитів на вимогу.
+
+Запит профілюється, якщо в ньому є заголовок X-Profile зі значенням
+PROFILING_TOKEN або якщо він потрапив у вибірку PROFILING_SAMPLE_RATE.
+Без токена й з нульовою часткою middleware лише пропускає запит далі.
+
+Профіль статистичний: окремий потік кожні PROFILING_INTERVAL_MS знімає
+стек потоку циклу подій. Якщо в цей момент виконується задача запиту,
+записується її стек від middleware донизу (разом із залежностями на кшталт
+get_current_user); якщо ні — запит чекає на I/O чи на інші задачі, і
+вибірка йде в "[suspended]". Результат — folded stacks ("a;b;c 12" на
+рядок), які читають flamegraph.pl, speedscope та inferno. Файли лежать у
+PROFILING_DIR, найстаріші видаляються понад PROFILING_MAX_FILES. Ім'я
+файлу повертається в заголовку X-Profile-Id.
+"""
+import asyncio
+import logging
+import os
+import random
+import re
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional
+from src.logs import request_id_var
+
+logger = logging.getLogger(__name__)
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_INTERVAL_MS = float(os.getenv("PROFILING_INTERVAL_MS", "2"))
+PROFILING_DIR = os.getenv("PROFILING_DIR", "profiles")
+PROFILING_MAX_FILES = int(os.getenv("PROFILING_MAX_FILES", "200"))
+PROFILE_HEADER = b"x-profile"
+PROFILE_ID_HEADER = b"x-profile-id"
+SUSPENDED = "[suspended]"
+
+
+def frame_label(code) -> str:
+    """
+
+    :param code:
+    :return:
+    """
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class RequestProfile:
+    """
+    Потік-семплер стеку циклу подій для однієї задачі запиту.
+    """
+
+    def __init__(self, task: asyncio.Task, loop: asyncio.AbstractEventLoop, root_code, interval_ms: float):
+        self.task = task
+        self.loop = loop
+        self.root_code = root_code
+        self.interval = interval_ms / 1000
+        self.thread_id = threading.get_ident()
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def _stack(self) -> str:
+        frame = sys._current_frames().get(self.thread_id)
+        labels = []
+        while frame is not None:
+            labels.append(frame_label(frame.f_code))
+            if frame.f_code is self.root_code:
+                break
+            frame = frame.f_back
+        return ";".join(reversed(labels))
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            if asyncio.current_task(self.loop) is self.task:
+                self.stacks[self._stack()] += 1
+            else:
+                self.stacks[SUSPENDED] += 1
+
+    def start(self) -> None:
+        """
+
+        :return:
+        """
+        self._thread.start()
+
+    def stop(self) -> None:
+        """
+
+        :return:
+        """
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self, root: str) -> str:
+        """
+
+        :param root: кореневий кадр, наприклад "GET /contacts/"
+        :return:
+        """
+        return "".join(f"{root};{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """
+    Каталог профілів з обмеженням на кількість файлів.
+    """
+
+    def __init__(self, directory: str = PROFILING_DIR, max_files: int = PROFILING_MAX_FILES):
+        self.directory = directory
+        self.max_files = max_files
+
+    def save(self, name: str, content: str) -> str:
+        """
+        Виконується в пулі потоків.
+
+        :param name:
+        :param content:
+        :return: шлях до файлу
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, name)
+        with open(path, "w") as output:
+            output.write(content)
+        self.prune()
+        return path
+
+    def prune(self) -> None:
+        """
+
+        :return:
+        """
+        entries = [entry for entry in os.scandir(self.directory) if entry.name.endswith(".folded")]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        for entry in entries[:max(0, len(entries) - self.max_files)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+
+
+def filename_part(value: str, limit: int = 64) -> str:
+    """
+
+    :param value:
+    :param limit:
+    :return:
+    """
+    return re.sub(r"[^A-Za-z0-9]+", "_", value).strip("_")[:limit]
+
+
+class ProfilingMiddleware:
+    """
+    Чистий ASGI middleware; без токена й вибірки не робить нічого, крім перевірки умов.
+    """
+
+    def __init__(self, app, token: Optional[str] = PROFILING_TOKEN, sample_rate: float = PROFILING_SAMPLE_RATE,
+                 interval_ms: float = PROFILING_INTERVAL_MS, store: Optional[ProfileStore] = None):
+        self.app = app
+        self.token = token.encode() if token else None
+        self.sample_rate = sample_rate
+        self.interval_ms = interval_ms
+        self.store = store or ProfileStore()
+
+    def wants_profile(self, scope) -> bool:
+        """
+
+        :param scope:
+        :return:
+        """
+        if self.token is not None:
+            for name, value in scope["headers"]:
+                if name == PROFILE_HEADER:
+                    return secrets.compare_digest(value, self.token)
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        loop = asyncio.get_running_loop()
+        # метод, шлях і X-Request-ID приходять від клієнта — в імені файлу лише [A-Za-z0-9_]
+        name = "{}-{}-{}-{}.folded".format(
+            time.strftime("%Y%m%dT%H%M%S"),
+            filename_part(scope["method"]),
+            filename_part(scope["path"]) or "root",
+            filename_part(request_id_var.get() or "") or secrets.token_hex(4),
+        )
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(PROFILE_ID_HEADER, name.encode())]
+            await send(message)
+
+        profile = RequestProfile(asyncio.current_task(), loop, ProfilingMiddleware.__call__.__code__, self.interval_ms)
+        profile.start()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.stop()
+            content = profile.folded(f"{scope['method']} {scope['path']}")
+            try:
+                path = await loop.run_in_executor(None, self.store.save, name, content)
+                logger.info("request profile saved to %s", path, extra={"samples": sum(profile.stacks.values())})
+            except OSError:
+                logger.exception("failed to save request profile")
@@ -0,0 +1,239 @@
+"""
+Реєстрація користувачів.
+
+Один шлях для /auth/signup, /auth/register і масового створення акаунтів:
+INSERT ... ON CONFLICT (email) DO NOTHING RETURNING за один запит і
+вставляє рядок, і повідомляє, чи email уже зайнятий, тож паралельні
+реєстрації з однаковою адресою не проходять обидві. Масове створення йде
+пачками по PROVISION_BATCH_SIZE: паролі хешуються у власному малому пулі
+потоків (PROVISION_HASH_THREADS), а не в пулі смуги auth, тож логіни й
+реєстрації не чекають за пачкою; з'єднання з БД береться лише на
+багаторядковий INSERT пачки. Великі списки — через CLI, HTTP-ендпоінт
+приймає не більше PROVISION_HTTP_MAX_USERS.
+
+Лист підтвердження не відправляється в запиті: адреса стає в чергу, яку
+фонова задача застосунку розсилає через SMTP у пулі потоків.
+
+    python -m src.registration provision users.csv [--verified]
+"""
+import argparse
+import asyncio
+import csv
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.auth import create_email_verification_token, get_password_hash, send_verification_email
+from src.bulkhead import auth_lane
+from src.database import AsyncSessionLocal, ShardSessions
+from src.models import User, UserShard
+
+logger = logging.getLogger(__name__)
+
+PROVISION_BATCH_SIZE = int(os.getenv("PROVISION_BATCH_SIZE", "500"))
+PROVISION_HASH_THREADS = int(os.getenv("PROVISION_HASH_THREADS", "1"))
+PROVISION_HTTP_MAX_USERS = int(os.getenv("PROVISION_HTTP_MAX_USERS", "100"))
+VERIFICATION_QUEUE_SIZE = int(os.getenv("VERIFICATION_QUEUE_SIZE", "10000"))
+
+INSERT_DIALECTS = {"postgresql": postgresql, "sqlite": sqlite}
+
+
+def insert_new_users(dialect_name: str, rows: List[dict]):
+    """
+
+    :param dialect_name:
+    :param rows: значення колонок users
+    :return: INSERT, що пропускає зайняті email і повертає (id, email) вставлених
+    """
+    return (
+        INSERT_DIALECTS[dialect_name].insert(User)
+        .values(rows)
+        .on_conflict_do_nothing(index_elements=[User.email])
+        .returning(User.id, User.email)
+    )
+
+
+class VerificationMailer:
+    """
+    Черга листів підтвердження; розсилає фонова задача застосунку.
+    """
+
+    def __init__(self, maxsize: int = VERIFICATION_QUEUE_SIZE):
+        self.queue = asyncio.Queue(maxsize)
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def enqueue(self, user_id: int, email: str) -> None:
+        """
+        Запит не чекає на SMTP; переповнена черга лише губить лист.
+
+        :param user_id:
+        :param email:
+        :return:
+        """
+        try:
+            self.queue.put_nowait((user_id, email))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("verification queue is full, email to %s dropped", email)
+
+    async def send(self, user_id: int, email: str) -> None:
+        """
+
+        :param user_id:
+        :param email:
+        :return:
+        """
+        token = create_email_verification_token(user_id)
+        await asyncio.get_running_loop().run_in_executor(None, send_verification_email, email, token)
+
+    async def deliver(self, user_id: int, email: str) -> None:
+        """
+        Без SMTP_HOST лист лише знімається з черги.
+
+        :param user_id:
+        :param email:
+        :return:
+        """
+        if not os.getenv("SMTP_HOST"):
+            self.dropped += 1
+            logger.info("SMTP_HOST is not set, verification email to %s skipped", email)
+            return
+        try:
+            await self.send(user_id, email)
+            self.sent += 1
+        except Exception:
+            self.failed += 1
+            logger.exception("failed to send verification email to %s", email)
+
+    async def run_sender_loop(self) -> None:
+        """
+        Фонова задача застосунку.
+
+        :return:
+        """
+        while True:
+            await self.deliver(*await self.queue.get())
+
+    async def drain(self) -> None:
+        """
+        Розсилає все, що вже в черзі; для CLI, де фонової задачі немає.
+
+        :return:
+        """
+        while not self.queue.empty():
+            await self.deliver(*self.queue.get_nowait())
+
+    def clear(self) -> None:
+        """
+
+        :return:
+        """
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.sent = self.failed = self.dropped = 0
+
+
+verification_mailer = VerificationMailer()
+provision_hasher = ThreadPoolExecutor(PROVISION_HASH_THREADS, thread_name_prefix="provision-hash")
+
+
+async def insert_users(db: AsyncSession, rows: List[dict]) -> List[Tuple[int, str]]:
+    """
+
+    :param db:
+    :param rows:
+    :return: (id, email) лише нових користувачів
+    """
+    if not rows:
+        return []
+    statement = insert_new_users(db.get_bind().dialect.name, rows)
+    created = [tuple(row) for row in await db.execute(statement)]
+    if created and len(ShardSessions) == 1:
+        # каталог шардів у тій самій транзакції: після додавання шардів
+        # користувач лишиться там, де вже лежать його контакти
+        await db.execute(insert(UserShard), [
+            {"user_id": user_id, "shard_id": 0, "moving": False} for user_id, _ in created
+        ])
+    return created
+
+
+async def register_user(db: AsyncSession, email: str, password: str) -> Optional[dict]:
+    """
+
+    :param db:
+    :param email:
+    :param password:
+    :return: {"id", "email"} або None, якщо email уже зареєстровано
+    """
+    hashed_password = await auth_lane.run(get_password_hash, password)
+    created = await insert_users(db, [{"email": email, "hashed_password": hashed_password, "is_verified": False}])
+    await db.commit()
+    if not created:
+        return None
+    user_id, email = created[0]
+    verification_mailer.enqueue(user_id, email)
+    return {"id": user_id, "email": email}
+
+
+async def provision_users(users: Sequence[Tuple[str, str]], verified: bool = False,
+                          batch_size: int = PROVISION_BATCH_SIZE, session_factory=AsyncSessionLocal) -> dict:
+    """
+    Масове створення; кожна пачка комітиться окремо у власній короткій сесії.
+
+    :param users: пари (email, пароль)
+    :param verified: створити вже підтвердженими, без листів
+    :param batch_size:
+    :param session_factory:
+    :return: {"created": [{"id", "email"}], "existing": [email]}
+    """
+    loop = asyncio.get_running_loop()
+    unique = list(dict(users).items())
+    created, existing = [], []
+    for start in range(0, len(unique), batch_size):
+        batch = unique[start:start + batch_size]
+        hashes = await asyncio.gather(*(
+            loop.run_in_executor(provision_hasher, get_password_hash, password) for _, password in batch
+        ))
+        rows = [
+            {"email": email, "hashed_password": hashed, "is_verified": verified}
+            for (email, _), hashed in zip(batch, hashes)
+        ]
+        async with session_factory() as db:
+            inserted = dict((email, user_id) for user_id, email in await insert_users(db, rows))
+            await db.commit()
+        for email, _ in batch:
+            if email not in inserted:
+                existing.append(email)
+                continue
+            created.append({"id": inserted[email], "email": email})
+            if not verified:
+                verification_mailer.enqueue(inserted[email], email)
+    return {"created": created, "existing": existing}
+
+
+async def main(args) -> None:
+    """
+
+    :param args:
+    :return:
+    """
+    with open(args.file, newline="") as source:
+        users = [(row["email"], row["password"]) for row in csv.DictReader(source)]
+    result = await provision_users(users, verified=args.verified, batch_size=args.batch_size)
+    await verification_mailer.drain()
+    print(f"Створено: {len(result['created'])}, вже існували: {len(result['existing'])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    provision = subparsers.add_parser("provision", help="CSV з колонками email,password")
+    provision.add_argument("file")
+    provision.add_argument("--verified", action="store_true")
+    provision.add_argument("--batch-size", type=int, default=PROVISION_BATCH_SIZE)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,209 @@
+"""
+Відкликані JWT (jti).
+
+Джерело істини — таблиця revoked_tokens. Кожен воркер тримає в пам'яті
+Bloom-фільтр усіх відкликаних jti і невелику точну множину нещодавніх, тому
+звичайна перевірка "не відкликано" не звертається до БД. До БД іде лише
+рідкісний позитив фільтра, якого немає в точній множині. Воркери
+синхронізуються опитуванням таблиці за зростаючим id з перекриттям:
+serial id видається під час INSERT, а не коміту, тож рядок з меншим id
+може стати видимим пізніше за більший — кожна синхронізація перечитує
+останні REVOCATION_SYNC_OVERLAP_IDS id нижче водяного знака.
+"""
+import asyncio
+import hashlib
+import logging
+import math
+import os
+from collections import OrderedDict
+from datetime import datetime
+from sqlalchemy import delete, exists, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import AsyncSessionLocal
+from src.models import RevokedToken
+
+logger = logging.getLogger(__name__)
+
+REVOCATION_BLOOM_CAPACITY = int(os.getenv("REVOCATION_BLOOM_CAPACITY", "200000"))
+REVOCATION_BLOOM_ERROR_RATE = float(os.getenv("REVOCATION_BLOOM_ERROR_RATE", "0.001"))
+REVOCATION_EXACT_SET_SIZE = int(os.getenv("REVOCATION_EXACT_SET_SIZE", "10000"))
+REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "2"))
+REVOCATION_PURGE_SECONDS = float(os.getenv("REVOCATION_PURGE_SECONDS", "3600"))
+REVOCATION_SYNC_OVERLAP_IDS = int(os.getenv("REVOCATION_SYNC_OVERLAP_IDS", "1000"))
+
+
+class BloomFilter:
+    """
+    Bloom-фільтр з подвійним хешуванням одного blake2b-дайджесту.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return ((h1 + i * h2) % size for i in range(self.hashes))
+
+    def add(self, key: str) -> None:
+        """
+
+        :param key:
+        :return:
+        """
+        bits = self.bits
+        for position in self._positions(key):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key: str) -> bool:
+        bits = self.bits
+        for position in self._positions(key):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+
+class RevocationStore:
+    """
+    Стан відкликань одного воркера: фільтр, точна множина і водяний знак id.
+    """
+
+    def __init__(
+        self,
+        capacity: int = REVOCATION_BLOOM_CAPACITY,
+        error_rate: float = REVOCATION_BLOOM_ERROR_RATE,
+        exact_size: int = REVOCATION_EXACT_SET_SIZE,
+        overlap: int = REVOCATION_SYNC_OVERLAP_IDS,
+    ):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.exact_size = exact_size
+        self.overlap = overlap
+        self.clear()
+
+    def clear(self) -> None:
+        """
+
+        :return:
+        """
+        self.bloom = BloomFilter(self.capacity, self.error_rate)
+        self.recent = OrderedDict()
+        self.watermark = 0
+        self.db_checks = 0
+
+    def _remember(self, jti: str, bloom: BloomFilter = None, recent: OrderedDict = None) -> None:
+        bloom = self.bloom if bloom is None else bloom
+        recent = self.recent if recent is None else recent
+        bloom.add(jti)
+        recent[jti] = None
+        recent.move_to_end(jti)
+        if len(recent) > self.exact_size:
+            recent.popitem(last=False)
+
+    async def is_revoked(self, db: AsyncSession, jti: str) -> bool:
+        """
+
+        :param db:
+        :param jti:
+        :return:
+        """
+        if jti not in self.bloom:
+            return False
+        if jti in self.recent:
+            return True
+        self.db_checks += 1
+        return bool(await db.scalar(select(exists().where(RevokedToken.jti == jti))))
+
+    async def revoke(self, db: AsyncSession, jti: str, expires_at: datetime) -> bool:
+        """
+        Відкликає jti. Повертає False, якщо його вже відкликали раніше,
+        зокрема в іншому воркері: унікальний індекс робить це атомарним.
+
+        :param db:
+        :param jti:
+        :param expires_at:
+        :return:
+        """
+        db.add(RevokedToken(jti=jti, expires_at=expires_at))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            self._remember(jti)
+            return False
+        self._remember(jti)
+        return True
+
+    async def sync(self, db: AsyncSession) -> int:
+        """
+        Підтягує відкликання, зроблені іншими воркерами, разом із вікном
+        перекриття нижче водяного знака.
+
+        :param db:
+        :return: кількість jti, яких воркер ще не знав
+        """
+        result = await db.execute(
+            select(RevokedToken.id, RevokedToken.jti)
+            .where(RevokedToken.id > self.watermark - self.overlap)
+            .order_by(RevokedToken.id)
+        )
+        rows = result.all()
+        learned = 0
+        for _, jti in rows:
+            if jti in self.recent:
+                continue
+            self._remember(jti)
+            learned += 1
+        if rows:
+            self.watermark = max(self.watermark, rows[-1][0])
+        return learned
+
+    async def purge(self, db: AsyncSession) -> None:
+        """
+        Видаляє прострочені записи і перебудовує фільтр з тих, що лишились.
+
+        :param db:
+        :return:
+        """
+        await db.execute(delete(RevokedToken).where(RevokedToken.expires_at < datetime.utcnow()))
+        await db.commit()
+        result = await db.execute(select(RevokedToken.id, RevokedToken.jti).order_by(RevokedToken.id))
+        rows = result.all()
+
+        bloom = BloomFilter(self.capacity, self.error_rate)
+        recent = OrderedDict()
+        for _, jti in rows:
+            self._remember(jti, bloom, recent)
+        for jti in self.recent:
+            bloom.add(jti)
+        self.bloom, self.recent = bloom, recent
+        if rows:
+            self.watermark = max(self.watermark, rows[-1][0])
+
+    async def run_sync_loop(self) -> None:
+        """
+        Фонова задача застосунку.
+
+        :return:
+        """
+        loop = asyncio.get_running_loop()
+        next_purge = loop.time()
+        while True:
+            try:
+                async with AsyncSessionLocal() as session:
+                    if loop.time() >= next_purge:
+                        await self.purge(session)
+                        next_purge = loop.time() + REVOCATION_PURGE_SECONDS
+                    else:
+                        await self.sync(session)
+            except Exception:
+                logger.exception("revocation sync failed")
+            await asyncio.sleep(REVOCATION_SYNC_SECONDS)
+
+
+revocation_store = RevocationStore()
@@ -1,14 +1,93 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
-from src.database import get_db
 from src import crud
-from src.schemas import ContactCreate, ContactRead, ContactUpdate
+from src.schemas import ContactCreate, ContactRead, ContactUpdate, ContactSuggestion, ContactChanges, DuplicateReport
+from src.schemas import ContactStatsRead
+from src.autocomplete import autocomplete_index, SUGGESTION_COLUMNS
+from src.dedup import duplicate_jobs
+from src.sync import get_changes
+from src.stats import get_contact_stats
+from src.groups import GroupFilter
+from src.sharding import get_shard_db
 from src.auth import get_current_user
 from src.models import User
 from src.limiter import limiter
+from src.bulkhead import contacts_lane
+from src.idempotency import IdempotentRoute
 
-router = APIRouter(prefix="/contacts", tags=["Contacts"])
+router = APIRouter(
+    prefix="/contacts", tags=["Contacts"], dependencies=[Depends(contacts_lane)], route_class=IdempotentRoute
+)
+
+
+def sparse_fields(
+    fields: Optional[str] = Query(None, description="Поля ContactRead через кому, напр. first_name,phone"),
+) -> Optional[List[str]]:
+    """
+
+    :param fields:
+    :return:
+    """
+    if fields is None:
+        return None
+    names = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in ContactRead.model_fields]
+    if not names:
+        raise HTTPException(status_code=422, detail="fields must not be empty")
+    if unknown:
+        raise HTTPException(status_code=422, detail=f"Unknown fields: {', '.join(unknown)}")
+    return names
+
+
+def group_ids(value: Optional[str], name: str) -> tuple:
+    """
+
+    :param value: id груп через кому
+    :param name: назва параметра для повідомлення про помилку
+    :return:
+    """
+    if value is None:
+        return ()
+    try:
+        ids = tuple(sorted({int(part) for part in value.split(",") if part.strip()}))
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"{name} must be comma-separated group ids")
+    if not ids:
+        raise HTTPException(status_code=422, detail=f"{name} must not be empty")
+    return ids
+
+
+def group_filter(
+    groups: Optional[str] = Query(None, description="Контакти, що є в усіх цих групах"),
+    any_groups: Optional[str] = Query(None, description="Контакти, що є хоча б в одній з цих груп"),
+    exclude_groups: Optional[str] = Query(None, description="Контакти, яких немає в жодній з цих груп"),
+) -> GroupFilter:
+    """
+
+    :param groups:
+    :param any_groups:
+    :param exclude_groups:
+    :return:
+    """
+    return GroupFilter(
+        group_ids(groups, "groups"), group_ids(any_groups, "any_groups"), group_ids(exclude_groups, "exclude_groups")
+    )
+
+
+def contacts_response(contacts, fields: Optional[List[str]]):
+    """
+    Повний список іде через response_model, sparse-рядки віддаються як є.
+
+    :param contacts:
+    :param fields:
+    :return:
+    """
+    if fields is None:
+        return contacts
+    return JSONResponse(content=jsonable_encoder(contacts))
 
 
 @router.post("/", response_model=ContactRead, status_code=201)
@@ -16,7 +95,7 @@ router = APIRouter(prefix="/contacts", tags=["Contacts"])
 async def create_contact(
     request: Request,
     contact: ContactCreate,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_shard_db),
     user: User = Depends(get_current_user),
 ):
     """
@@ -32,22 +111,126 @@ async def create_contact(
 
 @router.get("/", response_model=List[ContactRead])
 async def get_contacts(
-    db: AsyncSession = Depends(get_db),
+    fields: Optional[List[str]] = Depends(sparse_fields),
+    groups: GroupFilter = Depends(group_filter),
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    db: AsyncSession = Depends(get_shard_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    groups=1,2&exclude_groups=3 — контакти з груп 1 і 2, яких немає в групі 3.
+
+    :param fields:
+    :param groups:
+    :param skip:
+    :param limit:
+    :param db:
+    :param user:
+    :return:
+    """
+    return contacts_response(await crud.get_contacts(db, user.id, fields, skip, limit, groups), fields)
+
+
+@router.get("/changes", response_model=ContactChanges)
+async def get_contact_changes(
+    since: int = Query(0, ge=0),
+    limit: int = Query(500, ge=1, le=1000),
+    db: AsyncSession = Depends(get_shard_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    reset=true означає, що курсор застарів і клієнту треба завантажити список заново.
+
+    :param since:
+    :param limit:
+    :param db:
+    :param user:
+    :return:
+    """
+    return await get_changes(db, user.id, since, limit)
+
+
+@router.get("/stats", response_model=ContactStatsRead)
+async def contact_stats(
+    db: AsyncSession = Depends(get_shard_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    by_birth_month — кількість контактів за місяцем народження, від січня.
+
+    :param db:
+    :param user:
+    :return:
+    """
+    return await get_contact_stats(db, user.id)
+
+
+@router.get("/autocomplete", response_model=List[ContactSuggestion])
+async def autocomplete_contacts(
+    q: str = "",
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_shard_db),
+    user: User = Depends(get_current_user),
+):
+    """
+
+    :param q:
+    :param limit:
+    :param db:
+    :param user:
+    :return:
+    """
+    rows = await autocomplete_index.search(db, user.id, q, limit)
+    keys = [column.key for column in SUGGESTION_COLUMNS]
+    return [dict(zip(keys, row)) for row in rows]
+
+
+@router.get("/duplicates", response_model=DuplicateReport)
+async def get_duplicates(
+    background_tasks: BackgroundTasks,
+    response: Response,
+    refresh: bool = False,
+    user: User = Depends(get_current_user),
+):
+    """
+
+    :param background_tasks:
+    :param response:
+    :param refresh:
+    :param user:
+    :return:
+    """
+    report = await duplicate_jobs.get(user.id)
+    if report is None or refresh:
+        if await duplicate_jobs.schedule(user.id):
+            background_tasks.add_task(duplicate_jobs.run, user.id)
+        report = await duplicate_jobs.get(user.id)
+    if report["status"] == "running":
+        response.status_code = 202
+    return report
+
+
+@router.get("/by-phone/{number}", response_model=List[ContactRead])
+async def get_contacts_by_phone(
+    number: str,
+    db: AsyncSession = Depends(get_shard_db),
     user: User = Depends(get_current_user),
 ):
     """
 
+    :param number:
     :param db:
     :param user:
     :return:
     """
-    return await crud.get_contacts(db, user.id)
+    return await crud.get_contacts_by_phone(db, number, user.id)
 
 
 @router.get("/{contact_id}", response_model=ContactRead)
 async def get_contact(
     contact_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_shard_db),
     user: User = Depends(get_current_user),
 ):
     """
@@ -67,7 +250,7 @@ async def get_contact(
 async def update_contact(
     contact_id: int,
     contact_data: ContactUpdate,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_shard_db),
     user: User = Depends(get_current_user),
 ):
     """
@@ -87,7 +270,7 @@ async def update_contact(
 @router.delete("/{contact_id}", status_code=204)
 async def delete_contact(
     contact_id: int,
-    db: AsyncSession = Depends(get_db),
+    db: AsyncSession = Depends(get_shard_db),
     user: User = Depends(get_current_user),
 ):
     """
@@ -106,28 +289,40 @@ async def delete_contact(
 @router.get("/search/", response_model=List[ContactRead])
 async def search_contacts(
     query: Optional[str] = None,
-    db: AsyncSession = Depends(get_db),
+    fields: Optional[List[str]] = Depends(sparse_fields),
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    db: AsyncSession = Depends(get_shard_db),
     user: User = Depends(get_current_user),
 ):
     """
 
     :param query:
+    :param fields:
+    :param skip:
+    :param limit:
     :param db:
     :param user:
     :return:
     """
-    return await crud.search_contacts(db, query or "", user.id)
+    return contacts_response(await crud.search_contacts(db, query or "", user.id, fields, skip, limit), fields)
 
 
 @router.get("/birthdays/", response_model=List[ContactRead])
 async def get_upcoming_birthdays(
-    db: AsyncSession = Depends(get_db),
+    fields: Optional[List[str]] = Depends(sparse_fields),
+    skip: int = Query(0, ge=0),
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    db: AsyncSession = Depends(get_shard_db),
     user: User = Depends(get_current_user),
 ):
     """
 
+    :param fields:
+    :param skip:
+    :param limit:
     :param db:
     :param user:
     :return:
     """
-    return await crud.get_upcoming_birthdays(db, user.id)
+    return contacts_response(await crud.get_upcoming_birthdays(db, user.id, fields, skip, limit), fields)
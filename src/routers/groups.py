@@ -0,0 +1,151 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from src import groups
+from src.schemas import GroupCreate, GroupRead, GroupMembers, GroupMembersAdded
+from src.sharding import get_shard_db
+from src.auth import get_current_user
+from src.models import User
+from src.bulkhead import contacts_lane
+from src.idempotency import IdempotentRoute
+
+router = APIRouter(
+    prefix="/groups", tags=["Groups"], dependencies=[Depends(contacts_lane)], route_class=IdempotentRoute
+)
+
+
+@router.post("/", response_model=GroupRead, status_code=201)
+async def create_group(
+    group: GroupCreate,
+    db: AsyncSession = Depends(get_shard_db),
+    user: User = Depends(get_current_user),
+):
+    """
+
+    :param group:
+    :param db:
+    :param user:
+    :return:
+    """
+    created = await groups.create_group(db, user.id, group.name)
+    if created is None:
+        raise HTTPException(status_code=409, detail="Group already exists")
+    return created
+
+
+@router.get("/", response_model=List[GroupRead])
+async def list_groups(
+    db: AsyncSession = Depends(get_shard_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    size — кількість контактів у групі.
+
+    :param db:
+    :param user:
+    :return:
+    """
+    return await groups.list_groups(db, user.id)
+
+
+@router.get("/{group_id}", response_model=GroupRead)
+async def get_group(
+    group_id: int,
+    db: AsyncSession = Depends(get_shard_db),
+    user: User = Depends(get_current_user),
+):
+    """
+
+    :param group_id:
+    :param db:
+    :param user:
+    :return:
+    """
+    group = await groups.get_group(db, group_id, user.id)
+    if group is None:
+        raise HTTPException(status_code=404, detail="Group not found")
+    return group
+
+
+@router.put("/{group_id}", response_model=GroupRead)
+async def rename_group(
+    group_id: int,
+    group: GroupCreate,
+    db: AsyncSession = Depends(get_shard_db),
+    user: User = Depends(get_current_user),
+):
+    """
+
+    :param group_id:
+    :param group:
+    :param db:
+    :param user:
+    :return:
+    """
+    renamed = await groups.rename_group(db, group_id, user.id, group.name)
+    if renamed is None:
+        raise HTTPException(status_code=404, detail="Group not found")
+    if renamed is False:
+        raise HTTPException(status_code=409, detail="Group already exists")
+    return renamed
+
+
+@router.delete("/{group_id}", status_code=204)
+async def delete_group(
+    group_id: int,
+    db: AsyncSession = Depends(get_shard_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Контакти лишаються, видаляється лише група та членство в ній.
+
+    :param group_id:
+    :param db:
+    :param user:
+    :return:
+    """
+    if not await groups.delete_group(db, group_id, user.id):
+        raise HTTPException(status_code=404, detail="Group not found")
+    return None
+
+
+@router.post("/{group_id}/contacts", response_model=GroupMembersAdded)
+async def add_group_members(
+    group_id: int,
+    members: GroupMembers,
+    db: AsyncSession = Depends(get_shard_db),
+    user: User = Depends(get_current_user),
+):
+    """
+    Повторне додавання не є помилкою; added рахує лише нові членства.
+
+    :param group_id:
+    :param members:
+    :param db:
+    :param user:
+    :return:
+    """
+    added = await groups.add_members(db, group_id, user.id, members.contact_ids)
+    if added is None:
+        raise HTTPException(status_code=404, detail="Group not found")
+    return {"added": added}
+
+
+@router.delete("/{group_id}/contacts/{contact_id}", status_code=204)
+async def remove_group_member(
+    group_id: int,
+    contact_id: int,
+    db: AsyncSession = Depends(get_shard_db),
+    user: User = Depends(get_current_user),
+):
+    """
+
+    :param group_id:
+    :param contact_id:
+    :param db:
+    :param user:
+    :return:
+    """
+    if not await groups.remove_member(db, group_id, user.id, contact_id):
+        raise HTTPException(status_code=404, detail="Contact is not in the group")
+    return None
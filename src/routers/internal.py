@@ -0,0 +1,78 @@
+import os
+import secrets
+from datetime import date
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import get_db
+from src.birthdays import get_sharded_birthday_feed
+from src.schemas import BirthdayFeed, UserBulkCreate, UserBulkResult
+from src.registration import PROVISION_HTTP_MAX_USERS, provision_users
+
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN")
+
+
+async def verify_internal_token(x_internal_token: Optional[str] = Header(None)):
+    """
+    Внутрішні маршрути вимкнені, доки не задано INTERNAL_API_TOKEN.
+
+    :param x_internal_token:
+    :return:
+    """
+    if not INTERNAL_API_TOKEN or not x_internal_token \
+            or not secrets.compare_digest(x_internal_token, INTERNAL_API_TOKEN):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+router = APIRouter(prefix="/internal", tags=["Internal"], dependencies=[Depends(verify_internal_token)])
+
+
+@router.get("/birthdays", response_model=BirthdayFeed)
+async def birthday_feed(
+    start: Optional[date] = None,
+    days: int = Query(7, ge=1, le=31),
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+
+    :param start:
+    :param days:
+    :param cursor:
+    :param limit:
+    :param db:
+    :return:
+    """
+    after = None
+    if cursor:
+        try:
+            day, user_id, contact_id = cursor.split(":")
+            after = (date.fromisoformat(day), int(user_id), int(contact_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    items = await get_sharded_birthday_feed(db, start or date.today(), days, after, limit)
+    next_cursor = None
+    if len(items) == limit:
+        last = items[-1]
+        next_cursor = f"{last['next_birthday'].isoformat()}:{last['user_id']}:{last['contact_id']}"
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@router.post("/users/bulk", response_model=UserBulkResult)
+async def bulk_create_users(body: UserBulkCreate):
+    """
+    Адмінське створення невеликої кількості акаунтів; зайняті email потрапляють
+    в existing. Великі списки — python -m src.registration provision.
+
+    :param body:
+    :return:
+    """
+    if len(body.users) > PROVISION_HTTP_MAX_USERS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {PROVISION_HTTP_MAX_USERS} users per request, use the provision CLI for more",
+        )
+    users = [(user.email, user.password) for user in body.users]
+    return await provision_users(users, verified=body.verified)
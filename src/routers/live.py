@@ -0,0 +1,91 @@
+import asyncio
+import logging
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query, WebSocket, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import AsyncSessionLocal, pool_admissions
+from src.auth import decode_token
+from src.events import event_bus, ConnectionQueue
+from src.revocation import revocation_store
+
+logger = logging.getLogger(__name__)
+
+# Окремий роутер: WebSocket-з'єднання живе довго і не має займати місце в contacts_lane.
+router = APIRouter(prefix="/contacts", tags=["Contacts"])
+
+
+async def authenticate_websocket(token: str, db: AsyncSession) -> Optional[int]:
+    """
+    Браузер не передає заголовки в WebSocket, тому access-токен іде в query.
+
+    :param token:
+    :param db:
+    :return: id користувача або None
+    """
+    try:
+        payload = decode_token(token)
+    except HTTPException:
+        return None
+    user_id = payload.get("sub")
+    if user_id is None:
+        return None
+    jti = payload.get("jti")
+    if jti is not None and await revocation_store.is_revoked(db, jti):
+        return None
+    return int(user_id)
+
+
+async def send_events(websocket: WebSocket, queue: ConnectionQueue) -> None:
+    """
+    Наступна пачка збирається лише після того, як клієнт прийняв попередню.
+
+    :param websocket:
+    :param queue:
+    :return:
+    """
+    while True:
+        batch = await queue.get_batch()
+        await websocket.send_json({"events": batch})
+
+
+async def wait_disconnect(websocket: WebSocket) -> None:
+    """
+
+    :param websocket:
+    :return:
+    """
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+@router.websocket("/ws")
+async def contact_events(websocket: WebSocket, token: str = Query(...)):
+    """
+    Потік подій created/updated/deleted для всіх пристроїв користувача.
+    Сесія потрібна лише для перевірки токена: get_db тримав би місце в
+    PoolAdmission, доки відкритий сокет.
+
+    :param websocket:
+    :param token:
+    :return:
+    """
+    async with pool_admissions[0].session(AsyncSessionLocal) as db:
+        user_id = await authenticate_websocket(token, db)
+    if user_id is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    async with event_bus.subscribe(user_id) as queue:
+        tasks = {
+            asyncio.create_task(send_events(websocket, queue)),
+            asyncio.create_task(wait_disconnect(websocket)),
+        }
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            if task.exception() is not None:
+                logger.debug("contact events connection closed: %r", task.exception())
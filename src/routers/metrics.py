@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends
+from src.admission import deadline_counters
+from src.bulkhead import lanes
+from src.database import pool_admissions
+from src.logs import log_pipeline
+from src.routers.internal import verify_internal_token
+from src.singleflight import contact_reads
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"], dependencies=[Depends(verify_internal_token)])
+
+
+@router.get("/lanes")
+async def lane_metrics():
+    """
+
+    :return:
+    """
+    return {lane.name: lane.stats() for lane in lanes}
+
+
+@router.get("/admission")
+async def admission_metrics():
+    """
+    Стан пулів з'єднань, відсічені запити та скасовані за дедлайном.
+
+    :return:
+    """
+    return {
+        "pools": {admission.name: admission.stats() for admission in pool_admissions},
+        "deadlines": dict(deadline_counters),
+    }
+
+
+@router.get("/reads")
+async def read_metrics():
+    """
+    Лічильники злиття однакових одночасних читань контактів.
+
+    :return:
+    """
+    return contact_reads.stats()
+
+
+@router.get("/logs")
+async def log_metrics():
+    """
+    Заповненість черги журналу й відкинуті вибіркою записи.
+
+    :return:
+    """
+    return log_pipeline.stats()
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import get_db
+from src.schemas import UserCreate, UserResponse
+from src.bulkhead import auth_lane
+from src.registration import register_user
+
+router = APIRouter(prefix="/auth", tags=["auth"])
+
+
+@router.post("/signup", response_model=UserResponse, status_code=201, dependencies=[Depends(auth_lane)])
+@router.post("/register", response_model=UserResponse, status_code=201, dependencies=[Depends(auth_lane)],
+             include_in_schema=False)
+async def signup(user_data: UserCreate, db: AsyncSession = Depends(get_db)):
+    """
+    /auth/register лишився як старий шлях до того самого обробника.
+
+    :param user_data:
+    :param db:
+    :return:
+    """
+    user = await register_user(db, user_data.email, user_data.password)
+    if user is None:
+        raise HTTPException(status_code=409, detail="Email already registered")
+    return user
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr
-from datetime import date
-from typing import Optional
+from pydantic import BaseModel, EmailStr, Field
+from datetime import date, datetime
+from typing import List, Optional
 
 
 class UserOut(BaseModel):
@@ -32,12 +32,26 @@ class UserResponse(UserBase):
         from_attributes = True
 
 
+class UserBulkCreate(BaseModel):
+    users: List[UserCreate]
+    verified: bool = False
+
+
+class UserBulkResult(BaseModel):
+    created: List[UserResponse]
+    existing: List[EmailStr]
+
+
 class Token(BaseModel):
     access_token: str
     refresh_token: str
     token_type: str = "bearer"
 
 
+class LogoutRequest(BaseModel):
+    refresh_token: str
+
+
 class TokenData(BaseModel):
     user_id: Optional[int] = None
 
@@ -69,6 +83,76 @@ class ContactUpdate(BaseModel):
 
 class ContactRead(ContactBase):
     id: int
+    phone_e164: Optional[str] = None
+    updated_at: Optional[datetime] = None
 
     class Config:
         from_attributes = True
+
+
+class ContactChanges(BaseModel):
+    cursor: int
+    has_more: bool
+    reset: bool
+    changed: List[ContactRead]
+    deleted: List[int]
+
+
+class ContactStatsRead(BaseModel):
+    total: int
+    missing_email: int
+    missing_phone: int
+    missing_birthday: int
+    by_birth_month: List[int]
+
+
+class GroupCreate(BaseModel):
+    name: str = Field(min_length=1, max_length=100)
+
+
+class GroupRead(BaseModel):
+    id: int
+    name: str
+    size: int
+
+
+class GroupMembers(BaseModel):
+    contact_ids: List[int] = Field(min_length=1, max_length=1000)
+
+
+class GroupMembersAdded(BaseModel):
+    added: int
+
+
+class ContactSuggestion(BaseModel):
+    id: int
+    first_name: str
+    last_name: str
+    email: str
+    phone: str
+
+
+class DuplicateCluster(BaseModel):
+    contact_ids: List[int]
+    reasons: List[str]
+
+
+class DuplicateReport(BaseModel):
+    status: str
+    computed_at: Optional[datetime] = None
+    clusters: List[DuplicateCluster] = []
+
+
+class BirthdayFeedItem(BaseModel):
+    next_birthday: date
+    user_id: int
+    contact_id: int
+    first_name: str
+    last_name: str
+    email: str
+    phone: str
+
+
+class BirthdayFeed(BaseModel):
+    items: List[BirthdayFeedItem]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,373 @@
+"""
+Синтетичні дані продакшн-обсягу для локальних замірів.
+
+Кількість контактів на користувача має логнормальне тіло (медіана
+--median-contacts) і важкий хвіст: частка --power-users отримує кількість
+за Парето від --power-min до --max-contacts. Імена українські та
+міжнародні, email і телефони в різних записах (phone_e164 рахується як у
+crud), дні народження в частини контактів. Разом із контактами пишуться
+birthday_digest і user_sync_state, а наприкінці перебудовується
+contact_stats, тож усі ендпоінти бачать узгоджені дані.
+
+Усе визначається --seed: генератор кожного користувача засівається
+парою (seed, номер користувача), тож той самий seed дає ті самі дані
+незалежно від --batch-size. На Postgres рядки йдуть через COPY
+(asyncpg copy_records_to_table), на інших БД — багаторядковими INSERT.
+Користувачі отримують пароль SEED_PASSWORD і записуються на шард 0.
+Схема перед завантаженням доводиться до head через src.server.migrate.
+
+    python -m src.seed --users 150000 --seed 42
+    python -m src.seed --users 150000 --dry-run
+"""
+import argparse
+import asyncio
+import math
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, NamedTuple, Tuple
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection
+from src.auth import get_password_hash
+from src.birthdays import next_birthday
+from src.database import DATABASE_URL, AsyncSessionLocal, engine
+from src.models import BirthdayDigest, Contact, User, UserShard, UserSyncState
+from src.phones import normalize_phone_e164
+from src.server import migrate
+from src.stats import rebuild_stats
+
+SEED_BATCH_SIZE = 50_000
+SEED_PASSWORD = "password"
+
+# (як пишеться, латиницею для email)
+UKRAINIAN_FIRST_NAMES = (
+    ("Олександр", "oleksandr"), ("Андрій", "andrii"), ("Дмитро", "dmytro"), ("Іван", "ivan"),
+    ("Максим", "maksym"), ("Сергій", "serhii"), ("Тарас", "taras"), ("Богдан", "bohdan"),
+    ("Владислав", "vladyslav"), ("Юрій", "yurii"), ("Назар", "nazar"), ("Остап", "ostap"),
+    ("Олена", "olena"), ("Оксана", "oksana"), ("Наталія", "nataliia"), ("Ірина", "iryna"),
+    ("Марія", "mariia"), ("Анна", "anna"), ("Юлія", "yuliia"), ("Катерина", "kateryna"),
+    ("Софія", "sofiia"), ("Дарина", "daryna"), ("Соломія", "solomiia"), ("Ганна", "hanna"),
+)
+UKRAINIAN_LAST_NAMES = (
+    ("Шевченко", "shevchenko"), ("Коваленко", "kovalenko"), ("Бондаренко", "bondarenko"),
+    ("Ткаченко", "tkachenko"), ("Кравченко", "kravchenko"), ("Олійник", "oliinyk"),
+    ("Шевчук", "shevchuk"), ("Поліщук", "polishchuk"), ("Бойко", "boiko"), ("Ткачук", "tkachuk"),
+    ("Мельник", "melnyk"), ("Савченко", "savchenko"), ("Руденко", "rudenko"), ("Лисенко", "lysenko"),
+    ("Марченко", "marchenko"), ("Мороз", "moroz"), ("Павленко", "pavlenko"), ("Гончаренко", "honcharenko"),
+    ("Коваль", "koval"), ("Левченко", "levchenko"), ("Сидоренко", "sydorenko"), ("Романюк", "romaniuk"),
+)
+FOREIGN_FIRST_NAMES = (
+    ("John", "john"), ("Michael", "michael"), ("David", "david"), ("James", "james"),
+    ("Emma", "emma"), ("Olivia", "olivia"), ("Sophie", "sophie"), ("Laura", "laura"),
+    ("Piotr", "piotr"), ("Katarzyna", "katarzyna"), ("Lukas", "lukas"), ("Anna-Maria", "anna-maria"),
+)
+FOREIGN_LAST_NAMES = (
+    ("Smith", "smith"), ("Johnson", "johnson"), ("Brown", "brown"), ("Miller", "miller"),
+    ("Wilson", "wilson"), ("O'Connor", "oconnor"), ("Nowak", "nowak"), ("Kowalski", "kowalski"),
+    ("Müller", "mueller"), ("Schmidt", "schmidt"), ("García", "garcia"), ("Rossi", "rossi"),
+)
+EMAIL_DOMAINS = (
+    ("gmail.com", 40), ("ukr.net", 18), ("i.ua", 6), ("meta.ua", 3), ("outlook.com", 10),
+    ("yahoo.com", 5), ("icloud.com", 6), ("proton.me", 2), ("company.com.ua", 6), ("example.org", 4),
+)
+MOBILE_CODES = ("50", "63", "66", "67", "68", "73", "91", "93", "95", "96", "97", "98", "99")
+FOREIGN_PREFIXES = ("+48", "+49", "+1", "+44", "+420", "+39")
+NOTES = ("колега", "сусід", "з університету", "лікар", "тренер", "подруга сестри", "call after 18:00", "client")
+
+
+class ContactsPerUser(NamedTuple):
+    median: float = 40
+    sigma: float = 1.0
+    power_share: float = 0.002
+    power_min: int = 2000
+    alpha: float = 1.5
+    max_contacts: int = 100_000
+
+    def sample(self, rng: random.Random) -> int:
+        """
+
+        :param rng:
+        :return:
+        """
+        if rng.random() < self.power_share:
+            count = self.power_min * (1 - rng.random()) ** (-1 / self.alpha)
+        else:
+            count = rng.lognormvariate(math.log(self.median), self.sigma)
+        return max(0, min(self.max_contacts, int(count)))
+
+
+def weighted(choices: tuple) -> Tuple[list, list]:
+    """
+
+    :param choices: пари (значення, вага)
+    :return:
+    """
+    return [value for value, _ in choices], [weight for _, weight in choices]
+
+
+DOMAINS, DOMAIN_WEIGHTS = weighted(EMAIL_DOMAINS)
+DEFAULT_DISTRIBUTION = ContactsPerUser()
+
+
+def user_rng(seed: int, ordinal: int) -> random.Random:
+    """
+
+    :param seed:
+    :param ordinal: номер користувача в наборі, від 0
+    :return:
+    """
+    return random.Random(f"{seed}:{ordinal}")
+
+
+def fake_phone(rng: random.Random) -> str:
+    """
+    Український мобільний у кількох записах, іноді закордонний або порожній.
+
+    :param rng:
+    :return:
+    """
+    roll = rng.random()
+    if roll < 0.02:
+        return ""
+    if roll < 0.1:
+        prefix = rng.choice(FOREIGN_PREFIXES)
+        return f"{prefix} {rng.randint(100, 999)} {rng.randint(100, 999)} {rng.randint(1000, 9999)}"
+    code, number = rng.choice(MOBILE_CODES), f"{rng.randint(0, 9_999_999):07d}"
+    layout = rng.randrange(4)
+    if layout == 0:
+        return f"+380{code}{number}"
+    if layout == 1:
+        return f"+380 {code} {number[:3]} {number[3:5]} {number[5:]}"
+    if layout == 2:
+        return f"0{code}-{number[:3]}-{number[3:]}"
+    return f"(0{code}) {number[:3]} {number[3:5]} {number[5:]}"
+
+
+def fake_contact(rng: random.Random, taken_emails: set, today: date) -> dict:
+    """
+
+    :param rng:
+    :param taken_emails: email, уже видані цьому користувачу
+    :param today:
+    :return: поля Contact без id, user_id і change_seq
+    """
+    if rng.random() < 0.8:
+        first, first_latin = rng.choice(UKRAINIAN_FIRST_NAMES)
+        last, last_latin = rng.choice(UKRAINIAN_LAST_NAMES)
+        if rng.random() < 0.3:
+            first, last = first_latin.capitalize(), last_latin.capitalize()
+    else:
+        first, first_latin = rng.choice(FOREIGN_FIRST_NAMES)
+        last, last_latin = rng.choice(FOREIGN_LAST_NAMES)
+    local = rng.choice((f"{first_latin}.{last_latin}", f"{first_latin[0]}{last_latin}", f"{first_latin}_{last_latin}"))
+    email = f"{local}@{rng.choices(DOMAINS, DOMAIN_WEIGHTS)[0]}"
+    while email in taken_emails:
+        email = f"{local}{rng.randint(1, 9999)}@{rng.choices(DOMAINS, DOMAIN_WEIGHTS)[0]}"
+    taken_emails.add(email)
+    phone = fake_phone(rng)
+    birthday = None
+    if rng.random() < 0.85:
+        birthday = today - timedelta(days=rng.randint(16 * 365, 85 * 365))
+    return {
+        "first_name": first,
+        "last_name": last,
+        "email": email,
+        "phone": phone,
+        "phone_e164": normalize_phone_e164(phone),
+        "birthday": birthday,
+        "extra_info": rng.choice(NOTES) if rng.random() < 0.15 else None,
+        "updated_at": datetime(today.year, today.month, today.day) - timedelta(seconds=rng.randint(0, 3 * 365 * 86400)),
+    }
+
+
+class SeedBatch(NamedTuple):
+    users: List[dict]
+    contacts: List[dict]
+    digests: List[dict]
+    sync_states: List[dict]
+
+
+def generate(seed: int, users: int, distribution: ContactsPerUser, first_user_id: int, first_contact_id: int,
+             password_hash: str, batch_size: int = SEED_BATCH_SIZE, today: date = None) -> Iterator[SeedBatch]:
+    """
+    Пачки приблизно по batch_size контактів; користувач не ділиться між пачками.
+
+    :param seed:
+    :param users:
+    :param distribution:
+    :param first_user_id:
+    :param first_contact_id:
+    :param password_hash:
+    :param batch_size:
+    :param today:
+    :return:
+    """
+    today = today or date.today()
+    contact_id = first_contact_id
+    batch = SeedBatch([], [], [], [])
+    for ordinal in range(users):
+        rng = user_rng(seed, ordinal)
+        user_id = first_user_id + ordinal
+        count = distribution.sample(rng)
+        batch.users.append({
+            "id": user_id, "email": f"seed{seed}.user{ordinal}@example.com",
+            "hashed_password": password_hash, "is_verified": True,
+        })
+        batch.sync_states.append({"user_id": user_id, "last_seq": count, "purged_seq": 0})
+        taken_emails = set()
+        for change_seq in range(1, count + 1):
+            contact = fake_contact(rng, taken_emails, today)
+            contact.update(id=contact_id, user_id=user_id, change_seq=change_seq)
+            batch.contacts.append(contact)
+            if contact["birthday"] is not None:
+                batch.digests.append({
+                    "contact_id": contact_id, "user_id": user_id,
+                    "next_birthday": next_birthday(contact["birthday"], today),
+                })
+            contact_id += 1
+        if len(batch.contacts) >= batch_size:
+            yield batch
+            batch = SeedBatch([], [], [], [])
+    if batch.users:
+        yield batch
+
+
+async def copy_rows(conn: AsyncConnection, table, rows: List[dict]) -> None:
+    """
+    COPY на Postgres, інакше INSERT з багатьма рядками.
+
+    :param conn:
+    :param table:
+    :param rows:
+    :return:
+    """
+    if not rows:
+        return
+    columns = list(rows[0])
+    if conn.dialect.name == "postgresql":
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            table.name, records=[tuple(row[column] for column in columns) for row in rows], columns=columns
+        )
+    else:
+        await conn.execute(insert(table), rows)
+
+
+async def seed_dataset(conn: AsyncConnection, seed: int, users: int, distribution: ContactsPerUser,
+                       password_hash: str, batch_size: int = SEED_BATCH_SIZE, progress=None) -> dict:
+    """
+    Кожна пачка — окрема транзакція; id продовжують наявні в таблицях.
+
+    :param conn: з'єднання без відкритої транзакції
+    :param seed:
+    :param users:
+    :param distribution:
+    :param password_hash:
+    :param batch_size:
+    :param progress: викликається з підсумком після кожної пачки
+    :return: {"users", "contacts"}
+    """
+    async with conn.begin():
+        if await conn.scalar(select(User.id).where(User.email == f"seed{seed}.user0@example.com")) is not None:
+            raise ValueError(f"Dataset with seed {seed} is already loaded")
+        first_user_id = (await conn.scalar(select(func.max(User.id))) or 0) + 1
+        first_contact_id = (await conn.scalar(select(func.max(Contact.id))) or 0) + 1
+
+    totals = {"users": 0, "contacts": 0}
+    for batch in generate(seed, users, distribution, first_user_id, first_contact_id, password_hash, batch_size):
+        async with conn.begin():
+            await copy_rows(conn, User.__table__, batch.users)
+            await copy_rows(conn, UserShard.__table__, [
+                {"user_id": user["id"], "shard_id": 0, "moving": False} for user in batch.users
+            ])
+            await copy_rows(conn, UserSyncState.__table__, batch.sync_states)
+            await copy_rows(conn, Contact.__table__, batch.contacts)
+            await copy_rows(conn, BirthdayDigest.__table__, batch.digests)
+        totals["users"] += len(batch.users)
+        totals["contacts"] += len(batch.contacts)
+        if progress is not None:
+            progress(totals)
+
+    if conn.dialect.name == "postgresql":
+        async with conn.begin():
+            for table in ("users", "contacts"):
+                await conn.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+                ))
+    return totals
+
+
+def describe(seed: int, users: int, distribution: ContactsPerUser) -> dict:
+    """
+    Розподіл кількості контактів без генерації самих контактів.
+
+    :param seed:
+    :param users:
+    :param distribution:
+    :return:
+    """
+    counts = sorted(distribution.sample(user_rng(seed, ordinal)) for ordinal in range(users))
+    percentiles = statistics.quantiles(counts, n=100) if len(counts) > 1 else counts * 99
+    return {
+        "users": users,
+        "contacts": sum(counts),
+        "mean": round(statistics.fmean(counts), 1) if counts else 0,
+        "p50": percentiles[49],
+        "p90": percentiles[89],
+        "p99": percentiles[98],
+        "max": counts[-1] if counts else 0,
+        "power_users": sum(count >= distribution.power_min for count in counts),
+    }
+
+
+async def main(args) -> None:
+    """
+
+    :param args:
+    :return:
+    """
+    distribution = ContactsPerUser(
+        args.median_contacts, args.sigma, args.power_users, args.power_min, args.alpha, args.max_contacts
+    )
+    if args.dry_run:
+        for key, value in describe(args.seed, args.users, distribution).items():
+            print(f"{key:12s} {value}")
+        return
+
+    started = time.perf_counter()
+
+    def progress(totals):
+        elapsed = time.perf_counter() - started
+        print(f"{totals['users']} користувачів, {totals['contacts']} контактів, "
+              f"{totals['contacts'] / elapsed:,.0f} контактів/с", flush=True)
+
+    password_hash = get_password_hash(args.password)
+    # схема — через Alembic, як у src.server, інакше база без alembic_version
+    # не пройде перевірку migrate() під час запуску; env.py має власний asyncio.run
+    await asyncio.to_thread(migrate, DATABASE_URL)
+    async with engine.connect() as conn:
+        totals = await seed_dataset(
+            conn, args.seed, args.users, distribution, password_hash, args.batch_size, progress
+        )
+    async with AsyncSessionLocal() as session:
+        await rebuild_stats(session)
+    await engine.dispose()
+    print(f"Готово: {totals['users']} користувачів, {totals['contacts']} контактів "
+          f"за {time.perf_counter() - started:.0f} с")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, required=True)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--median-contacts", type=float, default=DEFAULT_DISTRIBUTION.median)
+    parser.add_argument("--sigma", type=float, default=DEFAULT_DISTRIBUTION.sigma, help="розкид логнормального тіла")
+    parser.add_argument("--power-users", type=float, default=DEFAULT_DISTRIBUTION.power_share, help="частка, 0..1")
+    parser.add_argument("--power-min", type=int, default=DEFAULT_DISTRIBUTION.power_min)
+    parser.add_argument("--alpha", type=float, default=DEFAULT_DISTRIBUTION.alpha, help="показник хвоста Парето")
+    parser.add_argument("--max-contacts", type=int, default=DEFAULT_DISTRIBUTION.max_contacts)
+    parser.add_argument("--batch-size", type=int, default=SEED_BATCH_SIZE)
+    parser.add_argument("--password", default=SEED_PASSWORD)
+    parser.add_argument("--dry-run", action="store_true", help="лише показати розподіл")
+    asyncio.run(main(parser.parse_args()))
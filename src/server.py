@@ -0,0 +1,172 @@
+"""
+Запуск у продакшені.
+
+    python -m src.server
+
+Один воркер — uvicorn напряму. Кілька (WEB_CONCURRENCY > 1) — gunicorn
+з preload_app: застосунок імпортується один раз у майстрі, воркери
+форкаються вже з ним, а впалий воркер gunicorn перезапускає. Цикл подій
+uvloop і парсер httptools, якщо вони встановлені.
+
+Перед стартом воркерів процес запуску один раз виконує alembic upgrade
+head (MIGRATE_ON_START=0 вимикає, якщо міграції — окремий крок релізу).
+Воркери схему не створюють: паралельні CREATE TABLE з кількох процесів
+конфліктують, а пропущена міграція має бути помилкою запуску. База,
+створена колись через create_all без Alembic, потребує разового
+alembic stamp <ревізія, що відповідає схемі>.
+
+SIGTERM: сервер перестає приймати з'єднання, до GRACEFUL_TIMEOUT секунд
+дочікується запитів у роботі, після чого lifespan зупиняє фонові задачі
+і закриває пули з'єднань.
+"""
+import argparse
+import importlib.util
+import os
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.engine import make_url
+
+APP = "src.main:app"
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+GRACEFUL_TIMEOUT = int(os.getenv("GRACEFUL_TIMEOUT", "30"))
+KEEPALIVE_TIMEOUT = int(os.getenv("KEEPALIVE_TIMEOUT", "5"))
+BACKLOG = int(os.getenv("BACKLOG", "2048"))
+MAX_REQUESTS = int(os.getenv("MAX_REQUESTS", "0"))
+FORWARDED_ALLOW_IPS = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "info")
+MIGRATE_ON_START = os.getenv("MIGRATE_ON_START", "1") == "1"
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+LOOP = "uvloop" if _installed("uvloop") else "asyncio"
+HTTP = "httptools" if _installed("httptools") else "h11"
+
+UVICORN_CONFIG = {
+    "loop": LOOP,
+    "http": HTTP,
+    "lifespan": "on",
+    "proxy_headers": True,
+    "forwarded_allow_ips": FORWARDED_ALLOW_IPS,
+    "timeout_keep_alive": KEEPALIVE_TIMEOUT,
+    "timeout_graceful_shutdown": GRACEFUL_TIMEOUT,
+    "backlog": BACKLOG,
+    "server_header": False,
+    # access-записи пише src.logs.RequestContextMiddleware через чергу журналу
+    "access_log": False,
+}
+
+
+def gunicorn_options(workers: int, host: str = HOST, port: int = PORT) -> dict:
+    """
+
+    :param workers:
+    :param host:
+    :param port:
+    :return:
+    """
+    return {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "worker_class": "src.server.ContactsWorker",
+        "preload_app": True,
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "timeout": GRACEFUL_TIMEOUT + 30,
+        "keepalive": KEEPALIVE_TIMEOUT,
+        "backlog": BACKLOG,
+        "max_requests": MAX_REQUESTS,
+        "max_requests_jitter": MAX_REQUESTS // 10,
+        "forwarded_allow_ips": FORWARDED_ALLOW_IPS,
+        "loglevel": LOG_LEVEL,
+    }
+
+
+if _installed("gunicorn"):
+    from gunicorn.app.base import BaseApplication
+    from uvicorn.workers import UvicornWorker
+
+    class ContactsWorker(UvicornWorker):
+        """
+        Воркер gunicorn з тими самими налаштуваннями uvicorn, що й одиночний режим.
+        """
+
+        CONFIG_KWARGS = UVICORN_CONFIG
+
+    class ContactsApplication(BaseApplication):
+        """
+        gunicorn без конфігураційного файлу: параметри з gunicorn_options.
+        """
+
+        def __init__(self, options: dict):
+            self.options = options
+            super().__init__()
+
+        def load_config(self):
+            for key, value in self.options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from src.main import app
+            return app
+
+
+def migrate(url: str = None) -> None:
+    """
+    alembic upgrade head у процесі запуску, до форку воркерів.
+
+    :param url: за замовчуванням DATABASE_URL
+    :return:
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    url = url or os.environ["DATABASE_URL"]
+    sync_url = make_url(url).set(drivername=make_url(url).get_backend_name())
+    engine = create_engine(sync_url)
+    try:
+        tables = set(inspect(engine).get_table_names())
+    finally:
+        engine.dispose()
+    if "users" in tables and "alembic_version" not in tables:
+        raise RuntimeError(
+            "Схему створено без Alembic: позначте поточну ревізію (alembic stamp) і запустіть знову"
+        )
+
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, "head")
+
+
+def run(workers: int = WEB_CONCURRENCY, host: str = HOST, port: int = PORT) -> None:
+    """
+
+    :param workers:
+    :param host:
+    :param port:
+    :return:
+    """
+    if MIGRATE_ON_START:
+        migrate()
+    if workers > 1:
+        if not _installed("gunicorn"):
+            raise RuntimeError("WEB_CONCURRENCY > 1 потребує пакет gunicorn")
+        ContactsApplication(gunicorn_options(workers, host, port)).run()
+        return
+
+    import uvicorn
+    uvicorn.run(APP, host=host, port=port, log_level=LOG_LEVEL, **UVICORN_CONFIG)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=WEB_CONCURRENCY)
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    run(args.workers, args.host, args.port)
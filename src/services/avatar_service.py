@@ -0,0 +1,151 @@
+"""
+Обробка аватарів.
+
+Завантажений файл ідентифікується sha256 вмісту: якщо варіанти з таким
+хешем уже є в таблиці avatar_blobs (спільній для всіх воркерів) або в
+сховищі, повторне завантаження нічого не обробляє і не відправляє. Інакше
+Pillow у пулі процесів робить квадратні WebP-варіанти AVATAR_VARIANTS,
+які зберігаються через src.services.avatar_storage, а їхні URL
+записуються в avatar_blobs у транзакції сесії виклику.
+"""
+import asyncio
+import hashlib
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Optional
+from fastapi.concurrency import run_in_threadpool
+from PIL import Image, ImageOps, UnidentifiedImageError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.models import AvatarBlob
+from src.services.avatar_storage import get_avatar_storage
+
+AVATAR_VARIANTS = {"small": 40, "medium": 128, "large": 512}
+AVATAR_MAX_BYTES = int(os.getenv("AVATAR_MAX_BYTES", str(5 * 1024 * 1024)))
+AVATAR_MAX_PIXELS = 40_000_000
+AVATAR_WEBP_QUALITY = 80
+AVATAR_WORKERS = int(os.getenv("AVATAR_WORKERS", "2"))
+AVATAR_READ_CHUNK = 64 * 1024
+
+INSERT_DIALECTS = {"postgresql": postgresql, "sqlite": sqlite}
+
+
+class InvalidAvatar(ValueError):
+    pass
+
+
+async def read_upload(file, limit: int = None) -> bytes:
+    """
+    Читає завантаження частинами й зупиняється, щойно перевищено ліміт,
+    не тримаючи в пам'яті більше за limit + одну частину.
+
+    :param file: UploadFile
+    :param limit: за замовчуванням AVATAR_MAX_BYTES
+    :return:
+    """
+    limit = AVATAR_MAX_BYTES if limit is None else limit
+    chunks, size = [], 0
+    while chunk := await file.read(AVATAR_READ_CHUNK):
+        size += len(chunk)
+        if size > limit:
+            raise InvalidAvatar("Avatar is too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def render_variants(data: bytes, variants: Dict[str, int] = AVATAR_VARIANTS) -> Dict[str, bytes]:
+    """
+    Виконується в окремому процесі: декодування і ресайз тримають CPU.
+
+    :param data:
+    :param variants: назва -> розмір сторони в пікселях
+    :return: назва -> WebP
+    """
+    Image.MAX_IMAGE_PIXELS = AVATAR_MAX_PIXELS
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            image = ImageOps.exif_transpose(image)
+            image = image.convert("RGBA" if image.mode in ("RGBA", "LA", "P") else "RGB")
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError) as exc:
+        raise InvalidAvatar(str(exc)) from exc
+
+    rendered = {}
+    for name, size in sorted(variants.items(), key=lambda item: -item[1]):
+        variant = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        variant.save(buffer, "WEBP", quality=AVATAR_WEBP_QUALITY, method=4)
+        rendered[name] = buffer.getvalue()
+    return rendered
+
+
+class AvatarProcessor:
+    """
+    Хеш, пул процесів для ресайзу і сховище варіантів.
+    """
+
+    def __init__(self, storage=None, workers: int = AVATAR_WORKERS, variants: Dict[str, int] = AVATAR_VARIANTS):
+        self.storage = storage or get_avatar_storage()
+        self.workers = workers
+        self.variants = variants
+        self._pool = None
+
+    def _keys(self, digest: str) -> Dict[str, str]:
+        return {name: f"avatars/{digest}/{name}.webp" for name in self.variants}
+
+    def _executor(self):
+        if self._pool is None and self.workers:
+            self._pool = ProcessPoolExecutor(self.workers)
+        return self._pool
+
+    async def save(self, data: bytes, db: Optional[AsyncSession] = None) -> Dict[str, str]:
+        """
+
+        :param data: вміст завантаженого файлу
+        :param db: сесія основної БД; без неї дедуплікація лише через сховище
+        :return: назва варіанту -> URL
+        """
+        if len(data) > AVATAR_MAX_BYTES:
+            raise InvalidAvatar("Avatar is too large")
+        digest = hashlib.sha256(data).hexdigest()
+        if db is not None:
+            known = await db.get(AvatarBlob, digest)
+            if known is not None:
+                return dict(known.variants)
+        keys = self._keys(digest)
+        storage = self.storage
+
+        def stored() -> bool:
+            return all(storage.exists(key) for key in keys.values())
+
+        if not await run_in_threadpool(stored):
+            loop = asyncio.get_running_loop()
+            executor = self._executor()
+            if executor is None:
+                rendered = await run_in_threadpool(render_variants, data, self.variants)
+            else:
+                rendered = await loop.run_in_executor(executor, render_variants, data, self.variants)
+            for name, key in keys.items():
+                await run_in_threadpool(storage.save, key, rendered[name], "image/webp")
+        urls = {name: storage.url(key) for name, key in keys.items()}
+        if db is not None:
+            # той самий вміст паралельно з іншого воркера — рядок уже є
+            await db.execute(
+                INSERT_DIALECTS[db.get_bind().dialect.name].insert(AvatarBlob)
+                .values(digest=digest, variants=urls, created_at=datetime.utcnow())
+                .on_conflict_do_nothing(index_elements=[AvatarBlob.digest])
+            )
+        return urls
+
+    def shutdown(self) -> None:
+        """
+
+        :return:
+        """
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+avatar_processor = AvatarProcessor()
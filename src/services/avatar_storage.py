@@ -0,0 +1,131 @@
+"""
+Сховища варіантів аватарів. Ключ — шлях виду avatars/<sha256>/<variant>.webp,
+тож однаковий вміст завжди потрапляє в той самий ключ.
+
+За замовчуванням — Cloudinary, якщо він налаштований (CLOUDINARY_CLOUD_NAME
+або CLOUDINARY_URL), як і до появи варіантів; інакше локальний диск.
+"""
+import io
+import os
+from collections import OrderedDict
+import cloudinary.uploader
+import cloudinary.utils
+
+AVATAR_STORAGE = os.getenv("AVATAR_STORAGE") or (
+    "cloudinary" if os.getenv("CLOUDINARY_CLOUD_NAME") or os.getenv("CLOUDINARY_URL") else "local"
+)
+AVATAR_MEDIA_ROOT = os.getenv("AVATAR_MEDIA_ROOT", "media")
+AVATAR_MEDIA_URL = os.getenv("AVATAR_MEDIA_URL", "/media")
+AVATAR_URL_CACHE_SIZE = int(os.getenv("AVATAR_URL_CACHE_SIZE", "10000"))
+
+
+class LocalAvatarStorage:
+    """
+    Файли на диску, які застосунок роздає за AVATAR_MEDIA_URL.
+    """
+
+    def __init__(self, root: str = AVATAR_MEDIA_ROOT, base_url: str = AVATAR_MEDIA_URL):
+        self.root = root
+        self.base_url = base_url.rstrip("/")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str) -> bool:
+        """
+
+        :param key:
+        :return:
+        """
+        return os.path.exists(self._path(key))
+
+    def save(self, key: str, data: bytes, content_type: str) -> None:
+        """
+        Запис через тимчасовий файл, щоб паралельне читання не бачило половину.
+
+        :param key:
+        :param data:
+        :param content_type:
+        :return:
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def url(self, key: str) -> str:
+        """
+
+        :param key:
+        :return:
+        """
+        return f"{self.base_url}/{key}"
+
+
+class CloudinaryAvatarStorage:
+    """
+    Cloudinary з public_id, що дорівнює ключу без розширення. Admin API
+    (ліміт запитів) не використовується: public_id детермінований, тож
+    повторне завантаження з overwrite=False нічого не перезаписує, а URL
+    будується локально. Між воркерами вміст дедуплікує таблиця avatar_blobs
+    (src.services.avatar_service); exists() — лише кеш цього процесу з
+    останніх cache_size ключів.
+    """
+
+    def __init__(self, cache_size: int = AVATAR_URL_CACHE_SIZE):
+        self.urls = OrderedDict()
+        self.cache_size = cache_size
+
+    def _remember(self, key: str, url: str) -> str:
+        self.urls[key] = url
+        self.urls.move_to_end(key)
+        while len(self.urls) > self.cache_size:
+            self.urls.popitem(last=False)
+        return url
+
+    @staticmethod
+    def _public_id(key: str) -> str:
+        return key.rsplit(".", 1)[0]
+
+    def exists(self, key: str) -> bool:
+        """
+
+        :param key:
+        :return:
+        """
+        return key in self.urls
+
+    def save(self, key: str, data: bytes, content_type: str) -> None:
+        """
+
+        :param key:
+        :param data:
+        :param content_type:
+        :return:
+        """
+        # з overwrite=False вже наявний public_id повертається з existing=True
+        result = cloudinary.uploader.upload(io.BytesIO(data), public_id=self._public_id(key), overwrite=False)
+        self._remember(key, result["secure_url"])
+
+    def url(self, key: str) -> str:
+        """
+
+        :param key:
+        :return:
+        """
+        if key in self.urls:
+            return self._remember(key, self.urls[key])
+        return self._remember(key, cloudinary.utils.cloudinary_url(self._public_id(key), format="webp", secure=True)[0])
+
+
+def get_avatar_storage(name: str = AVATAR_STORAGE):
+    """
+
+    :param name: local | cloudinary
+    :return:
+    """
+    if name == "cloudinary":
+        return CloudinaryAvatarStorage()
+    return LocalAvatarStorage()
@@ -0,0 +1,295 @@
+"""
+Горизонтальне шардування контактів за user_id.
+
+Каталог user_shards в основній БД (шард 0) зберігає шард кожного
+користувача. З одним шардом рядок (шард 0) пишеться разом зі створенням
+користувача. Користувач без рядка отримує шард user_id % N під час першого
+звернення, а ті, що були до міграції або вже мають дані на шарді 0,
+лишаються на ньому. Воркери кешують каталог на SHARD_MAP_TTL_SECONDS.
+
+На шардах 1..N, крім таблиць контактів, є users лише з тіньовими рядками
+(id, email) для зовнішніх ключів. Id контактів і груп кожного шарду на Postgres
+починаються з shard_id * SHARD_ID_BLOCK, тож при перенесенні не збігаються.
+
+    python -m src.sharding init
+    python -m src.sharding move USER_ID SHARD_ID
+    python -m src.sharding status
+
+Під час перенесення користувач позначений moving і отримує 503; після
+копіювання каталог перемикається, а рядки на старому шарді видаляються.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Tuple
+from fastapi import Depends, HTTPException
+from sqlalchemy import delete, exists, func, insert, select, text, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import Base, ShardSessions, get_db, pool_admissions, shard_engines
+from src.models import BirthdayDigest, Contact, ContactGroup, ContactGroupMember, ContactStats, ContactTombstone
+from src.models import DuplicateScan
+from src.models import User, UserShard, UserSyncState
+from src.auth import get_current_user
+
+logger = logging.getLogger(__name__)
+
+SHARD_MAP_TTL_SECONDS = float(os.getenv("SHARD_MAP_TTL_SECONDS", "5"))
+SHARD_ID_BLOCK = 100_000_000
+
+# Порядок вставки з урахуванням зовнішніх ключів; видалення йде у зворотному.
+SHARDED_MODELS = (
+    UserSyncState, ContactStats, Contact, ContactGroup, ContactGroupMember, BirthdayDigest, ContactTombstone,
+    DuplicateScan,
+)
+# послідовності id, які копіюються при перенесенні як є
+SHARDED_SEQUENCES = (("contacts_id_seq", "contacts"), ("contact_groups_id_seq", "contact_groups"))
+
+
+async def ensure_shadow_user(session: AsyncSession, user_id: int, email: str) -> None:
+    """
+
+    :param session: сесія шарду
+    :param user_id:
+    :param email:
+    :return:
+    """
+    if await session.get(User, user_id) is not None:
+        return
+    session.add(User(id=user_id, email=email, hashed_password="!"))
+    try:
+        await session.commit()
+    except IntegrityError:
+        await session.rollback()
+
+
+class ShardMap:
+    """
+    Кеш каталогу user_shards і перенесення користувачів між шардами.
+    """
+
+    def __init__(self, sessions=ShardSessions, ttl: float = SHARD_MAP_TTL_SECONDS):
+        self.sessions = sessions
+        self.ttl = ttl
+        self.cache = {}
+
+    def clear(self) -> None:
+        """
+
+        :return:
+        """
+        self.cache.clear()
+
+    async def lookup(self, user_id: int) -> Tuple[int, bool]:
+        """
+        З одним шардом БД не читається.
+
+        :param user_id:
+        :return: (shard_id, moving)
+        """
+        if len(self.sessions) == 1:
+            return 0, False
+        now = time.monotonic()
+        cached = self.cache.get(user_id)
+        if cached and cached[2] > now:
+            return cached[0], cached[1]
+        async with self.sessions[0]() as primary:
+            entry = (await primary.execute(
+                select(UserShard.shard_id, UserShard.moving).where(UserShard.user_id == user_id)
+            )).first()
+            shard_id, moving = entry if entry else (await self.assign(primary, user_id), False)
+        self.cache[user_id] = (shard_id, moving, now + self.ttl)
+        return shard_id, moving
+
+    @staticmethod
+    async def has_primary_rows(primary: AsyncSession, user_id: int) -> bool:
+        """
+
+        :param primary: сесія основної БД
+        :param user_id:
+        :return:
+        """
+        for model in SHARDED_MODELS:
+            if await primary.scalar(select(exists().where(model.user_id == user_id))):
+                return True
+        return False
+
+    async def assign(self, primary: AsyncSession, user_id: int) -> int:
+        """
+
+        :param primary: сесія основної БД
+        :param user_id:
+        :return:
+        """
+        shard_id = user_id % len(self.sessions)
+        if shard_id and await self.has_primary_rows(primary, user_id):
+            # створений, поки шард був один: дані вже на шарді 0
+            shard_id = 0
+        if shard_id:
+            email = await primary.scalar(select(User.email).where(User.id == user_id))
+            async with self.sessions[shard_id]() as session:
+                await ensure_shadow_user(session, user_id, email)
+        primary.add(UserShard(user_id=user_id, shard_id=shard_id, moving=False))
+        try:
+            await primary.commit()
+        except IntegrityError:
+            await primary.rollback()
+            shard_id = await primary.scalar(select(UserShard.shard_id).where(UserShard.user_id == user_id))
+        return shard_id
+
+    @asynccontextmanager
+    async def user_session(self, user_id: int):
+        """
+        Сесія шарду користувача для фонових задач.
+
+        :param user_id:
+        :return:
+        """
+        shard_id, _ = await self.lookup(user_id)
+        async with self.sessions[shard_id]() as session:
+            yield session
+
+    async def _set_entry(self, user_id: int, **values) -> None:
+        async with self.sessions[0]() as primary:
+            await primary.execute(update(UserShard).where(UserShard.user_id == user_id).values(**values))
+            await primary.commit()
+        self.cache.pop(user_id, None)
+
+    async def move_user(self, user_id: int, target: int, settle_seconds: float = None) -> int:
+        """
+        Переносить контакти користувача на інший шард.
+
+        :param user_id:
+        :param target:
+        :param settle_seconds: скільки чекати, поки всі воркери побачать moving
+        :return: кількість перенесених контактів
+        """
+        if not 0 <= target < len(self.sessions):
+            raise ValueError(f"Unknown shard {target}")
+        source, _ = await self.lookup(user_id)
+        if source == target:
+            return 0
+
+        await self._set_entry(user_id, moving=True)
+        await asyncio.sleep(self.ttl if settle_seconds is None else settle_seconds)
+
+        moved = 0
+        try:
+            async with self.sessions[0]() as primary:
+                email = await primary.scalar(select(User.email).where(User.id == user_id))
+            async with self.sessions[source]() as src, self.sessions[target]() as dst:
+                if target:
+                    await ensure_shadow_user(dst, user_id, email)
+                for model in SHARDED_MODELS:
+                    columns = [
+                        column for column in model.__table__.columns
+                        if not (model is ContactTombstone and column.key == "id")
+                    ]
+                    rows = (await src.execute(select(*columns).where(model.user_id == user_id))).mappings().all()
+                    if rows:
+                        await dst.execute(insert(model.__table__), [dict(row) for row in rows])
+                    if model is Contact:
+                        moved = len(rows)
+                await dst.commit()
+        except Exception:
+            await self._set_entry(user_id, moving=False)
+            raise
+
+        await self._set_entry(user_id, shard_id=target, moving=False)
+        async with self.sessions[source]() as src:
+            for model in reversed(SHARDED_MODELS):
+                await src.execute(delete(model).where(model.user_id == user_id))
+            if source:
+                await src.execute(delete(User).where(User.id == user_id))
+            await src.commit()
+        logger.info("moved user %s from shard %s to shard %s, %s contacts", user_id, source, target, moved)
+        return moved
+
+
+shard_map = ShardMap()
+
+
+async def get_shard_db(
+    user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db),
+):
+    """
+    Сесія шарду поточного користувача; для шарду 0 це звичайна get_db.
+
+    :param user:
+    :param db:
+    :return:
+    """
+    shard_id, moving = await shard_map.lookup(user.id)
+    if moving:
+        raise HTTPException(
+            status_code=503,
+            detail="Contacts are being moved, retry later",
+            headers={"Retry-After": str(max(1, round(SHARD_MAP_TTL_SECONDS)))},
+        )
+    if shard_id == 0:
+        yield db
+        return
+    async with pool_admissions[shard_id].session(shard_map.sessions[shard_id]) as session:
+        yield session
+
+
+async def init_shards() -> None:
+    """
+    Створює таблиці на шардах 1..N і зсуває послідовності id контактів і груп.
+
+    :return:
+    """
+    tables = [User.__table__] + [model.__table__ for model in SHARDED_MODELS]
+    for shard_id, shard_engine in enumerate(shard_engines[1:], start=1):
+        async with shard_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all, tables=tables)
+            if conn.dialect.name == "postgresql":
+                for sequence, table in SHARDED_SEQUENCES:
+                    await conn.execute(
+                        text(f"SELECT setval('{sequence}', GREATEST(:start, (SELECT COALESCE(MAX(id), 0) FROM {table})))"),
+                        {"start": shard_id * SHARD_ID_BLOCK},
+                    )
+
+
+async def shard_status() -> dict:
+    """
+
+    :return: кількість користувачів у каталозі по шардах
+    """
+    async with shard_map.sessions[0]() as primary:
+        rows = (await primary.execute(
+            select(UserShard.shard_id, func.count()).group_by(UserShard.shard_id).order_by(UserShard.shard_id)
+        )).all()
+    return dict(rows)
+
+
+async def main(args) -> None:
+    """
+
+    :param args:
+    :return:
+    """
+    if args.command == "init":
+        await init_shards()
+        print(f"Шарди ініціалізовано: {len(shard_engines) - 1}")
+    elif args.command == "move":
+        moved = await shard_map.move_user(args.user_id, args.shard_id)
+        print(f"Перенесено контактів: {moved}")
+    else:
+        for shard_id, users in (await shard_status()).items():
+            print(f"shard {shard_id}: {users} users")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("init")
+    move = subparsers.add_parser("move")
+    move.add_argument("user_id", type=int)
+    move.add_argument("shard_id", type=int)
+    subparsers.add_parser("status")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,111 @@
+"""
+Злиття однакових одночасних читань (single-flight).
+
+Коли кілька пристроїв користувача чи ретраї клієнта одночасно просять той
+самий список, запит до БД виконує лише перший ("лідер"), а решта чекає на
+його результат. Ключ містить user_id і всі параметри читання, тож
+результати різних користувачів чи сторінок не змішуються.
+
+Запис контактів викликає forget(user_id): читання, що почалися до commit,
+довиконуються для своїх учасників, але нові запити вже стартують окремо і
+бачать зміни. Якщо лідер не вклався в таймаут ключа або його запит було
+скасовано, очікувачі виконують читання самі.
+"""
+import asyncio
+import os
+from collections import Counter
+
+SINGLEFLIGHT_TIMEOUT_SECONDS = float(os.getenv("SINGLEFLIGHT_TIMEOUT_SECONDS", "5"))
+
+
+class _Abandoned(Exception):
+    """
+    Лідера скасовано до отримання результату.
+    """
+
+
+class SingleFlight:
+    """
+    Читання, що виконуються зараз, за ключем (назва, user_id, параметри...).
+    """
+
+    def __init__(self, timeout: float = SINGLEFLIGHT_TIMEOUT_SECONDS):
+        self.timeout = timeout
+        self.inflight = {}
+        self.leaders = Counter()
+        self.coalesced = Counter()
+        self.timeouts = Counter()
+
+    async def do(self, key: tuple, call, timeout: float = None):
+        """
+
+        :param key: (назва, user_id, ...); назва йде в лічильники
+        :param call: функція без аргументів, що повертає корутину читання
+        :param timeout: скільки очікувач чекає на лідера; за замовчуванням self.timeout
+        :return:
+        """
+        name = key[0]
+        future = self.inflight.get(key)
+        if future is not None:
+            self.coalesced[name] += 1
+            try:
+                return await asyncio.wait_for(asyncio.shield(future), self.timeout if timeout is None else timeout)
+            except asyncio.TimeoutError:
+                self.timeouts[name] += 1
+            except _Abandoned:
+                pass
+            return await call()
+
+        future = asyncio.get_running_loop().create_future()
+        self.inflight[key] = future
+        self.leaders[name] += 1
+        try:
+            result = await call()
+        except BaseException as exc:
+            future.set_exception(exc if isinstance(exc, Exception) else _Abandoned())
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            if self.inflight.get(key) is future:
+                del self.inflight[key]
+
+    def forget(self, user_id: int) -> None:
+        """
+        Наступні читання користувача не приєднуються до вже запущених.
+
+        :param user_id:
+        :return:
+        """
+        for key in [key for key in self.inflight if key[1] == user_id]:
+            del self.inflight[key]
+
+    def stats(self) -> dict:
+        """
+
+        :return:
+        """
+        return {
+            name: {
+                "leaders": self.leaders[name],
+                "coalesced": self.coalesced[name],
+                "timeouts": self.timeouts[name],
+                "inflight": sum(1 for key in self.inflight if key[0] == name),
+            }
+            for name in sorted(set(self.leaders) | set(self.coalesced))
+        }
+
+    def clear(self) -> None:
+        """
+
+        :return:
+        """
+        self.inflight.clear()
+        self.leaders.clear()
+        self.coalesced.clear()
+        self.timeouts.clear()
+
+
+contact_reads = SingleFlight()
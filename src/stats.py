@@ -0,0 +1,180 @@
+"""
+Лічильники контактів користувача для дашборду.
+
+Рядок contact_stats кожного користувача змінюється в тій самій транзакції,
+що й контакт: crud рахує внесок контакту до й після запису і додає різницю
+одним UPDATE col = col + delta. Тож GET /contacts/stats — це читання рядка за
+первинним ключем. Якщо рядка ще немає, перший запис будує його агрегатом
+за контактами користувача. Повна перебудова:
+
+    python -m src.stats [--user-id USER_ID]
+"""
+import argparse
+import asyncio
+from collections import Counter
+from typing import Optional
+from sqlalchemy import bindparam, case, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import ShardSessions
+from src.models import Contact, ContactStats
+
+MONTHS = range(1, 13)
+MONTH_COLUMNS = tuple(f"birth_month_{month}" for month in MONTHS)
+COUNTERS = ("total", "missing_email", "missing_phone", "missing_birthday") + MONTH_COLUMNS
+
+STATS_BY_USER = select(*(getattr(ContactStats, column) for column in COUNTERS)).where(
+    ContactStats.user_id == bindparam("user_id")
+)
+
+
+def _blank(value: Optional[str]) -> bool:
+    return not (value or "").strip()
+
+
+def contact_counters(contact: Optional[Contact]) -> Counter:
+    """
+    Внесок одного контакту в лічильники.
+
+    :param contact: None для відсутнього (ще не створеного чи вже видаленого) контакту
+    :return:
+    """
+    counters = Counter()
+    if contact is None:
+        return counters
+    counters["total"] = 1
+    counters["missing_email"] = int(_blank(contact.email))
+    counters["missing_phone"] = int(_blank(contact.phone))
+    if contact.birthday is None:
+        counters["missing_birthday"] = 1
+    else:
+        counters[f"birth_month_{contact.birthday.month}"] = 1
+    return counters
+
+
+def stats_delta(before: Counter, after: Counter) -> dict:
+    """
+
+    :param before:
+    :param after:
+    :return: лише ненульові зміни
+    """
+    delta = {column: after[column] - before[column] for column in set(before) | set(after)}
+    return {column: value for column, value in delta.items() if value}
+
+
+def aggregate_stats():
+    """
+    Ті самі лічильники агрегатом за таблицею contacts, по користувачах.
+
+    :return:
+    """
+    def blank(column):
+        return func.sum(case((func.coalesce(func.trim(column), "") == "", 1), else_=0))
+
+    birth_month = func.extract("month", Contact.birthday)
+    return select(
+        Contact.user_id,
+        func.count().label("total"),
+        blank(Contact.email).label("missing_email"),
+        blank(Contact.phone).label("missing_phone"),
+        func.sum(case((Contact.birthday.is_(None), 1), else_=0)).label("missing_birthday"),
+        *(func.sum(case((birth_month == month, 1), else_=0)).label(column)
+          for month, column in zip(MONTHS, MONTH_COLUMNS)),
+    ).group_by(Contact.user_id)
+
+
+async def rebuild_user_stats(db: AsyncSession, user_id: int) -> None:
+    """
+    Перераховує рядок користувача в поточній транзакції.
+
+    :param db:
+    :param user_id:
+    :return:
+    """
+    row = (await db.execute(aggregate_stats().where(Contact.user_id == user_id))).mappings().first()
+    values = dict(row) if row else {"user_id": user_id}
+    await db.execute(delete(ContactStats).where(ContactStats.user_id == user_id))
+    await db.execute(insert(ContactStats).values(**values))
+
+
+async def apply_stats_delta(db: AsyncSession, user_id: int, delta: dict) -> None:
+    """
+    Викликається з crud після flush зміненого контакту, до commit.
+
+    :param db:
+    :param user_id:
+    :param delta: результат stats_delta
+    :return:
+    """
+    if not delta:
+        return
+    bump = (
+        update(ContactStats)
+        .where(ContactStats.user_id == user_id)
+        .values({column: getattr(ContactStats, column) + value for column, value in delta.items()})
+    )
+    if (await db.execute(bump)).rowcount:
+        return
+    try:
+        async with db.begin_nested():
+            await rebuild_user_stats(db, user_id)
+    except IntegrityError:
+        await db.execute(bump)
+
+
+async def get_contact_stats(db: AsyncSession, user_id: int) -> dict:
+    """
+
+    :param db:
+    :param user_id:
+    :return:
+    """
+    row = (await db.execute(STATS_BY_USER, {"user_id": user_id})).mappings().first() or dict.fromkeys(COUNTERS, 0)
+    return {
+        "total": row["total"],
+        "missing_email": row["missing_email"],
+        "missing_phone": row["missing_phone"],
+        "missing_birthday": row["missing_birthday"],
+        "by_birth_month": [row[column] for column in MONTH_COLUMNS],
+    }
+
+
+async def rebuild_stats(db: AsyncSession, user_id: Optional[int] = None) -> int:
+    """
+    Перебудова з нуля одним INSERT ... SELECT.
+
+    :param db:
+    :param user_id: None — усі користувачі шарду
+    :return: кількість записаних рядків
+    """
+    query = aggregate_stats()
+    purge = delete(ContactStats)
+    if user_id is not None:
+        query = query.where(Contact.user_id == user_id)
+        purge = purge.where(ContactStats.user_id == user_id)
+    await db.execute(purge)
+    result = await db.execute(
+        insert(ContactStats).from_select([column.name for column in query.selected_columns], query)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def main(user_id: Optional[int]) -> None:
+    """
+
+    :param user_id:
+    :return:
+    """
+    written = 0
+    for shard_session in ShardSessions:
+        async with shard_session() as session:
+            written += await rebuild_stats(session, user_id)
+    print(f"Статистику контактів перебудовано: {written}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--user-id", type=int, help="лише один користувач")
+    asyncio.run(main(parser.parse_args().user_id))
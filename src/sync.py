@@ -0,0 +1,175 @@
+"""
+Інкрементна синхронізація контактів.
+
+Кожен запис контактів користувача отримує наступне значення його лічильника
+user_sync_state.last_seq. UPDATE ... RETURNING блокує рядок лічильника до
+commit, тому номери зростають у порядку комітів. Видалення лишають tombstone
+з тим самим номером. Tombstone-и старші за TOMBSTONE_RETENTION_DAYS
+видаляються, а purged_seq запам'ятовує, з якого курсора клієнту потрібна
+повна пересинхронізація.
+
+    python -m src.sync purge
+"""
+import argparse
+import asyncio
+import logging
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import ShardSessions
+from src.models import Contact, ContactTombstone, UserSyncState
+
+logger = logging.getLogger(__name__)
+
+TOMBSTONE_RETENTION_DAYS = int(os.getenv("TOMBSTONE_RETENTION_DAYS", "30"))
+TOMBSTONE_PURGE_SECONDS = 24 * 60 * 60
+
+
+async def next_change_seq(db: AsyncSession, user_id: int) -> int:
+    """
+    Видає наступний номер зміни в поточній транзакції.
+
+    :param db:
+    :param user_id:
+    :return:
+    """
+    bump = (
+        update(UserSyncState)
+        .where(UserSyncState.user_id == user_id)
+        .values(last_seq=UserSyncState.last_seq + 1)
+        .returning(UserSyncState.last_seq)
+    )
+    seq = (await db.execute(bump)).scalar_one_or_none()
+    if seq is not None:
+        return seq
+    try:
+        async with db.begin_nested():
+            db.add(UserSyncState(user_id=user_id, last_seq=1, purged_seq=0))
+        return 1
+    except IntegrityError:
+        return (await db.execute(bump)).scalar_one()
+
+
+async def add_tombstone(db: AsyncSession, user_id: int, contact_id: int) -> int:
+    """
+
+    :param db:
+    :param user_id:
+    :param contact_id:
+    :return: номер зміни видалення
+    """
+    seq = await next_change_seq(db, user_id)
+    db.add(ContactTombstone(user_id=user_id, contact_id=contact_id, change_seq=seq))
+    return seq
+
+
+async def get_changes(db: AsyncSession, user_id: int, since: int, limit: int) -> dict:
+    """
+    Зміни після курсора since. Без змін це одне читання рядка лічильника
+    за первинним ключем.
+
+    :param db:
+    :param user_id:
+    :param since:
+    :param limit:
+    :return:
+    """
+    state = await db.get(UserSyncState, user_id)
+    last_seq = state.last_seq if state else 0
+    if since >= last_seq:
+        return {"cursor": last_seq, "has_more": False, "reset": since > last_seq, "changed": [], "deleted": []}
+    if since < state.purged_seq:
+        return {"cursor": last_seq, "has_more": False, "reset": True, "changed": [], "deleted": []}
+
+    changed = (await db.execute(
+        select(Contact)
+        .where(Contact.user_id == user_id, Contact.change_seq > since)
+        .order_by(Contact.change_seq)
+        .limit(limit)
+    )).scalars().all()
+    deleted = (await db.execute(
+        select(ContactTombstone.contact_id, ContactTombstone.change_seq)
+        .where(ContactTombstone.user_id == user_id, ContactTombstone.change_seq > since)
+        .order_by(ContactTombstone.change_seq)
+        .limit(limit)
+    )).all()
+
+    page = sorted(
+        [(contact.change_seq, contact, None) for contact in changed]
+        + [(seq, None, contact_id) for contact_id, seq in deleted],
+        key=lambda item: item[0],
+    )[:limit]
+    cursor = page[-1][0] if page else last_seq
+    return {
+        "cursor": cursor,
+        "has_more": cursor < last_seq,
+        "reset": False,
+        "changed": [contact for _, contact, _ in page if contact is not None],
+        "deleted": [contact_id for _, contact, contact_id in page if contact is None],
+    }
+
+
+async def purge_tombstones(db: AsyncSession, retention_days: int = TOMBSTONE_RETENTION_DAYS) -> int:
+    """
+
+    :param db:
+    :param retention_days:
+    :return: кількість видалених tombstone-ів
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    purged = (await db.execute(
+        select(ContactTombstone.user_id, func.max(ContactTombstone.change_seq), func.count())
+        .where(ContactTombstone.deleted_at < cutoff)
+        .group_by(ContactTombstone.user_id)
+    )).all()
+    for user_id, max_seq, _ in purged:
+        await db.execute(
+            update(UserSyncState)
+            .where(UserSyncState.user_id == user_id, UserSyncState.purged_seq < max_seq)
+            .values(purged_seq=max_seq)
+        )
+    await db.execute(delete(ContactTombstone).where(ContactTombstone.deleted_at < cutoff))
+    await db.commit()
+    return sum(count for _, _, count in purged)
+
+
+async def run_tombstone_purge() -> None:
+    """
+    Фонова задача застосунку: раз на добу.
+
+    :return:
+    """
+    while True:
+        try:
+            purged = 0
+            for shard_session in ShardSessions:
+                async with shard_session() as session:
+                    purged += await purge_tombstones(session)
+            logger.info("purged %s contact tombstones", purged)
+        except Exception:
+            logger.exception("tombstone purge failed")
+        await asyncio.sleep(TOMBSTONE_PURGE_SECONDS)
+
+
+async def main(retention_days: int) -> None:
+    """
+
+    :param retention_days:
+    :return:
+    """
+    purged = 0
+    for shard_session in ShardSessions:
+        async with shard_session() as session:
+            purged += await purge_tombstones(session, retention_days)
+    print(f"Видалено tombstone-ів: {purged}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    purge = subparsers.add_parser("purge")
+    purge.add_argument("--retention-days", type=int, default=TOMBSTONE_RETENTION_DAYS)
+    args = parser.parse_args()
+    asyncio.run(main(args.retention_days))
@@ -0,0 +1,185 @@
+import pytest
+from fastapi import HTTPException
+
+from src.auth import create_access_token, create_refresh_token, decode_token, get_current_user, revoke_token
+from src.revocation import RevocationStore, revocation_store
+
+pytest_plugins = ("pytest_asyncio",)
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_rotation(client):
+    refresh = create_refresh_token(data={"sub": "1"})
+
+    response = await client.post("/auth/refresh_token", headers={"Authorization": f"Bearer {refresh}"})
+    assert response.status_code == 200
+    rotated = response.json()["refresh_token"]
+    assert decode_token(rotated, refresh=True)["jti"] != decode_token(refresh, refresh=True)["jti"]
+
+    response = await client.post("/auth/refresh_token", headers={"Authorization": f"Bearer {refresh}"})
+    assert response.status_code == 401
+
+    response = await client.post("/auth/refresh_token", headers={"Authorization": f"Bearer {rotated}"})
+    assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_logout_revokes_access_token(client, session):
+    access = create_access_token(data={"sub": "1"})
+    refresh = create_refresh_token(data={"sub": "1"})
+
+    user = await get_current_user(access, session)
+    assert user.id == 1
+    assert revocation_store.db_checks == 0
+
+    response = await client.post(
+        "/auth/logout",
+        json={"refresh_token": refresh},
+        headers={"Authorization": f"Bearer {access}"},
+    )
+    assert response.status_code == 204
+
+    with pytest.raises(HTTPException):
+        await get_current_user(access, session)
+    response = await client.post("/auth/refresh_token", headers={"Authorization": f"Bearer {refresh}"})
+    assert response.status_code == 401
+
+
+@pytest.mark.asyncio
+async def test_revocations_sync_between_workers(session):
+    other_worker = RevocationStore()
+    payload = decode_token(create_access_token(data={"sub": "1"}))
+
+    assert await revoke_token(session, payload)
+    assert not await other_worker.is_revoked(session, payload["jti"])
+    assert await other_worker.sync(session) == 1
+    assert await other_worker.is_revoked(session, payload["jti"])
+    assert not await revoke_token(session, payload)
+
+
+@pytest.mark.asyncio
+async def test_revocation_sync_sees_late_commit_of_lower_id(session):
+    from datetime import datetime, timedelta
+    from src.models import RevokedToken
+
+    other_worker = RevocationStore()
+    expires_at = datetime.utcnow() + timedelta(hours=1)
+    session.add(RevokedToken(id=5, jti="later-id", expires_at=expires_at))
+    await session.commit()
+    assert await other_worker.sync(session) == 1
+
+    # транзакція з меншим id закомітилась після синхронізації
+    session.add(RevokedToken(id=4, jti="earlier-id", expires_at=expires_at))
+    await session.commit()
+    assert await other_worker.sync(session) == 1
+    assert await other_worker.is_revoked(session, "earlier-id")
+    assert other_worker.db_checks == 0
+    assert await other_worker.sync(session) == 0
+
+
+@pytest.mark.asyncio
+async def test_lane_metrics(client, monkeypatch):
+    from src.routers import internal
+
+    await client.get("/contacts/")
+    assert (await client.get("/metrics/lanes")).status_code == 403
+    monkeypatch.setattr(internal, "INTERNAL_API_TOKEN", "ops")
+    response = await client.get("/metrics/lanes", headers={"X-Internal-Token": "ops"})
+    assert response.status_code == 200
+    data = response.json()
+    assert set(data) == {"auth", "contacts"}
+    assert data["contacts"]["admitted"] >= 1
+    assert data["contacts"]["active"] == 0
+
+
+@pytest.mark.asyncio
+async def test_update_avatar_stores_variants(client, session, tmp_path, monkeypatch):
+    import io
+    from PIL import Image
+    from src.main import app
+    from src.models import User
+    from src.services.avatar_service import avatar_processor
+    from src.services.avatar_storage import LocalAvatarStorage
+
+    monkeypatch.setattr(avatar_processor, "storage", LocalAvatarStorage(str(tmp_path), "/media"))
+    monkeypatch.setattr(avatar_processor, "workers", 0)
+    user = await session.get(User, 1)
+
+    async def _session_user():
+        return user
+
+    app.dependency_overrides[get_current_user] = _session_user
+    buffer = io.BytesIO()
+    Image.new("RGB", (64, 64), (10, 20, 30)).save(buffer, "PNG")
+
+    response = await client.post("/auth/avatar", files={"file": ("a.png", buffer.getvalue(), "image/png")})
+    assert response.status_code == 200
+    variants = response.json()["variants"]
+    assert set(variants) == {"small", "medium", "large"}
+    await session.refresh(user)
+    assert user.avatar_variants == variants and user.avatar_url == variants["large"]
+
+    response = await client.post("/auth/avatar", files={"file": ("a.txt", b"hello", "text/plain")})
+    assert response.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_signup_single_path(client):
+    from src.registration import verification_mailer
+
+    payload = {"email": "new@example.com", "password": "secret"}
+    response = await client.post("/auth/signup", json=payload)
+    assert response.status_code == 201
+    assert response.json()["email"] == "new@example.com"
+    assert verification_mailer.queue.qsize() == 1
+
+    for path in ("/auth/signup", "/auth/register"):
+        response = await client.post(path, json=payload)
+        assert response.status_code == 409
+    assert verification_mailer.queue.qsize() == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_signups_create_one_user():
+    import asyncio
+    from src.registration import register_user
+    from src.tests.conftest import TestingSessionLocal
+
+    async def attempt():
+        async with TestingSessionLocal() as db:
+            return await register_user(db, "race@example.com", "secret")
+
+    results = await asyncio.gather(*(attempt() for _ in range(3)))
+    assert sum(result is not None for result in results) == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_provisioning(client, monkeypatch):
+    from src.routers import internal
+    from src.registration import verification_mailer
+
+    monkeypatch.setattr(internal, "INTERNAL_API_TOKEN", "admin")
+    users = [{"email": f"bulk{n}@example.com", "password": "secret"} for n in range(3)]
+    users.append({"email": "test@example.com", "password": "secret"})
+
+    response = await client.post("/internal/users/bulk", json={"users": users, "verified": True},
+                                 headers={"X-Internal-Token": "admin"})
+    assert response.status_code == 200
+    data = response.json()
+    assert [user["email"] for user in data["created"]] == [f"bulk{n}@example.com" for n in range(3)]
+    assert data["existing"] == ["test@example.com"]
+    assert verification_mailer.queue.qsize() == 0
+
+    monkeypatch.setattr(internal, "PROVISION_HTTP_MAX_USERS", 2)
+    response = await client.post("/internal/users/bulk", json={"users": users, "verified": True},
+                                 headers={"X-Internal-Token": "admin"})
+    assert response.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_request_id_header(client):
+    response = await client.get("/", headers={"X-Request-ID": "abc-123"})
+    assert response.headers["X-Request-ID"] == "abc-123"
+
+    response = await client.get("/")
+    assert len(response.headers["X-Request-ID"]) == 32
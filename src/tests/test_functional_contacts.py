@@ -3,6 +3,7 @@ from httpx import AsyncClient, ASGITransport
 from datetime import date
 
 from src.main import app
+from src.schemas import ContactUpdate
 
 pytest_plugins = ("pytest_asyncio",)
 
@@ -172,4 +173,465 @@ async def test_delete_contact(client):
     assert response.status_code == 204
 
     check = await client.get(f"/contacts/{contact_id}")
-    assert check.status_code == 404
\ No newline at end of file
+    assert check.status_code == 404
+
+@pytest.mark.asyncio
+async def test_autocomplete_contacts(client, session):
+    from src import crud
+    from src.schemas import ContactCreate
+
+    await crud.create_contact(session, ContactCreate(
+        first_name="Олена",
+        last_name="Коваль",
+        email="olena@example.com",
+        phone="+38 (050) 123-45-67",
+        birthday=date(1990, 4, 4),
+    ), 1)
+
+    response = await client.get("/contacts/autocomplete?q=ол")
+    assert response.status_code == 200
+    assert [c["email"] for c in response.json()] == ["olena@example.com"]
+
+    response = await client.get("/contacts/autocomplete?q=38050")
+    assert [c["last_name"] for c in response.json()] == ["Коваль"]
+
+    second = await crud.create_contact(session, ContactCreate(
+        first_name="Ольга",
+        last_name="Бондар",
+        email="olha@example.com",
+        phone="0671112233",
+        birthday=date(1991, 5, 5),
+    ), 1)
+    response = await client.get("/contacts/autocomplete?q=ол")
+    assert len(response.json()) == 2
+
+    await crud.delete_contact(session, second.id, 1)
+    response = await client.get("/contacts/autocomplete?q=ольга")
+    assert response.json() == []
+
+
+@pytest.mark.asyncio
+async def test_get_duplicates(client, session, monkeypatch):
+    from src import crud
+    from src.schemas import ContactCreate
+    from src.sharding import shard_map
+    from src.tests.conftest import TestingSessionLocal
+
+    monkeypatch.setattr(shard_map, "sessions", [TestingSessionLocal])
+    first = await crud.create_contact(session, ContactCreate(
+        first_name="John", last_name="Smith", email="john@example.com",
+        phone="+380671112233", birthday=date(1990, 1, 1),
+    ), 1)
+    second = await crud.create_contact(session, ContactCreate(
+        first_name="Jon", last_name="Smyth", email="john+work@example.com",
+        phone="067 111 22 33", birthday=date(1990, 1, 1),
+    ), 1)
+
+    response = await client.get("/contacts/duplicates")
+    assert response.status_code == 202
+
+    response = await client.get("/contacts/duplicates")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "done"
+    assert data["clusters"] == [{
+        "contact_ids": [first.id, second.id],
+        "reasons": ["email", "name", "phone"],
+    }]
+
+    # стан у БД: інший воркер бачить звіт і не запускає другий пошук паралельно
+    from src.dedup import DuplicateJobs
+    other_worker = DuplicateJobs()
+    assert (await other_worker.get(1))["status"] == "done"
+    assert await other_worker.schedule(1)
+    assert not await DuplicateJobs().schedule(1)
+
+
+@pytest.mark.asyncio
+async def test_get_contacts_by_phone(client, session):
+    from src import crud
+    from src.schemas import ContactCreate
+
+    contact = await crud.create_contact(session, ContactCreate(
+        first_name="Caller", last_name="Id", email="caller@example.com",
+        phone="(067) 111-22-33", birthday=date(1990, 1, 1),
+    ), 1)
+    assert contact.phone_e164 == "+380671112233"
+
+    response = await client.get("/contacts/by-phone/+380671112233")
+    assert response.status_code == 200
+    assert [c["id"] for c in response.json()] == [contact.id]
+
+    await crud.update_contact(session, contact.id, ContactUpdate(phone="+1 555 010 2030"), 1)
+    response = await client.get("/contacts/by-phone/0671112233")
+    assert response.json() == []
+    response = await client.get("/contacts/by-phone/15550102030")
+    assert [c["phone_e164"] for c in response.json()] == ["+15550102030"]
+
+
+@pytest.mark.asyncio
+async def test_birthday_digest(client, session, monkeypatch):
+    from datetime import timedelta
+    from sqlalchemy import select, update
+    from src import crud
+    from src.birthdays import refresh_birthday_digest
+    from src.models import BirthdayDigest, Contact
+    from src.routers import internal
+    from src.schemas import ContactCreate
+
+    today = date.today()
+    soon = (today + timedelta(days=3)).replace(year=1992)
+    later = (today + timedelta(days=30)).replace(year=1992)
+    upcoming = await crud.create_contact(session, ContactCreate(
+        first_name="Soon", last_name="Party", email="soon@example.com",
+        phone="0671112233", birthday=soon,
+    ), 1)
+    other = await crud.create_contact(session, ContactCreate(
+        first_name="Later", last_name="Party", email="later@example.com",
+        phone="0671112234", birthday=later,
+    ), 1)
+
+    response = await client.get("/contacts/birthdays/")
+    assert [c["id"] for c in response.json()] == [upcoming.id]
+
+    await crud.update_contact(session, other.id, ContactUpdate(birthday=soon), 1)
+    response = await client.get("/contacts/birthdays/")
+    assert [c["id"] for c in response.json()] == [upcoming.id, other.id]
+
+    await session.execute(update(BirthdayDigest).values(next_birthday=today - timedelta(days=1)))
+    await session.commit()
+    assert await refresh_birthday_digest(session) == 2
+    response = await client.get("/contacts/birthdays/")
+    assert len(response.json()) == 2
+
+    # повний прохід рахує на місці й прибирає лише рядки без дати народження
+    no_birthday = await crud.create_contact(session, ContactCreate(
+        first_name="No", last_name="Party", email="none@example.com", phone="0671112235", birthday=soon,
+    ), 1)
+    await session.execute(update(Contact).where(Contact.id == no_birthday.id).values(birthday=None))
+    await session.commit()
+    monkeypatch.setattr("src.birthdays.REFRESH_BATCH_SIZE", 1)
+    assert await refresh_birthday_digest(session, full=True) == 2
+    digest = (await session.execute(select(BirthdayDigest.contact_id))).scalars().all()
+    assert sorted(digest) == sorted([upcoming.id, other.id])
+
+    response = await client.get("/internal/birthdays")
+    assert response.status_code == 403
+
+    monkeypatch.setattr(internal, "INTERNAL_API_TOKEN", "notifier")
+    headers = {"X-Internal-Token": "notifier"}
+    response = await client.get("/internal/birthdays?limit=1", headers=headers)
+    page = response.json()
+    assert [item["contact_id"] for item in page["items"]] == [upcoming.id]
+    response = await client.get(f"/internal/birthdays?limit=1&cursor={page['next_cursor']}", headers=headers)
+    assert [item["contact_id"] for item in response.json()["items"]] == [other.id]
+
+    await crud.delete_contact(session, upcoming.id, 1)
+    response = await client.get("/contacts/birthdays/")
+    assert [c["id"] for c in response.json()] == [other.id]
+
+
+@pytest.mark.asyncio
+async def test_contact_changes(client, session):
+    from datetime import datetime, timedelta
+    from sqlalchemy import update
+    from src import crud
+    from src.models import ContactTombstone
+    from src.schemas import ContactCreate
+    from src.sync import purge_tombstones
+
+    response = await client.get("/contacts/changes?since=0")
+    assert response.json() == {"cursor": 0, "has_more": False, "reset": False, "changed": [], "deleted": []}
+
+    first = await crud.create_contact(session, ContactCreate(
+        first_name="Sync", last_name="One", email="sync1@example.com",
+        phone="0671112233", birthday=date(1990, 1, 1),
+    ), 1)
+    second = await crud.create_contact(session, ContactCreate(
+        first_name="Sync", last_name="Two", email="sync2@example.com",
+        phone="0671112234", birthday=date(1990, 1, 1),
+    ), 1)
+
+    response = await client.get("/contacts/changes?since=0&limit=1")
+    page = response.json()
+    assert [c["id"] for c in page["changed"]] == [first.id]
+    assert page["has_more"] is True
+    response = await client.get(f"/contacts/changes?since={page['cursor']}")
+    page = response.json()
+    assert [c["id"] for c in page["changed"]] == [second.id]
+    cursor = page["cursor"]
+
+    response = await client.get(f"/contacts/changes?since={cursor}")
+    assert response.json()["changed"] == [] and response.json()["cursor"] == cursor
+
+    await crud.update_contact(session, second.id, ContactUpdate(first_name="Renamed"), 1)
+    await crud.delete_contact(session, first.id, 1)
+    response = await client.get(f"/contacts/changes?since={cursor}")
+    page = response.json()
+    assert [c["first_name"] for c in page["changed"]] == ["Renamed"]
+    assert page["deleted"] == [first.id]
+
+    await session.execute(update(ContactTombstone).values(deleted_at=datetime.utcnow() - timedelta(days=365)))
+    await session.commit()
+    assert await purge_tombstones(session) == 1
+    response = await client.get(f"/contacts/changes?since={cursor}")
+    assert response.json()["reset"] is True
+    response = await client.get(f"/contacts/changes?since={page['cursor']}")
+    assert response.json()["reset"] is False
+
+
+@pytest.mark.asyncio
+async def test_contact_events_published_from_crud(session):
+    from src import crud
+    from src.events import event_bus
+    from src.schemas import ContactCreate
+
+    async with event_bus.subscribe(1) as queue:
+        queue.coalesce = 0
+        contact = await crud.create_contact(session, ContactCreate(
+            first_name="Live", last_name="One", email="live1@example.com",
+            phone="0671112235", birthday=date(1990, 1, 1),
+        ), 1)
+        await crud.update_contact(session, contact.id, ContactUpdate(first_name="Renamed"), 1)
+        batch = await queue.get_batch()
+        assert [event["type"] for event in batch] == ["created"]
+        assert batch[0]["contact"]["first_name"] == "Renamed"
+
+        await crud.delete_contact(session, contact.id, 1)
+        batch = await queue.get_batch()
+        assert batch == [{"type": "deleted", "contact_id": contact.id, "change_seq": batch[0]["change_seq"]}]
+        assert batch[0]["change_seq"] > contact.change_seq
+
+
+def test_contact_events_websocket():
+    from fastapi.testclient import TestClient
+    from starlette.websockets import WebSocketDisconnect
+    from src.auth import create_access_token
+    from src.database import get_db, pool_admissions
+    from src.events import event_bus
+
+    # справжня get_db, щоб було видно, чи сокет тримає місце в допуску
+    app.dependency_overrides.pop(get_db, None)
+    client = TestClient(app)
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with client.websocket_connect("/contacts/ws?token=bad"):
+            pass
+    assert exc.value.code == 1008
+
+    token = create_access_token(data={"sub": "1"})
+    with client.websocket_connect(f"/contacts/ws?token={token}") as websocket:
+        websocket.portal.call(event_bus.publish_contact, 1, "deleted", 5, 9)
+        assert websocket.receive_json() == {"events": [{"type": "deleted", "contact_id": 5, "change_seq": 9}]}
+        # відкритий сокет не тримає місце в допуску до пулу
+        assert pool_admissions[0].in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_sparse_fields_and_pagination(client, session):
+    from src import crud
+    from src.schemas import ContactCreate
+
+    for i in range(3):
+        await crud.create_contact(session, ContactCreate(
+            first_name=f"Sparse{i}", last_name="List", email=f"sparse{i}@example.com",
+            phone=f"067111224{i}", birthday=date(1990, 1, 1), extra_info="x" * 1000,
+        ), 1)
+
+    response = await client.get("/contacts/?fields=first_name,phone&skip=1&limit=1")
+    assert response.status_code == 200
+    assert response.json() == [{"first_name": "Sparse1", "phone": "0671112241"}]
+
+    response = await client.get("/contacts/search/?query=sparse2&fields=id,email")
+    assert list(response.json()[0]) == ["id", "email"]
+
+    response = await client.get("/contacts/birthdays/?fields=first_name")
+    assert response.status_code == 200
+
+    response = await client.get("/contacts/?fields=first_name,password")
+    assert response.status_code == 422
+
+    rows = await crud.get_contacts(session, 1, ["id", "last_name"], limit=2)
+    assert [list(row) for row in rows] == [["id", "last_name"], ["id", "last_name"]]
+
+
+@pytest.mark.asyncio
+async def test_idempotent_create_contact(client, session):
+    import asyncio
+    from sqlalchemy import func, select
+    from src.auth import create_access_token
+    from src.models import Contact
+
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': '1'})}", "Idempotency-Key": "k-1"}
+    payload = {
+        "first_name": "Retry", "last_name": "Me", "email": "retry@example.com",
+        "phone": "0671112299", "birthday": "2001-01-01",
+    }
+
+    responses = await asyncio.gather(*(client.post("/contacts/", json=payload, headers=headers) for _ in range(3)))
+    assert [r.status_code for r in responses] == [201, 201, 201]
+    assert len({r.json()["id"] for r in responses}) == 1
+    assert sum(r.headers.get("Idempotent-Replayed") == "true" for r in responses) == 2
+
+    for _ in range(6):
+        replay = await client.post("/contacts/", json=payload, headers=headers)
+        assert replay.status_code == 201 and replay.json() == responses[0].json()
+    assert await session.scalar(select(func.count()).select_from(Contact).where(Contact.email == "retry@example.com")) == 1
+
+    response = await client.post("/contacts/", json={**payload, "first_name": "Other"}, headers=headers)
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_idempotency_key_released_after_error(client):
+    from src.auth import create_access_token
+
+    headers = {"Authorization": f"Bearer {create_access_token(data={'sub': '1'})}", "Idempotency-Key": "k-2"}
+    response = await client.post("/contacts/", json={"first_name": "Broken"}, headers=headers)
+    assert response.status_code == 422
+
+    response = await client.post("/contacts/", json={
+        "first_name": "Fixed", "last_name": "Body", "email": "fixed@example.com",
+        "phone": "0671112298", "birthday": "2001-01-01",
+    }, headers=headers)
+    assert response.status_code == 201
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_reads_are_coalesced(client, monkeypatch):
+    import asyncio
+
+    await client.post("/contacts/", json={
+        "first_name": "Same", "last_name": "Read", "email": "same@example.com",
+        "phone": "0671112300", "birthday": "2001-01-01",
+    })
+
+    responses = await asyncio.gather(*(client.get("/contacts/") for _ in range(3)))
+    assert all(r.status_code == 200 and r.json() == responses[0].json() for r in responses)
+
+    from src.routers import internal
+    monkeypatch.setattr(internal, "INTERNAL_API_TOKEN", "ops")
+    stats = (await client.get("/metrics/reads", headers={"X-Internal-Token": "ops"})).json()["contacts"]
+    assert stats["leaders"] + stats["coalesced"] == 3
+    assert stats["inflight"] == 0
+
+
+@pytest.mark.asyncio
+async def test_contact_stats_follow_writes(client, session):
+    from src import crud
+    from src.schemas import ContactCreate
+    from src.stats import rebuild_stats
+
+    def contact(n, month, phone="0671112233"):
+        return ContactCreate(first_name=f"S{n}", last_name="Stats", email=f"s{n}@example.com",
+                             phone=phone, birthday=date(1990, month, 5))
+
+    first = (await crud.create_contact(session, contact(1, 1), 1)).id
+    await crud.create_contact(session, contact(2, 1, phone=" "), 1)
+    await crud.create_contact(session, contact(3, 3), 1)
+
+    stats = (await client.get("/contacts/stats")).json()
+    assert stats["total"] == 3 and stats["missing_phone"] == 1 and stats["missing_email"] == 0
+    assert stats["by_birth_month"][0] == 2 and stats["by_birth_month"][2] == 1
+
+    assert (await client.put(f"/contacts/{first}", json={"birthday": "1990-12-01"})).status_code == 200
+    stats = (await client.get("/contacts/stats")).json()
+    assert stats["by_birth_month"][0] == 1 and stats["by_birth_month"][11] == 1
+
+    assert (await client.delete(f"/contacts/{first}")).status_code == 204
+    stats = (await client.get("/contacts/stats")).json()
+    assert stats["total"] == 2 and stats["by_birth_month"][11] == 0
+
+    assert await rebuild_stats(session) == 1
+    assert (await client.get("/contacts/stats")).json() == stats
+
+
+@pytest.mark.asyncio
+async def test_contact_groups_filter(client, session):
+    from src import crud
+    from src.schemas import ContactCreate
+
+    ids = [
+        (await crud.create_contact(session, ContactCreate(
+            first_name=f"G{n}", last_name="Group", email=f"g{n}@example.com", phone="0671112233",
+            birthday=date(1990, 1, 1),
+        ), 1)).id
+        for n in range(4)
+    ]
+    friends = (await client.post("/groups/", json={"name": "friends"})).json()
+    work = (await client.post("/groups/", json={"name": "work"})).json()
+    family = (await client.post("/groups/", json={"name": "family"})).json()
+    assert (await client.post("/groups/", json={"name": "friends"})).status_code == 409
+
+    added = await client.post(f"/groups/{friends['id']}/contacts", json={"contact_ids": ids[:3] + [999999]})
+    assert added.json() == {"added": 3}
+    await client.post(f"/groups/{work['id']}/contacts", json={"contact_ids": ids[1:]})
+    await client.post(f"/groups/{family['id']}/contacts", json={"contact_ids": [ids[2]]})
+
+    async def filtered(query):
+        response = await client.get(f"/contacts/?fields=id&{query}")
+        assert response.status_code == 200
+        return [row["id"] for row in response.json()]
+
+    assert await filtered(f"groups={friends['id']},{work['id']}") == ids[1:3]
+    assert await filtered(f"groups={friends['id']},{work['id']}&exclude_groups={family['id']}") == [ids[1]]
+    assert await filtered(f"any_groups={family['id']},{work['id']}&exclude_groups={friends['id']}") == [ids[3]]
+    assert (await client.get("/contacts/?groups=a,b")).status_code == 422
+
+    sizes = {group["name"]: group["size"] for group in (await client.get("/groups/")).json()}
+    assert sizes == {"family": 1, "friends": 3, "work": 3}
+
+    assert (await client.delete(f"/groups/{work['id']}/contacts/{ids[1]}")).status_code == 204
+    assert (await client.delete(f"/contacts/{ids[2]}")).status_code == 204
+    assert await filtered(f"groups={friends['id']},{work['id']}") == []
+    renamed = await client.put(f"/groups/{family['id']}", json={"name": "relatives"})
+    assert renamed.json() == {"id": family["id"], "name": "relatives", "size": 0}
+    assert (await client.put(f"/groups/{family['id']}", json={"name": "work"})).status_code == 409
+
+    assert (await client.delete(f"/groups/{friends['id']}")).status_code == 204
+    assert (await client.get(f"/groups/{friends['id']}")).status_code == 404
+    assert len(await filtered("")) == 3
+
+
+@pytest.mark.asyncio
+async def test_create_group_with_expiring_session(client):
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import sessionmaker
+    from src.database import get_db
+    from src.tests.conftest import test_engine
+
+    ExpiringSession = sessionmaker(test_engine, expire_on_commit=True, class_=AsyncSession)
+
+    async def _expiring_get_db():
+        async with ExpiringSession() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = _expiring_get_db
+    try:
+        created = await client.post("/groups/", json={"name": "neighbours"})
+        assert created.status_code in (200, 201)
+        assert created.json()["name"] == "neighbours"
+        assert (await client.get(f"/groups/{created.json()['id']}")).status_code == 200
+    finally:
+        app.dependency_overrides.pop(get_db, None)
+
+
+@pytest.mark.asyncio
+async def test_add_members_keeps_batch_when_some_already_added(client, session):
+    from src import crud, groups
+    from src.models import ContactGroupMember
+    from src.schemas import ContactCreate
+
+    ids = [
+        (await crud.create_contact(session, ContactCreate(
+            first_name=f"M{n}", last_name="Member", email=f"m{n}@example.com", phone="0671112233",
+            birthday=date(1990, 1, 1),
+        ), 1)).id
+        for n in range(3)
+    ]
+    group = (await client.post("/groups/", json={"name": "club"})).json()
+    # інший запит уже додав другий контакт
+    session.add(ContactGroupMember(group_id=group["id"], contact_id=ids[1], user_id=1))
+    await session.commit()
+
+    assert await groups.add_members(session, group["id"], 1, ids) == 2
+    assert (await client.get(f"/groups/{group['id']}")).json()["size"] == 3
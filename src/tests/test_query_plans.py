@@ -0,0 +1,103 @@
+import re
+import pytest
+from datetime import date
+from sqlalchemy import event, insert, text
+
+from src import crud, sync
+from src.models import Contact, User, UserSyncState
+from src.schemas import ContactUpdate
+from src.tests.conftest import test_engine
+
+pytest_plugins = ("pytest_asyncio",)
+
+USERS = 5
+CONTACTS_PER_USER = 500
+
+SEQ_SCAN = {
+    "postgresql": re.compile(r"Seq Scan on contacts\b"),
+    "sqlite": re.compile(r"^SCAN contacts\b"),
+}
+
+CRUD_QUERIES = {
+    "get_contacts": lambda db: crud.get_contacts(db, 1),
+    "get_contacts_page": lambda db: crud.get_contacts(db, 1, ["first_name", "phone"], skip=100, limit=50),
+    "get_contact": lambda db: crud.get_contact(db, 1, 1),
+    "update_contact": lambda db: crud.update_contact(db, 1, ContactUpdate(extra_info="x"), 1),
+    "delete_contact": lambda db: crud.delete_contact(db, 2, 1),
+    "search_contacts": lambda db: crud.search_contacts(db, "first", 1),
+    "get_contacts_by_phone": lambda db: crud.get_contacts_by_phone(db, "067 000 0001", 1),
+    "get_upcoming_birthdays": lambda db: crud.get_upcoming_birthdays(db, 1),
+    "get_changes": lambda db: sync.get_changes(db, 1, CONTACTS_PER_USER - 10, 100),
+}
+
+
+@pytest.fixture(scope="function", autouse=True)
+async def seed_contacts(session):
+    """Набір даних, на якому планувальник обирає між індексом і повним скануванням"""
+    await session.execute(insert(User), [
+        {"id": user_id, "email": f"user{user_id}@example.com", "hashed_password": "fake"}
+        for user_id in range(2, USERS + 1)
+    ])
+    await session.execute(insert(Contact), [
+        {
+            "user_id": user_id,
+            "first_name": f"first{i}",
+            "last_name": f"last{i % 50}",
+            "email": f"c{i}@example.com",
+            "phone": f"{i:09d}",
+            "phone_e164": f"+380{i:09d}",
+            "birthday": date(1990, i % 12 + 1, i % 28 + 1),
+            "change_seq": i + 1,
+        }
+        for user_id in range(1, USERS + 1)
+        for i in range(CONTACTS_PER_USER)
+    ])
+    await session.execute(insert(UserSyncState), [
+        {"user_id": user_id, "last_seq": CONTACTS_PER_USER, "purged_seq": 0}
+        for user_id in range(1, USERS + 1)
+    ])
+    await session.commit()
+    async with test_engine.begin() as conn:
+        await conn.execute(text("ANALYZE"))
+    yield
+
+
+async def capture_selects(call):
+    """Виконує виклик crud і повертає всі SELECT-и по таблиці contacts"""
+    statements = []
+
+    def _capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "contacts" in statement:
+            statements.append((statement, parameters))
+
+    event.listen(test_engine.sync_engine, "before_cursor_execute", _capture)
+    try:
+        await call()
+    finally:
+        event.remove(test_engine.sync_engine, "before_cursor_execute", _capture)
+    return statements
+
+
+async def explain(statement, parameters):
+    """Повертає план запиту у вигляді рядків"""
+    async with test_engine.connect() as conn:
+        if conn.dialect.name == "postgresql":
+            await conn.exec_driver_sql("SET enable_seqscan = off")
+            result = await conn.exec_driver_sql("EXPLAIN " + statement, parameters)
+            return [row[0] for row in result]
+        result = await conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+        return [row[-1] for row in result]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("name", sorted(CRUD_QUERIES))
+async def test_crud_query_uses_index(session, name):
+    statements = await capture_selects(lambda: CRUD_QUERIES[name](session))
+    assert statements, f"{name} did not query contacts"
+
+    seq_scan = SEQ_SCAN[test_engine.dialect.name]
+    for statement, parameters in statements:
+        plan = await explain(statement, parameters)
+        assert not any(seq_scan.search(line) for line in plan), (
+            f"{name} falls back to a sequential scan:\n{statement}\n" + "\n".join(plan)
+        )
@@ -0,0 +1,170 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+from collections import Counter
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src.admission import DeadlineMiddleware, PoolAdmission, RequestBudget, request_budget_var
+
+
+class TestPoolAdmission(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(self.directory.name, 'admission.db')}", pool_size=1, max_overflow=0
+        )
+        self.factory = sessionmaker(self.engine, class_=AsyncSession)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+        self.directory.cleanup()
+
+    async def test_sheds_when_in_flight_limit_reached(self):
+        admission = PoolAdmission("test", self.engine, max_in_flight=1)
+        async with admission.session(self.factory):
+            with self.assertRaises(HTTPException) as ctx:
+                async with admission.session(self.factory):
+                    pass
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertEqual(ctx.exception.headers["Retry-After"], "1")
+        self.assertEqual(admission.stats()["shed"], {"in_flight": 1})
+        self.assertEqual(admission.in_flight, 0)
+
+    async def test_checkout_timeout_feeds_pool_wait(self):
+        admission = PoolAdmission("test", self.engine, max_wait_ms=10, half_life=0.1, checkout_timeout=0.1)
+        async with admission.session(self.factory):
+            with self.assertRaises(HTTPException):
+                async with admission.session(self.factory):
+                    pass
+        self.assertEqual(admission.shed["checkout_timeout"], 1)
+
+        # середнє очікування вище порогу — запит відсікається, не стаючи в чергу
+        with self.assertRaises(HTTPException):
+            async with admission.session(self.factory):
+                pass
+        self.assertEqual(admission.shed["pool_wait"], 1)
+
+        await asyncio.sleep(0.5)
+        async with admission.session(self.factory) as session:
+            self.assertEqual((await session.execute(text("SELECT 1"))).scalar(), 1)
+
+    async def test_checkout_bounded_by_request_deadline(self):
+        admission = PoolAdmission("test", self.engine, max_wait_ms=10_000, checkout_timeout=5)
+        token = request_budget_var.set(RequestBudget(time.monotonic() + 0.05, 1000))
+        try:
+            async with admission.session(self.factory):
+                started = time.monotonic()
+                with self.assertRaises(HTTPException):
+                    async with admission.session(self.factory):
+                        pass
+                self.assertLess(time.monotonic() - started, 1)
+        finally:
+            request_budget_var.reset(token)
+
+
+class TestDeadlineMiddleware(unittest.IsolatedAsyncioTestCase):
+    async def call(self, app, path="/contacts/", disconnect_after=None):
+        counters = Counter()
+        middleware = DeadlineMiddleware(app, deadlines="/contacts=0.05:100,/slow=0", counters=counters)
+        messages = [{"type": "http.request", "body": b"{}", "more_body": False}]
+        sent = []
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            if disconnect_after is None:
+                await asyncio.Event().wait()
+            await asyncio.sleep(disconnect_after)
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await middleware({"type": "http", "path": path, "method": "GET", "headers": []}, receive, send)
+        return sent, counters
+
+    async def test_deadline_cancels_handler_and_returns_504(self):
+        cancelled = asyncio.Event()
+
+        async def app(scope, receive, send):
+            self.assertEqual((await receive())["body"], b"{}")
+            self.assertEqual(request_budget_var.get().statement_timeout_ms, 100)
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        sent, counters = await self.call(app)
+        self.assertTrue(cancelled.is_set())
+        self.assertEqual(sent[0]["status"], 504)
+        self.assertEqual(json.loads(sent[1]["body"]), {"detail": "Request deadline exceeded"})
+        self.assertEqual(counters["deadline_exceeded"], 1)
+
+    async def test_client_disconnect_cancels_handler(self):
+        cancelled = asyncio.Event()
+
+        async def app(scope, receive, send):
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        sent, counters = await self.call(app, path="/slow", disconnect_after=0.01)
+        self.assertTrue(cancelled.is_set())
+        self.assertEqual(sent, [])
+        self.assertEqual(counters["client_disconnect"], 1)
+
+    async def test_body_is_streamed_not_buffered(self):
+        produced = []
+        chunks = [{"type": "http.request", "body": bytes([n]), "more_body": n < 9} for n in range(10)]
+
+        async def receive():
+            if chunks:
+                produced.append(chunks[0]["body"])
+                return chunks.pop(0)
+            await asyncio.Event().wait()
+
+        read_ahead = []
+
+        async def app(scope, receive, send):
+            while True:
+                message = await receive()
+                await asyncio.sleep(0)
+                read_ahead.append(len(produced) - len(message["body"]) - len(read_ahead))
+                if not message["more_body"]:
+                    break
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+
+        middleware = DeadlineMiddleware(app, deadlines="", counters=Counter())
+        await middleware({"type": "http", "path": "/auth/avatar", "method": "POST", "headers": []}, receive,
+                         lambda message: asyncio.sleep(0))
+        self.assertEqual(len(read_ahead), 10)
+        self.assertLessEqual(max(read_ahead), 2)
+
+    async def test_work_after_response_is_not_cut(self):
+        finished = asyncio.Event()
+
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200, "headers": []})
+            await send({"type": "http.response.body", "body": b"ok"})
+            await asyncio.sleep(0.1)
+            finished.set()
+
+        sent, counters = await self.call(app, disconnect_after=0)
+        self.assertTrue(finished.is_set())
+        self.assertEqual(sent[0]["status"], 200)
+        self.assertEqual(counters, Counter())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+
+from src.autocomplete import AutocompleteIndex, PrefixIndex, contact_terms
+
+
+class TestPrefixIndex(unittest.TestCase):
+    def setUp(self):
+        self.index = PrefixIndex()
+        self.index.add((1, "John", "Doe", "john@example.com", "+1 (555) 010-2030"))
+        self.index.add((2, "Jane", "Doherty", "jane@example.com", "555 777"))
+
+    def test_terms_are_normalized(self):
+        terms = contact_terms("  Mary Ann ", "SMITH", "Mary@Example.com", "+1-555")
+        self.assertIn("mary ann smith", terms)
+        self.assertIn("smith mary ann", terms)
+        self.assertIn("ann", terms)
+        self.assertIn("mary@example.com", terms)
+        self.assertIn("1555", terms)
+
+    def test_prefix_search(self):
+        self.assertEqual([row[0] for row in self.index.search("do", 10)], [1, 2])
+        self.assertEqual([row[0] for row in self.index.search("jan", 10)], [2])
+        self.assertEqual([row[0] for row in self.index.search("1555", 10)], [1])
+        self.assertEqual(self.index.search("x", 10), [])
+
+    def test_limit_and_deduplication(self):
+        self.assertEqual(len(self.index.search("j", 1)), 1)
+        self.assertEqual([row[0] for row in self.index.search("john", 10)], [1])
+
+    def test_update_and_remove(self):
+        size = self.index.size
+        self.index.add((1, "Johnny", "Doe", "john@example.com", ""))
+        self.assertEqual([row[1] for row in self.index.search("johnny", 10)], ["Johnny"])
+        self.index.remove(1)
+        self.index.remove(2)
+        self.assertEqual(self.index.entries, [])
+        self.assertEqual(self.index.size, 0)
+        self.assertGreater(size, 0)
+
+    def test_build_matches_incremental_add(self):
+        rows = [(3, "Ann", "Zed", "ann@example.com", "1"), (1, "John", "Doe", "john@example.com", "+1 (555) 010-2030"),
+                (2, "Jane", "Doherty", "jane@example.com", "555 777")]
+        built = PrefixIndex.build(rows)
+        incremental = PrefixIndex()
+        for row in rows:
+            incremental.add(row)
+        self.assertEqual(built.entries, incremental.entries)
+        self.assertEqual(built.size, incremental.size)
+
+
+class TestAutocompleteIndexEviction(unittest.TestCase):
+    def test_least_recently_used_user_is_evicted(self):
+        autocomplete = AutocompleteIndex(memory_budget=1)
+        for user_id in (1, 2):
+            index = PrefixIndex()
+            index.add((user_id, "Name", "Surname", "a@example.com", "123"))
+            autocomplete.indexes[user_id] = index
+            autocomplete._evict()
+        self.assertEqual(list(autocomplete.indexes), [2])
+
+
+
+class SlowRows:
+    def __init__(self):
+        self.calls = 0
+
+    async def execute(self, statement):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return [(1, "John", "Doe", "john@example.com", "")]
+
+
+class TestAutocompleteIndexBuild(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_requests_build_once(self):
+        autocomplete = AutocompleteIndex()
+        db = SlowRows()
+        results = await asyncio.gather(*(autocomplete.search(db, 7, "jo") for _ in range(5)))
+        self.assertEqual(db.calls, 1)
+        self.assertEqual([len(found) for found in results], [1] * 5)
+        self.assertEqual(autocomplete.locks, {})
+
+    async def test_writes_during_build_are_applied(self):
+        from types import SimpleNamespace
+
+        autocomplete = AutocompleteIndex()
+        search = asyncio.create_task(autocomplete.search(SlowRows(), 7, "j"))
+        await asyncio.sleep(0)
+        # SELECT уже виконується: запис закомічено після знімка
+        autocomplete.contact_saved(7, SimpleNamespace(
+            id=2, first_name="Jane", last_name="Roe", email="jane@example.com", phone=""
+        ))
+        autocomplete.contact_deleted(7, 1)
+        self.assertEqual([row[0] for row in await search], [2])
+        self.assertEqual(autocomplete.locks, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from PIL import Image
+
+from src.services import avatar_service
+from src.services.avatar_service import AvatarProcessor, InvalidAvatar, read_upload, render_variants
+from src.services.avatar_storage import CloudinaryAvatarStorage, LocalAvatarStorage
+
+
+def make_image(size=(300, 200), color=(200, 30, 30), fmt="PNG") -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, fmt)
+    return buffer.getvalue()
+
+
+class TestRenderVariants(unittest.TestCase):
+    def test_square_webp_variants(self):
+        rendered = render_variants(make_image(), {"small": 40, "large": 128})
+        for name, size in (("small", 40), ("large", 128)):
+            with Image.open(io.BytesIO(rendered[name])) as image:
+                self.assertEqual(image.format, "WEBP")
+                self.assertEqual(image.size, (size, size))
+
+    def test_rejects_non_image(self):
+        with self.assertRaises(InvalidAvatar):
+            render_variants(b"not an image")
+
+
+class TestAvatarProcessor(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.storage = LocalAvatarStorage(self.tmp.name, "/media/")
+        self.processor = AvatarProcessor(self.storage, workers=1)
+
+    async def asyncTearDown(self):
+        self.processor.shutdown()
+        self.tmp.cleanup()
+
+    async def test_variants_are_content_addressed(self):
+        data = make_image()
+        urls = await self.processor.save(data)
+        self.assertEqual(set(urls), set(avatar_service.AVATAR_VARIANTS))
+        self.assertTrue(urls["small"].startswith("/media/avatars/"))
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, *urls["small"][len("/media/"):].split("/"))))
+
+        with patch.object(avatar_service, "render_variants") as render:
+            self.assertEqual(await AvatarProcessor(self.storage, workers=0).save(data), urls)
+        render.assert_not_called()
+
+        other = await self.processor.save(make_image(color=(0, 0, 255)))
+        self.assertNotEqual(other["small"], urls["small"])
+
+    async def test_rejects_oversized_upload(self):
+        with patch.object(avatar_service, "AVATAR_MAX_BYTES", 10):
+            with self.assertRaises(InvalidAvatar):
+                await self.processor.save(make_image())
+
+    async def test_upload_is_read_up_to_limit(self):
+        from fastapi import UploadFile
+
+        class CountingFile(io.BytesIO):
+            reads = 0
+
+            def read(self, size=-1):
+                self.reads += 1
+                return super().read(size)
+
+        self.assertEqual(await read_upload(UploadFile(io.BytesIO(b"x" * 100)), limit=100), b"x" * 100)
+        source = CountingFile(b"x" * (10 * avatar_service.AVATAR_READ_CHUNK))
+        with self.assertRaises(InvalidAvatar):
+            await read_upload(UploadFile(source), limit=avatar_service.AVATAR_READ_CHUNK)
+        self.assertEqual(source.reads, 2)
+
+    async def test_known_digest_is_shared_between_workers(self):
+        from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+        from src.database import Base
+
+        engine = create_async_engine("sqlite+aiosqlite://")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        data = make_image()
+        try:
+            async with AsyncSession(engine) as db:
+                urls = await self.processor.save(data, db)
+                await db.commit()
+            # інший воркер: своє сховище без кешу, але та сама БД
+            with tempfile.TemporaryDirectory() as other_root, \
+                    patch.object(avatar_service, "render_variants") as render:
+                other = AvatarProcessor(LocalAvatarStorage(other_root, "/media/"), workers=0)
+                async with AsyncSession(engine) as db:
+                    self.assertEqual(await other.save(data, db), urls)
+                    self.assertEqual(await other.save(data, db), urls)
+            render.assert_not_called()
+        finally:
+            await engine.dispose()
+
+
+class TestCloudinaryAvatarStorage(unittest.TestCase):
+    def test_url_cache_is_bounded(self):
+        storage = CloudinaryAvatarStorage(cache_size=2)
+        with patch("cloudinary.utils.cloudinary_url", side_effect=lambda public_id, **kw: (f"https://c/{public_id}", {})):
+            for name in ("a", "b", "c"):
+                storage.url(f"avatars/{name}/small.webp")
+            storage.url("avatars/b/small.webp")
+            storage.url("avatars/d/small.webp")
+        self.assertEqual(list(storage.urls), ["avatars/b/small.webp", "avatars/d/small.webp"])
+        self.assertFalse(storage.exists("avatars/a/small.webp"))
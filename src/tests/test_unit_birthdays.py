@@ -0,0 +1,23 @@
+import unittest
+from datetime import date
+
+from src.birthdays import next_birthday
+
+
+class TestNextBirthday(unittest.TestCase):
+    def test_later_this_year(self):
+        self.assertEqual(next_birthday(date(1990, 12, 1), date(2026, 10, 19)), date(2026, 12, 1))
+
+    def test_today(self):
+        self.assertEqual(next_birthday(date(1990, 10, 19), date(2026, 10, 19)), date(2026, 10, 19))
+
+    def test_already_passed_rolls_to_next_year(self):
+        self.assertEqual(next_birthday(date(1990, 1, 5), date(2026, 10, 19)), date(2027, 1, 5))
+
+    def test_leap_day(self):
+        self.assertEqual(next_birthday(date(2000, 2, 29), date(2026, 2, 1)), date(2026, 2, 28))
+        self.assertEqual(next_birthday(date(2000, 2, 29), date(2027, 3, 1)), date(2028, 2, 29))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,44 @@
+import asyncio
+import threading
+import unittest
+
+from fastapi import HTTPException
+
+from src.bulkhead import Bulkhead
+
+
+class TestBulkhead(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.lane = Bulkhead("test", concurrency=1, queue_size=1, queue_timeout=0.2, threads=1)
+
+    async def test_full_lane_rejects_with_retry_after(self):
+        await self.lane.acquire()
+        queued = asyncio.create_task(self.lane.acquire())
+        await asyncio.sleep(0)
+        self.assertEqual(self.lane.waiting, 1)
+
+        with self.assertRaises(HTTPException) as ctx:
+            await self.lane.acquire()
+        self.assertEqual(ctx.exception.status_code, 503)
+        self.assertEqual(ctx.exception.headers["Retry-After"], "1")
+
+        self.lane.release()
+        await queued
+        self.assertEqual(self.lane.stats()["active"], 1)
+        self.assertEqual(self.lane.stats()["rejected"], 1)
+        self.lane.release()
+
+    async def test_queue_timeout(self):
+        await self.lane.acquire()
+        with self.assertRaises(HTTPException):
+            await self.lane.acquire()
+        self.assertEqual(self.lane.waiting, 0)
+        self.lane.release()
+
+    async def test_run_uses_lane_threads(self):
+        name = await self.lane.run(lambda: threading.current_thread().name)
+        self.assertTrue(name.startswith("test-lane"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+from src.dedup import find_duplicate_clusters, normalize_email, soundex
+
+
+class TestDedup(unittest.TestCase):
+    def test_normalizers(self):
+        self.assertEqual(normalize_email(" John+news@Example.COM "), "john@example.com")
+        self.assertEqual(soundex("Robert"), soundex("Rupert"))
+        self.assertEqual(soundex("Олена"), soundex("Olena"))
+
+    def test_clusters_are_transitive(self):
+        rows = [
+            (1, "Anna", "Green", "anna@example.com", "111 222 333"),
+            (2, "Hanna", "Brown", "ANNA@example.com", "999 888 777"),
+            (3, "Bob", "White", "bob@example.com", "999888777"),
+            (4, "Carl", "Black", "carl@example.com", "123 123 123"),
+        ]
+        self.assertEqual(find_duplicate_clusters(rows), [
+            {"contact_ids": [1, 2, 3], "reasons": ["email", "phone"]},
+        ])
+
+    def test_oversized_name_blocks_are_skipped(self):
+        rows = [(i, "John", "Smith", f"john{i}@example.com", f"{i:05d}") for i in range(100)]
+        self.assertEqual(find_duplicate_clusters(rows), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
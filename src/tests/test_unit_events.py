@@ -0,0 +1,54 @@
+import unittest
+
+from src.events import ConnectionQueue, EventBus, contact_event
+
+
+class TestConnectionQueue(unittest.IsolatedAsyncioTestCase):
+    async def test_burst_is_coalesced_per_contact(self):
+        queue = ConnectionQueue(max_pending=10, coalesce_ms=0)
+        queue.put(contact_event("created", 1, 1))
+        queue.put(contact_event("updated", 1, 2))
+        queue.put(contact_event("updated", 2, 3))
+        queue.put(contact_event("updated", 2, 4))
+        queue.put(contact_event("deleted", 3, 5))
+
+        batch = await queue.get_batch()
+        self.assertEqual(
+            [(event["type"], event["contact_id"], event["change_seq"]) for event in batch],
+            [("created", 1, 2), ("updated", 2, 4), ("deleted", 3, 5)],
+        )
+        self.assertEqual(queue.pending, {})
+
+    async def test_overflow_turns_into_resync(self):
+        queue = ConnectionQueue(max_pending=2, coalesce_ms=0)
+        for contact_id in range(5):
+            queue.put(contact_event("updated", contact_id, contact_id))
+
+        self.assertEqual(await queue.get_batch(), [{"type": "resync"}])
+        queue.put(contact_event("updated", 9, 9))
+        self.assertEqual([event["contact_id"] for event in await queue.get_batch()], [9])
+
+
+class TestInProcessEventBus(unittest.IsolatedAsyncioTestCase):
+    async def test_publish_reaches_only_users_connections(self):
+        bus = EventBus("memory")
+        async with bus.subscribe(1) as first, bus.subscribe(1) as second, bus.subscribe(2) as other:
+            first.coalesce = second.coalesce = 0
+            await bus.publish_contact(1, "deleted", 7, 3)
+            self.assertEqual(await first.get_batch(), [{"type": "deleted", "contact_id": 7, "change_seq": 3}])
+            self.assertEqual(await second.get_batch(), [{"type": "deleted", "contact_id": 7, "change_seq": 3}])
+            self.assertEqual(other.pending, {})
+        self.assertEqual(bus.subscribers, {})
+
+    async def test_resync_all_reaches_every_connection(self):
+        bus = EventBus("memory")
+        async with bus.subscribe(1) as first, bus.subscribe(2) as second:
+            first.coalesce = second.coalesce = 0
+            await bus.publish_contact(1, "deleted", 7, 3)
+            bus.resync_all()
+            self.assertEqual(await first.get_batch(), [{"type": "resync"}])
+            self.assertEqual(await second.get_batch(), [{"type": "resync"}])
+
+    async def test_publish_without_listeners_skips_serialization(self):
+        bus = EventBus("memory")
+        await bus.publish_contact(1, "created", 1, 1, contact=object())
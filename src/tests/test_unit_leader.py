@@ -0,0 +1,28 @@
+import unittest
+
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.leader import lock_key, run_as_leader
+
+
+class TestRunAsLeader(unittest.IsolatedAsyncioTestCase):
+    async def test_runs_job_directly_without_postgres(self):
+        engine = create_async_engine("sqlite+aiosqlite://")
+        calls = []
+
+        async def job():
+            calls.append(1)
+            return "done"
+
+        self.assertEqual(await run_as_leader("job", job, engine=engine), "done")
+        self.assertEqual(calls, [1])
+        await engine.dispose()
+
+    def test_lock_key_is_stable_bigint(self):
+        self.assertEqual(lock_key("birthday_digest"), lock_key("birthday_digest"))
+        self.assertNotEqual(lock_key("birthday_digest"), lock_key("tombstones"))
+        self.assertLess(lock_key("birthday_digest"), 2 ** 63)
+
+
+if __name__ == "__main__":
+    unittest.main()
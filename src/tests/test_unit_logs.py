@@ -0,0 +1,60 @@
+import io
+import json
+import logging
+import unittest
+
+from src.logs import LogPipeline, SamplingFilter, parse_sampling, request_id_var
+
+
+def record(level=logging.INFO, name="sqlalchemy.engine.Engine", msg="SELECT 1"):
+    return logging.LogRecord(name, level, __file__, 1, msg, None, None)
+
+
+class TestSampling(unittest.TestCase):
+    def test_cap_per_second_keeps_warnings(self):
+        sampler = SamplingFilter(rate=1, cap=3)
+        passed = [sampler.filter(record()) for _ in range(10)]
+        self.assertEqual(sum(passed), 3)
+        self.assertEqual(sampler.dropped, 7)
+        self.assertTrue(sampler.filter(record(logging.WARNING)))
+
+    def test_rate(self):
+        sampler = SamplingFilter(rate=0)
+        self.assertFalse(any(sampler.filter(record()) for _ in range(100)))
+
+    def test_parse_sampling(self):
+        self.assertEqual(parse_sampling("sqlalchemy.engine=0.1:200, src.access=1"),
+                         {"sqlalchemy.engine": (0.1, 200), "src.access": (1.0, 0)})
+
+
+class TestLogPipeline(unittest.TestCase):
+    def test_records_go_through_queue_as_json(self):
+        pipeline = LogPipeline(queue_size=100, sampling="sqlalchemy.engine=1:2")
+        output = io.StringIO()
+        pipeline.start(level="INFO", fmt="json", stream=output, sql=True)
+        token = request_id_var.set("req-1")
+        try:
+            logging.getLogger("src.test").info("hello %s", "world", extra={"contact_id": 7})
+            for _ in range(5):
+                logging.getLogger("sqlalchemy.engine.Engine").info("SELECT 1")
+        finally:
+            request_id_var.reset(token)
+            pipeline.stop()
+
+        lines = [json.loads(line) for line in output.getvalue().splitlines()]
+        hello = next(line for line in lines if line["logger"] == "src.test")
+        self.assertEqual(hello["msg"], "hello world")
+        self.assertEqual(hello["request_id"], "req-1")
+        self.assertEqual(hello["contact_id"], 7)
+        self.assertEqual(sum(line["logger"] == "sqlalchemy.engine.Engine" for line in lines), 2)
+        self.assertEqual(pipeline.stats()["sampling"]["sqlalchemy.engine"]["dropped"], 3)
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        pipeline = LogPipeline(queue_size=2, sampling="")
+        for _ in range(5):
+            pipeline.handler.handle(record(name="src.test"))
+        self.assertEqual(pipeline.handler.dropped, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine
+
+from src.models import Base
+from src.server import migrate
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "app.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_upgrade_from_empty_database_matches_models(self):
+        migrate(f"sqlite+aiosqlite:///{self.path}")
+        migrate(f"sqlite+aiosqlite:///{self.path}")
+        engine = create_engine(f"sqlite:///{self.path}")
+        with engine.connect() as conn:
+            context = MigrationContext.configure(conn, opts={"compare_type": True})
+            diff = [
+                change for change in compare_metadata(context, Base.metadata)
+                if not (change[0] == "remove_table" and change[1].name == "alembic_backfill_progress")
+            ]
+        engine.dispose()
+        self.assertEqual(diff, [])
+
+    def test_schema_created_without_alembic_is_refused(self):
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY)")
+        with self.assertRaises(RuntimeError):
+            migrate(f"sqlite+aiosqlite:///{self.path}")
+
+
+if __name__ == "__main__":
+    unittest.main()
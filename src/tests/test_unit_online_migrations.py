@@ -0,0 +1,71 @@
+import unittest
+
+import sqlalchemy as sa
+from alembic.migration import MigrationContext
+from alembic.operations import Operations
+
+from src.online_migrations import backfill_progress, batched_backfill, create_index_concurrently
+
+items = sa.Table(
+    "items",
+    sa.MetaData(),
+    sa.Column("id", sa.Integer, primary_key=True),
+    sa.Column("value", sa.String),
+    sa.Column("copy", sa.String),
+)
+
+
+class TestOnlineMigrations(unittest.TestCase):
+    def setUp(self):
+        self.engine = sa.create_engine("sqlite://")
+        self.conn = self.engine.connect()
+        items.create(self.conn)
+        self.conn.execute(items.insert(), [{"id": i, "value": f"v{i}"} for i in range(1, 101)])
+        self.operations = Operations(MigrationContext.configure(self.conn))
+        self.proxy = Operations.context(self.operations.migration_context)
+        self.proxy.__enter__()
+
+    def tearDown(self):
+        self.proxy.__exit__(None, None, None)
+        self.conn.close()
+        self.engine.dispose()
+
+    def copies(self):
+        return dict(self.conn.execute(sa.select(items.c.id, items.c.copy)).all())
+
+    def test_values_backfill_covers_all_rows(self):
+        total = batched_backfill(items, name="items_copy", values={"copy": items.c.value}, batch_size=7, pause=0)
+        self.assertEqual(total, 100)
+        self.assertEqual(self.copies(), {i: f"v{i}" for i in range(1, 101)})
+        self.assertEqual(self.conn.scalar(sa.select(sa.func.count()).select_from(backfill_progress)), 0)
+
+    def test_transform_backfill_resumes_from_checkpoint(self):
+        backfill_progress.create(self.conn)
+        self.conn.execute(backfill_progress.insert().values(
+            name="items_upper", last_key=60, rows=60, updated_at=sa.func.now()
+        ))
+        total = batched_backfill(
+            items,
+            name="items_upper",
+            transform=lambda row: {"copy": row["value"].upper()},
+            columns=["value"],
+            batch_size=9,
+            pause=0,
+        )
+        self.assertEqual(total, 100)
+        copies = self.copies()
+        self.assertEqual([copies[i] for i in (1, 60)], [None, None])
+        self.assertEqual([copies[i] for i in (61, 100)], ["V61", "V100"])
+
+    def test_requires_exactly_one_mode(self):
+        with self.assertRaises(ValueError):
+            batched_backfill(items, name="items_copy")
+
+    def test_create_index_is_idempotent(self):
+        create_index_concurrently("ix_items_value", "items", ["value"])
+        create_index_concurrently("ix_items_value", "items", ["value"])
+        self.assertEqual([index["name"] for index in sa.inspect(self.conn).get_indexes("items")], ["ix_items_value"])
+
+
+if __name__ == "__main__":
+    unittest.main()
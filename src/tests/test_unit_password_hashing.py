@@ -0,0 +1,40 @@
+import unittest
+
+from src.auth import choose_bcrypt_rounds, pwd_context, verify_and_update_password
+
+
+class TestBcryptCalibration(unittest.TestCase):
+    def test_rounds_fit_target(self):
+        # 20 ms на 8 раундах: 10 -> 80 ms, 11 -> 160 ms, 12 -> 320 ms
+        self.assertEqual(choose_bcrypt_rounds(0.02, 250, base_rounds=8, min_rounds=4, max_rounds=16), 11)
+
+    def test_rounds_are_clamped(self):
+        self.assertEqual(choose_bcrypt_rounds(1.0, 250, base_rounds=8, min_rounds=10, max_rounds=16), 10)
+        self.assertEqual(choose_bcrypt_rounds(0.00001, 250, base_rounds=8, min_rounds=10, max_rounds=12), 12)
+
+
+class TestRehashOnLogin(unittest.TestCase):
+    def setUp(self):
+        self.policy = pwd_context.to_dict()
+        pwd_context.update(bcrypt__default_rounds=5, bcrypt__min_rounds=5)
+
+    def tearDown(self):
+        pwd_context.load(self.policy)
+
+    def test_weak_hash_is_upgraded(self):
+        weak = pwd_context.hash("secret", rounds=4)
+        verified, new_hash = verify_and_update_password("secret", weak)
+        self.assertTrue(verified)
+        self.assertIn("$05$", new_hash)
+
+    def test_current_hash_is_kept(self):
+        verified, new_hash = verify_and_update_password("secret", pwd_context.hash("secret"))
+        self.assertTrue(verified)
+        self.assertIsNone(new_hash)
+
+    def test_wrong_password(self):
+        self.assertEqual(verify_and_update_password("wrong", pwd_context.hash("secret")), (False, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,22 @@
+import unittest
+
+from src.phones import normalize_phone_e164
+
+
+class TestNormalizePhone(unittest.TestCase):
+    def test_same_number_in_different_notations(self):
+        for phone in ("+38 (067) 111-22-33", "067 111 22 33", "00380671112233", "380671112233", "671112233"):
+            self.assertEqual(normalize_phone_e164(phone), "+380671112233", phone)
+
+    def test_foreign_number_keeps_its_country_code(self):
+        self.assertEqual(normalize_phone_e164("+1 (555) 010-2030"), "+15550102030")
+        self.assertEqual(normalize_phone_e164("555 010 2030", country_code="1"), "+15550102030")
+
+    def test_invalid_numbers(self):
+        self.assertIsNone(normalize_phone_e164(""))
+        self.assertIsNone(normalize_phone_e164("+12"))
+        self.assertIsNone(normalize_phone_e164("+1234567890123456"))
+
+
+if __name__ == "__main__":
+    unittest.main()
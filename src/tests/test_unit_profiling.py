@@ -0,0 +1,78 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from src.logs import request_id_var
+from src.profiling import SUSPENDED, ProfileStore, ProfilingMiddleware
+
+
+def busy_dependency():
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+
+
+async def handler(scope, receive, send):
+    busy_dependency()
+    await asyncio.sleep(0.05)
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+
+def scope(headers=()):
+    return {"type": "http", "method": "GET", "path": "/contacts/", "headers": list(headers)}
+
+
+class TestProfilingMiddleware(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.directory = os.path.join(tempfile.mkdtemp(), "profiles")
+        self.store = ProfileStore(self.directory, max_files=2)
+        self.middleware = ProfilingMiddleware(handler, token="secret", sample_rate=0, interval_ms=1, store=self.store)
+
+    async def asyncTearDown(self):
+        shutil.rmtree(os.path.dirname(self.directory))
+
+    async def call(self, headers=()):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        await self.middleware(scope(headers), None, send)
+        return dict(messages[0]["headers"])
+
+    async def test_off_without_header(self):
+        headers = await self.call([(b"x-profile", b"wrong")])
+        self.assertNotIn(b"x-profile-id", headers)
+        self.assertFalse(os.path.isdir(self.directory))
+
+    async def test_profile_has_handler_stacks_and_suspended_time(self):
+        headers = await self.call([(b"x-profile", b"secret")])
+        with open(os.path.join(self.directory, headers[b"x-profile-id"].decode())) as profile:
+            lines = profile.read().splitlines()
+        self.assertTrue(all(line.startswith("GET /contacts/;") for line in lines))
+        self.assertTrue(any("busy_dependency" in line for line in lines))
+        self.assertTrue(any(line.split(" ")[-2].endswith(SUSPENDED) for line in lines))
+
+    async def test_client_request_id_cannot_escape_directory(self):
+        token = request_id_var.set("../../" + "x" * 300)
+        try:
+            headers = await self.call([(b"x-profile", b"secret")])
+        finally:
+            request_id_var.reset(token)
+        name = headers[b"x-profile-id"].decode()
+        self.assertNotIn("/", name)
+        self.assertEqual(os.listdir(self.directory), [name])
+
+    async def test_storage_is_bounded(self):
+        for _ in range(3):
+            await self.call([(b"x-profile", b"secret")])
+            await asyncio.sleep(0.01)
+        self.assertEqual(len(os.listdir(self.directory)), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
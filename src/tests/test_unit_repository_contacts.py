@@ -4,7 +4,7 @@ from datetime import date
 
 from src import crud
 from src.models import Contact
-from src.schemas import ContactCreate, ContactUpdate
+from src.schemas import ContactCreate, ContactRead, ContactUpdate
 
 
 class TestRepositoryContacts(unittest.IsolatedAsyncioTestCase):
@@ -26,7 +26,8 @@ class TestRepositoryContacts(unittest.IsolatedAsyncioTestCase):
         self.session.add.assert_called_once()
 
     async def test_get_contacts(self):
-        mock_contact = Contact(id=1, first_name="John", last_name="Doe", user_id=self.user_id)
+        mock_contact = Contact(id=1, first_name="John", last_name="Doe", email="john@example.com",
+                               phone="0671112233", birthday=date(1990, 1, 1), user_id=self.user_id)
 
         mock_result = MagicMock()
         mock_result.scalars.return_value.all.return_value = [mock_contact]
@@ -36,6 +37,8 @@ class TestRepositoryContacts(unittest.IsolatedAsyncioTestCase):
 
         self.assertEqual(len(result), 1)
         self.assertEqual(result[0].id, 1)
+        # результат польоту спільний для кількох запитів — без ORM-об'єктів чужої сесії
+        self.assertIsInstance(result[0], ContactRead)
 
     async def test_update_contact(self):
         mock_contact = Contact(id=1, first_name="Old", user_id=self.user_id)
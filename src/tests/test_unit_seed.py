@@ -0,0 +1,66 @@
+import random
+import unittest
+from datetime import date
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database import Base
+from src.models import BirthdayDigest, Contact, User, UserSyncState
+from src.seed import ContactsPerUser, generate, seed_dataset
+
+TODAY = date(2026, 10, 19)
+SMALL = ContactsPerUser(median=20, sigma=0.8, power_share=0.05, power_min=200, alpha=1.5, max_contacts=1000)
+
+
+def contacts_of(seed, users, batch_size):
+    return [
+        contact
+        for batch in generate(seed, users, SMALL, 1, 1, "!", batch_size=batch_size, today=TODAY)
+        for contact in batch.contacts
+    ]
+
+
+class TestGenerate(unittest.TestCase):
+    def test_same_seed_same_data_regardless_of_batch_size(self):
+        self.assertEqual(contacts_of(7, 30, 50), contacts_of(7, 30, 10_000))
+        self.assertNotEqual(contacts_of(7, 30, 50), contacts_of(8, 30, 50))
+
+    def test_emails_unique_per_user_and_ids_contiguous(self):
+        contacts = contacts_of(3, 40, 100)
+        self.assertEqual([contact["id"] for contact in contacts], list(range(1, len(contacts) + 1)))
+        emails = {(contact["user_id"], contact["email"]) for contact in contacts}
+        self.assertEqual(len(emails), len(contacts))
+
+    def test_heavy_tail(self):
+        rng = random.Random(1)
+        counts = sorted(SMALL.sample(rng) for _ in range(5000))
+        self.assertLess(counts[len(counts) // 2], 40)
+        self.assertGreaterEqual(sum(count >= SMALL.power_min for count in counts), 150)
+        self.assertLessEqual(counts[-1], SMALL.max_contacts)
+
+
+class TestSeedDataset(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.engine = create_async_engine("sqlite+aiosqlite://")
+        async with self.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    async def asyncTearDown(self):
+        await self.engine.dispose()
+
+    async def test_loads_consistent_rows(self):
+        async with self.engine.connect() as conn:
+            totals = await seed_dataset(conn, 5, 25, SMALL, "!", batch_size=100)
+            with self.assertRaises(ValueError):
+                await seed_dataset(conn, 5, 25, SMALL, "!")
+
+            self.assertEqual(await conn.scalar(select(func.count()).select_from(User)), 25)
+            self.assertEqual(await conn.scalar(select(func.count()).select_from(Contact)), totals["contacts"])
+            self.assertEqual(await conn.scalar(select(func.sum(UserSyncState.last_seq))), totals["contacts"])
+            with_birthday = await conn.scalar(select(func.count()).where(Contact.birthday.isnot(None)))
+            self.assertEqual(await conn.scalar(select(func.count()).select_from(BirthdayDigest)), with_birthday)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+from datetime import date
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from src import crud, sync
+from src.database import Base
+from src.models import BirthdayDigest, Contact, User, UserShard
+from src.schemas import ContactCreate
+from src.sharding import ShardMap
+
+
+class TestShardMap(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.engines = [
+            create_async_engine(f"sqlite+aiosqlite:///{os.path.join(self.tmp.name, f'shard{i}.db')}")
+            for i in range(2)
+        ]
+        for engine in self.engines:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+        self.sessions = [sessionmaker(engine, class_=AsyncSession) for engine in self.engines]
+        self.shards = ShardMap(self.sessions, ttl=60)
+        async with self.sessions[0]() as primary:
+            primary.add_all([
+                User(id=1, email="odd@example.com", hashed_password="x"),
+                User(id=2, email="even@example.com", hashed_password="x"),
+            ])
+            await primary.commit()
+
+    async def asyncTearDown(self):
+        for engine in self.engines:
+            await engine.dispose()
+        self.tmp.cleanup()
+
+    async def count(self, shard_id, model, user_id):
+        async with self.sessions[shard_id]() as session:
+            return await session.scalar(select(func.count()).select_from(model).where(model.user_id == user_id))
+
+    async def test_new_user_is_assigned_and_cached(self):
+        self.assertEqual(await self.shards.lookup(1), (1, False))
+        self.assertEqual(await self.shards.lookup(2), (0, False))
+        async with self.sessions[1]() as shard:
+            self.assertEqual((await shard.get(User, 1)).email, "odd@example.com")
+        async with self.sessions[0]() as primary:
+            await primary.delete(await primary.get(UserShard, 1))
+            await primary.commit()
+        self.assertEqual(await self.shards.lookup(1), (1, False))
+
+    async def test_user_created_with_one_shard_stays_on_shard_zero(self):
+        from src.registration import insert_users
+
+        single = ShardMap(self.sessions[:1], ttl=60)
+        async with single.user_session(1) as session:
+            contact = await crud.create_contact(session, ContactCreate(
+                first_name="Before", last_name="Split", email="before@example.com",
+                phone="0671112233", birthday=date(1990, 5, 5),
+            ), 1)
+            contact_id = contact.id
+        async with self.sessions[0]() as primary:
+            self.assertEqual(await primary.get(UserShard, 1), None)
+            created = await insert_users(primary, [{"email": "new@example.com", "hashed_password": "x"}])
+            await primary.commit()
+            self.assertEqual((await primary.get(UserShard, created[0][0])).shard_id, 0)
+
+        self.assertEqual(await self.shards.lookup(1), (0, False))
+        async with self.shards.user_session(1) as session:
+            self.assertEqual((await crud.get_contact(session, contact_id, 1)).first_name, "Before")
+        self.assertEqual(await self.count(1, Contact, 1), 0)
+
+    async def test_move_user_copies_rows_and_switches_directory(self):
+        async with self.shards.user_session(2) as session:
+            first = await crud.create_contact(session, ContactCreate(
+                first_name="Moved", last_name="One", email="moved1@example.com",
+                phone="0671112233", birthday=date(1990, 5, 5),
+            ), 2)
+            first_id = first.id
+            second = await crud.create_contact(session, ContactCreate(
+                first_name="Moved", last_name="Two", email="moved2@example.com",
+                phone="0671112234", birthday=date(1991, 6, 6),
+            ), 2)
+            second_id = second.id
+            await crud.delete_contact(session, second_id, 2)
+
+        self.assertEqual(await self.shards.move_user(2, 1, settle_seconds=0), 1)
+
+        self.assertEqual(await self.shards.lookup(2), (1, False))
+        self.assertEqual(await self.count(0, Contact, 2), 0)
+        self.assertEqual(await self.count(1, BirthdayDigest, 2), 1)
+        async with self.shards.user_session(2) as session:
+            self.assertEqual((await crud.get_contact(session, first_id, 2)).first_name, "Moved")
+            changes = await sync.get_changes(session, 2, 0, 100)
+            self.assertEqual(changes["deleted"], [second_id])
+            created = await crud.create_contact(session, ContactCreate(
+                first_name="After", last_name="Move", email="after@example.com",
+                phone="0671112235", birthday=date(1992, 7, 7),
+            ), 2)
+            self.assertGreater(created.change_seq, changes["cursor"])
+
+    async def test_failed_move_clears_moving_flag(self):
+        async with self.shards.user_session(2) as session:
+            await crud.create_contact(session, ContactCreate(
+                first_name="Clash", last_name="One", email="clash@example.com",
+                phone="0671112233", birthday=date(1990, 5, 5),
+            ), 2)
+        async with self.sessions[1]() as shard:
+            shard.add(Contact(id=1, first_name="Other", last_name="User", email="o@example.com",
+                              phone="1", user_id=1))
+            await shard.commit()
+
+        with self.assertRaises(Exception):
+            await self.shards.move_user(2, 1, settle_seconds=0)
+        self.assertEqual(await self.shards.lookup(2), (0, False))
+        self.assertEqual(await self.count(0, Contact, 2), 1)
@@ -0,0 +1,78 @@
+import asyncio
+import unittest
+
+from src.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.flight = SingleFlight(timeout=1)
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def read(self):
+        self.calls += 1
+        await self.release.wait()
+        return [self.calls]
+
+    async def test_identical_reads_share_one_call(self):
+        readers = [asyncio.create_task(self.flight.do(("contacts", 1), self.read)) for _ in range(5)]
+        await asyncio.sleep(0)
+        self.release.set()
+        results = await asyncio.gather(*readers)
+
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual(self.flight.stats()["contacts"], {"leaders": 1, "coalesced": 4, "timeouts": 0, "inflight": 0})
+
+    async def test_different_keys_do_not_coalesce(self):
+        readers = [
+            asyncio.create_task(self.flight.do(("contacts", 1), self.read)),
+            asyncio.create_task(self.flight.do(("contacts", 2), self.read)),
+        ]
+        await asyncio.sleep(0)
+        self.release.set()
+        await asyncio.gather(*readers)
+        self.assertEqual(self.calls, 2)
+
+    async def test_follower_runs_own_read_after_timeout(self):
+        leader = asyncio.create_task(self.flight.do(("contacts", 1), self.read))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(self.flight.do(("contacts", 1), self.read, timeout=0.05))
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.calls, 2)
+        self.release.set()
+        await asyncio.gather(leader, follower)
+        self.assertEqual(self.flight.stats()["contacts"]["timeouts"], 1)
+
+    async def test_error_is_shared_and_cancelled_leader_is_not(self):
+        async def failing():
+            await asyncio.sleep(0.01)
+            raise ValueError("db down")
+
+        readers = [asyncio.create_task(self.flight.do(("birthdays", 1), failing)) for _ in range(2)]
+        results = await asyncio.gather(*readers, return_exceptions=True)
+        self.assertTrue(all(isinstance(result, ValueError) for result in results))
+
+        leader = asyncio.create_task(self.flight.do(("contacts", 1), self.read))
+        await asyncio.sleep(0)
+        follower = asyncio.create_task(self.flight.do(("contacts", 1), self.read))
+        await asyncio.sleep(0)
+        leader.cancel()
+        self.release.set()
+        self.assertEqual(await follower, [2])
+
+    async def test_forget_starts_new_flight(self):
+        leader = asyncio.create_task(self.flight.do(("contacts", 1), self.read))
+        await asyncio.sleep(0)
+        self.flight.forget(1)
+        after_write = asyncio.create_task(self.flight.do(("contacts", 1), self.read))
+        await asyncio.sleep(0)
+        self.release.set()
+        await asyncio.gather(leader, after_write)
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(self.flight.inflight, {})
+
+
+if __name__ == "__main__":
+    unittest.main()